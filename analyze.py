@@ -241,10 +241,19 @@ def get_avg_elapsed(case_name=CASE_NAME):
 def avg_over_noise_states(n=50):
     """Apply a function of animat states ``n`` times and take the average."""
     def decorator(func):
+        # The games of the last animat, whose arrays are reused by the next
+        # one if it plays the same game
+        last = [None]
+
         @wraps(func)
         def wrapper(ind, **kwargs):
-            return np.mean([func(ind.play_game(scrambled=True).animat_states)
-                            for _ in range(n)])
+            out = last[0]
+            if out is not None and out.animat_states.shape[1:] != (
+                    ind.num_trials, ind.world_height, ind.num_nodes):
+                out = None
+            games = ind.play_game_replicates(n, scrambled=True, out=out)
+            last[0] = games
+            return np.mean([func(states) for states in games.animat_states])
         return wrapper
     return decorator
 
@@ -275,7 +284,7 @@ def motor_entropy(ind, scrambled=False):
 
 
 def next_state(ind, state):
-    return np.copy(ind.network.tpm[tuple(state)]).astype(int)
+    return ind.next_state(state).astype(int)
 
 
 def possible_states(num_nodes):
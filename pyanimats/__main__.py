@@ -45,6 +45,11 @@ Simulation options:
     -C --checkpoint-file=PATH  Save to this checkpoint file (defaults to
                                `checkpoint.pkl` in the output directory, or the
                                given checkpoint file if resuming)
+    -T --num-threads=INT       Number of threads used to play games (defaults
+                               to one per hardware thread)
+    -N --native                Evolve the population entirely in the C++
+                               engine (only for the `nat`, `no_lscc`, and
+                               `food` fitness functions)
 
 Data collection options:
     -S --sample-interval=INT   Genome recording interval (generations)
@@ -102,6 +107,7 @@ cli_opt_to_simulation = {
     '--status-interval':  ('status_interval', int),
     '--logbook-interval': ('logbook_interval', int),
     '--sample-interval':  ('sample_interval', int),
+    '--num-threads':      ('num_threads', int),
 }
 
 # Map CLI options to experiment parameter names and data types.
@@ -181,6 +187,10 @@ def main(args):
 
     # Get the simulation CLI options from the command-line arguments.
     simulation_cli_opts = process_cli_opts(args, cli_opt_to_simulation)
+    # Flags are false rather than missing when not given, so only override the
+    # parameter file when set.
+    if args['--native']:
+        simulation_cli_opts['native'] = True
 
     # Either load from a checkpoint or start a new evolution.
     if args['resume']:
@@ -9,6 +9,7 @@ Wraps the C++ Animat extension, providing convenience methods for accessing
 animat properties (connectivity, associated PyPhi objects, etc.).
 """
 
+import base64
 from collections import namedtuple
 from copy import deepcopy
 from uuid import uuid4
@@ -17,11 +18,40 @@ import numpy as np
 import pyphi
 
 from . import constants, utils, validate
-from .c_animat import pyHiddenMarkovAgent, pyLinearThresholdAgent
+from . import c_animat
+from .c_animat import (RECORD_FULL, RECORD_PACKED, pyHiddenMarkovAgent,
+                       pyLinearThresholdAgent)
 from .experiment import Experiment
 
+# The histograms of the states visited during a game, counted by the C++
+# engine if requested; ``None`` otherwise.
+HISTOGRAM_FIELDS = ['visited_states', 'visit_counts', 'last_visits',
+                    'sensor_motor_counts', 'hidden_states', 'hidden_counts']
+# What a game records depends on its recording level (one of the
+# ``c_animat.RECORD_*`` constants); whatever isn't recorded is ``None``.
+# ``packed_states`` holds the animat's state at each timestep packed into an
+# integer with the little-endian convention, and ``activity`` the number of
+# timesteps at which each node was on. At ``RECORD_FULL``, the world states,
+# animat positions, and trial results are ``int32`` arrays (world states are
+# ``uint64`` if the world is too wide for that); the lower levels keep them
+# as the engine writes them, in the narrowest type that holds them.
 Game = namedtuple('Game', ['animat_states', 'world_states', 'animat_positions',
-                           'trial_results', 'correct', 'incorrect'])
+                           'trial_results', 'correct', 'incorrect',
+                           'packed_states', 'activity', 'record'] +
+                  HISTOGRAM_FIELDS)
+Game.__new__.__defaults__ = ((None, None, RECORD_FULL) +
+                             (None,) * len(HISTOGRAM_FIELDS))
+# The bits of an ``int32`` below its sign bit; world states are bit fields, so
+# only worlds this wide or narrower fit
+_INT32_BITS = 31
+
+
+def _as_int32(array, out=None):
+    """Return ``array`` cast to ``int32``, in ``out`` if it's given."""
+    if out is None:
+        return array.astype(np.int32)
+    np.copyto(out, array)
+    return out
 
 
 class Mechanism(namedtuple('Mechanism', ['inputs', 'tpm'])):
@@ -38,21 +68,30 @@ class Animat:
 
     Args:
         experiment (Experiment): The experiment this animat is a part of.
-        genome (Iterable(int)): See attribute.
+        genome (bytes or Iterable(int)): See attribute.
 
     Keyword Args:
         parent (Animat): See attribute.
         gen (int): See attribute.
 
     Attributes:
-        genome (Iterable(int)):
-            A sequence of integers in the range 0–255 that will determine the
-            animat's phenotype.
+        genome (np.ndarray):
+            A read-only array of bytes (integers in the range 0–255) that
+            determine the animat's phenotype.
         parent (Animat):
             The animat's parent. Must be explicitly set upon cloning.
         gen (int):
-        edges (list(tuple(int, int))):
-            A list of the edges between animat nodes. May contain duplicates.
+        mutations (np.ndarray):
+            The changes made to the genome by the last mutation, as
+            (position, width) pairs, one per row: a width of 0 is a point
+            mutation, a positive width an insertion, and a negative width a
+            deletion.
+        edges (np.ndarray):
+            The edges between animat nodes, as (from, to) pairs, one per row.
+            May contain duplicates.
+        phenotype_hash (int):
+            A hash of the animat's connectivity matrix and TPM; animats with
+            the same phenotype have the same hash.
         cm (np.ndarray):
             The animat's connectivity matrix.
         tpm (np.ndarray):
@@ -83,6 +122,18 @@ class Animat:
                                                     experiment.num_hidden,
                                                     experiment.num_motors,
                                                     experiment.deterministic)
+        self._init_attributes()
+
+    @classmethod
+    def _from_c_animat(cls, experiment, c_animat):
+        """Return an animat wrapping the given C++ animat."""
+        animat = cls.__new__(cls)
+        animat._experiment = experiment
+        animat._c_animat = c_animat
+        animat._init_attributes()
+        return animat
+
+    def _init_attributes(self):
         self.parent = None
         self.gen = 0
         self.fitness = 1.0
@@ -90,6 +141,8 @@ class Animat:
         self.raw_fitness = (float('-Inf'),)
         self._correct = False
         self._incorrect = False
+        # A game played ahead of time by ``play_games``, if any.
+        self._prefetched_game = None
         # Get a RNG.
         self.random = constants.DEFAULT_RNG
         # Don't initialize the animat's network attributes until we need to,
@@ -106,14 +159,14 @@ class Animat:
     def __str__(self):
         string = ('Animat(gen={}, genome={}, '
                   'connectivity_matrix=\n{})'.format(
-                      self.gen, np.array(self.genome), self.cm))
+                      self.gen, self.genome, self.cm))
         return string.replace('\n', '\n' + ' ' * 11)
 
     def __repr__(self):
         return str(self)
 
     def __eq__(self, other):
-        return (self.genome == other.genome and
+        return (np.array_equal(self.genome, other.genome) and
                 self._experiment == other._experiment)
 
     def __getattr__(self, name):
@@ -132,11 +185,13 @@ class Animat:
         # from the pickled object.
         state = {k: v for k, v in self.__dict__.items()
                  if k not in ['parent', '_network', '_dirty_network', '_cm',
-                              '_dirty_cm', '_tpm', '_dirty_tpm']}
+                              '_dirty_cm', '_tpm', '_dirty_tpm',
+                              '_prefetched_game']}
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        self._prefetched_game = None
         self._tpm = False
         self._dirty_tpm = True
         self._cm = False
@@ -153,7 +208,14 @@ class Animat:
             ``random`` attributes are not deeply copied; they're still just
             references.
         """
-        copy = Animat(self._experiment, genome=self._c_animat.genome)
+        copy = Animat.__new__(Animat)
+        copy._experiment = self._experiment
+        # The copy of the C++ animat shares the genome's storage and the
+        # decoded gates with this one until either is mutated, and has the
+        # same random number streams.
+        copy._c_animat = deepcopy(self._c_animat, memo)
+        copy._prefetched_game = None
+        copy._id = uuid4()
         copy.parent = self.parent
         copy.random = self.random
         copy.gen = deepcopy(self.gen)
@@ -183,7 +245,7 @@ class Animat:
         }
         if not compact:
             if genome:
-                d['genome'] = self.genome
+                d['genome'] = encode_genome(self.genome)
             else:
                 d['tpm'] = self.tpm
                 d['cm'] = self.cm
@@ -196,20 +258,38 @@ class Animat:
     def cm(self):
         """The animat's connectivity matrix."""
         if self._dirty_cm:
-            cm = np.zeros((self.num_nodes, self.num_nodes), int)
-            cm[list(zip(*self.edges))] = 1
-            self._cm = cm
+            self._cm = self._c_animat.cm.astype(int)
             self._dirty_cm = False
         return self._cm
 
     @property
     def tpm(self):
-        """The animats's TPM."""
+        """The animats's TPM.
+
+        For a nondeterministic animat, this is a sample of its transitions,
+        unless the experiment asks for the ``exact_tpm``, the probability of
+        each node being on after each state.
+        """
         if self._dirty_tpm:
-            self._tpm = np.array(self._c_animat.tpm).astype(float)
+            if self.exact_tpm and not self.deterministic:
+                self._tpm = self._c_animat.transition_probabilities()
+            else:
+                self._tpm = self._c_animat.transition_matrix(float)
             self._dirty_tpm = False
         return self._tpm
 
+    def next_state(self, state):
+        """Return the state of each node following the given state.
+
+        Only that state's transition is computed, so this doesn't need the
+        whole TPM.
+        """
+        packed = np.dot(np.asarray(state, dtype=np.uint64),
+                        np.uint64(1) << np.arange(self.num_nodes,
+                                                  dtype=np.uint64))
+        return utils.unpack_states(self._c_animat.next_states([packed]),
+                                   self.num_nodes)[0]
+
     @property
     def network(self):
         """The PyPhi network representing the animat in the given state."""
@@ -238,6 +318,15 @@ class Animat:
                 yield ancestor
             ancestor = ancestor.parent
 
+    def seed_rng(self, generation, index):
+        """Seed the animat's C++ random number streams.
+
+        The streams used for mutation, for every game the animat plays, and
+        for sampling its TPM are derived from the experiment's ``rng_seed``,
+        the given generation, and the animat's index in the population.
+        """
+        self._c_animat.seed_rng(self.rng_seed, generation, index)
+
     def inject_start_codons(self, n):
         """Inject ``n`` start codons into the animat's genome.
 
@@ -246,43 +335,140 @@ class Animat:
         self._c_animat.injectStartCodons(n)
 
     def mutate(self):
-        """Mutate the animat's genome in-place."""
-        self._c_animat.mutate(self.mutation_prob, self.duplication_prob,
-                              self.deletion_prob, self.min_genome_length,
-                              self.max_genome_length, self.min_dup_del_width,
-                              self.max_dup_del_width)
-        # Network attributes need updating.
-        self._dirty_tpm = True
-        self._dirty_cm = True
-        self._dirty_network = True
+        """Mutate the animat's genome in-place.
 
-    def play_game(self, scrambled=False, noise_level=None):
+        Returns:
+            bool: Whether the animat's phenotype may have changed. It didn't if
+            no gate reads a changed nucleotide and no start codon was created
+            or destroyed; the changes are in ``mutations``.
+        """
+        changed = self._c_animat.mutate(
+            self.mutation_prob, self.duplication_prob, self.deletion_prob,
+            self.min_genome_length, self.max_genome_length,
+            self.min_dup_del_width, self.max_dup_del_width)
+        self._mutated(changed)
+        return changed
+
+    def _mutated(self, changed):
+        # Network attributes need updating (the TPM of a nondeterministic
+        # animat is sampled from its reseeded streams).
+        if changed or not self.deterministic:
+            self._dirty_tpm = True
+            self._dirty_cm = True
+            self._dirty_network = True
+        # A game played before mutation no longer applies.
+        self._prefetched_game = None
+
+    def play_game(self, scrambled=False, noise_level=None, histograms=False,
+                  record=RECORD_FULL):
         """Return the list of state transitions the animat goes through when
-        playing the game."""
-        if noise_level is None:
-            noise_level = self.noise_level
-        game = self._c_animat.play_game(
-            self.hit_multipliers, self.block_patterns, self.world_width,
-            self.world_height, scramble_world=scrambled,
-            noise_level=noise_level)
-        game = Game(animat_states=game[0].reshape(self.num_trials,
-                                                  self.world_height,
-                                                  self.num_nodes),
-                    world_states=game[1].reshape(self.num_trials,
-                                                 self.world_height),
-                    animat_positions=game[2].reshape(self.num_trials,
-                                                     self.world_height),
-                    trial_results=game[3], correct=game[4], incorrect=game[5])
+        playing the game.
+
+        If ``histograms`` is true, the states the animat visits are also
+        counted (see ``HISTOGRAM_FIELDS``). ``record`` is the recording level
+        (see ``Game``); lower levels skip recording what they don't need.
+
+        If a game was played ahead of time by :func:`play_games`, the first
+        call with the default arguments returns that game instead of playing a
+        new one, provided that it recorded enough.
+        """
+        prefetched = self._prefetched_game
+        if (prefetched is not None and not scrambled and
+                noise_level is None and record <= prefetched.record and
+                (not histograms or prefetched.visited_states is not None)):
+            game, self._prefetched_game = prefetched, None
+        else:
+            if noise_level is None:
+                noise_level = self.noise_level
+            game = self._c_animat.play_game(
+                self.game_config, scramble_world=scrambled,
+                noise_level=noise_level, histograms=histograms, record=record)
+            game = self._reshape_game(*game, record=record)
         assert game.correct + game.incorrect == self.num_trials
         self._correct = game.correct
         self._incorrect = game.incorrect
         return game
 
+    def play_game_replicates(self, num_replicates, scrambled=False,
+                             noise_level=None, record=RECORD_FULL, out=None):
+        """Play the game ``num_replicates`` times, as that many calls to
+        :meth:`play_game` would, but in a single call into the engine.
+
+        Keyword Args:
+            record (int): The recording level (see ``Game``).
+            out (Game): A game returned by a previous call with the same
+                number of replicates and recording level, whose arrays are
+                overwritten instead of allocating new ones.
+
+        Returns:
+            Game: The replicates, with a leading replicate axis on every
+            array; ``correct`` and ``incorrect`` are arrays of counts.
+        """
+        if noise_level is None:
+            noise_level = self.noise_level
+        arrays = None
+        if out is not None:
+            # The engine records each replicate in a row of a 2-D array; what
+            # full games hold as int32 is recorded apart and copied in.
+            arrays = [None if array is None or array.dtype == np.int32
+                      else array.reshape(num_replicates, -1)
+                      for array in (out.animat_states, out.world_states,
+                                    out.animat_positions, out.trial_results,
+                                    None, out.packed_states)]
+            arrays.append(out.activity)
+        results = self._c_animat.play_game_replicates(
+            self.game_config, num_replicates, scramble_world=scrambled,
+            noise_level=noise_level, record=record, out=arrays)
+        totals = results[4]
+        game = self._reshape_game(*results[:4], totals[:, 0], totals[:, 1],
+                                  *results[5:], None, record=record,
+                                  num_replicates=num_replicates, out=out)
+        self._correct = int(totals[-1, 0])
+        self._incorrect = int(totals[-1, 1])
+        return game
+
+    def _reshape_game(self, animat_states, world_states, animat_positions,
+                      trial_results, correct, incorrect, packed_states,
+                      activity, histograms, record=RECORD_FULL,
+                      num_replicates=None, out=None):
+        """Return a ``Game`` from the flat arrays filled by the C++ engine.
+
+        If ``num_replicates`` is given, the arrays hold that many replicates,
+        one per row. If ``out`` is given, arrays that are cast are cast into
+        its arrays.
+        """
+        if histograms is None:
+            histograms = (None,) * len(HISTOGRAM_FIELDS)
+        shape = (self.num_trials, self.world_height)
+        if num_replicates is None:
+            correct, incorrect = int(correct), int(incorrect)
+        else:
+            shape = (num_replicates,) + shape
+            trial_results = trial_results.reshape(shape[:2])
+        if record >= RECORD_PACKED:
+            world_states = world_states.reshape(shape)
+            animat_positions = animat_positions.reshape(shape)
+            packed_states = packed_states.reshape(shape)
+        if record >= RECORD_FULL:
+            animat_states = animat_states.reshape(shape + (self.num_nodes,))
+            if out is None:
+                out = Game(*(None,) * 6)
+            if self.world_width <= _INT32_BITS:
+                world_states = _as_int32(world_states, out.world_states)
+            animat_positions = _as_int32(animat_positions,
+                                         out.animat_positions)
+            trial_results = _as_int32(trial_results, out.trial_results)
+        return Game(animat_states=animat_states, world_states=world_states,
+                    animat_positions=animat_positions,
+                    trial_results=trial_results, correct=correct,
+                    incorrect=incorrect, packed_states=packed_states,
+                    activity=activity, record=record,
+                    **dict(zip(HISTOGRAM_FIELDS, histograms)))
+
     def start_codons(self):
         """Return the locations of start codons in the genome, if any."""
         codons = [self.START_CODON_ONE, self.START_CODON_TWO]
-        genome = np.array(self.genome)
-        window = utils.rolling_window(genome, len(codons))
+        window = utils.rolling_window(self.genome, len(codons))
         occurrences = np.all((window == codons), axis=1)
         return np.where(occurrences)[0]
 
@@ -348,14 +534,102 @@ def _c_animat_getter(name):
 # A list of animat attributes to expose as read-only properties
 _c_animat_properties = ['genome', 'num_sensors', 'num_hidden', 'num_motors',
                         'num_nodes', 'num_states', 'deterministic',
-                        'body_length', 'edges', 'START_CODON_ONE',
-                        'START_CODON_TWO', 'print_gates']
+                        'body_length', 'mutations', 'edges',
+                        'phenotype_hash',
+                        'START_CODON_ONE', 'START_CODON_TWO', 'print_gates']
 
 # Add underlying animat properties to the Animat class
 for name in _c_animat_properties:
     setattr(Animat, name, property(_c_animat_getter(name)))
 
 
+def play_games(animats, scrambled=False, noise_level=None, num_threads=0,
+               prefetch=False, histograms=False, record=RECORD_FULL):
+    """Play a game with each of the given animats at once.
+
+    The games are run in parallel by the C++ engine. The animats must all be
+    part of the same experiment.
+
+    Keyword Args:
+        scrambled (bool): Whether to scramble the world.
+        noise_level (float): The sensor noise level. Defaults to the
+            experiment's ``noise_level``.
+        num_threads (int): The number of threads to use. If less than 1, one
+            thread per hardware thread is used.
+        prefetch (bool): Whether each animat should hold on to its game, so
+            that the next call to :meth:`Animat.play_game` with the default
+            arguments returns it rather than playing a new one.
+        histograms (bool): Whether to count the states each animat visits.
+        record (int): The recording level (see ``Game``).
+
+    Returns:
+        list(Game): The game played by each animat.
+    """
+    if not animats:
+        return []
+    experiment = animats[0]._experiment
+    default_noise = noise_level is None
+    if default_noise:
+        noise_level = experiment.noise_level
+    results = c_animat.play_games(
+        [a._c_animat for a in animats], experiment.game_config,
+        scramble_world=scrambled, noise_level=noise_level,
+        num_threads=num_threads, histograms=histograms, record=record)
+    games = []
+    for i, a in enumerate(animats):
+        arrays = [None if array is None else array[i] for array in results]
+        game = a._reshape_game(*arrays[:4], *results[4][i], *arrays[5:],
+                               record=record)
+        a._correct = game.correct
+        a._incorrect = game.incorrect
+        if prefetch and not scrambled and default_noise:
+            a._prefetched_game = game
+        games.append(game)
+    return games
+
+
+def mutate_population(animats, num_threads=0):
+    """Mutate each of the given animats in-place at once.
+
+    The animats are mutated in parallel by the C++ engine, each with its own
+    random number stream, so this is equivalent to calling
+    :meth:`Animat.mutate` on each of them. The animats must all be part of
+    the same experiment.
+
+    Keyword Args:
+        num_threads (int): The number of threads to use. If less than 1, one
+            thread per hardware thread is used.
+
+    Returns:
+        np.ndarray: Whether the phenotype of each animat may have changed.
+    """
+    if not animats:
+        return np.zeros(0, dtype=bool)
+    experiment = animats[0]._experiment
+    changed = c_animat.mutate_agents(
+        [a._c_animat for a in animats], experiment.mutation_prob,
+        experiment.duplication_prob, experiment.deletion_prob,
+        experiment.min_genome_length, experiment.max_genome_length,
+        experiment.min_dup_del_width, experiment.max_dup_del_width,
+        num_threads=num_threads)
+    for a, a_changed in zip(animats, changed):
+        a._mutated(a_changed)
+    return changed
+
+
+def encode_genome(genome):
+    """Return a genome as a base64 string, for JSON."""
+    return base64.b64encode(bytes(genome)).decode('ascii')
+
+
+def decode_genome(data):
+    """Return a genome stored by ``encode_genome``, or as a list of
+    integers."""
+    if isinstance(data, str):
+        return base64.b64decode(data)
+    return data
+
+
 def from_json(dictionary, experiment=None, parent=None):
     """Initialize an animat object from a JSON dictionary.
 
@@ -368,7 +642,7 @@ def from_json(dictionary, experiment=None, parent=None):
         except KeyError:
             raise ValueError('cannot load animat: no experiment was provided '
                              'and no experiment was found in the JSON data.')
-    animat = Animat(experiment, dictionary['genome'])
+    animat = Animat(experiment, decode_genome(dictionary['genome']))
     animat.parent = parent
     animat.gen = dictionary['gen']
     animat.fitness = dictionary['fitness']
@@ -1,7 +1,18 @@
 // AbstractAgent.cpp
 
+#include <stdexcept>
+#include <string>
+
 #include "./AbstractAgent.hpp"
+#include "./ThreadPool.hpp"
+
 
+// The mask of the given nodes
+static inline uint64_t nodeMask(const vector<unsigned char> &nodes) {
+    uint64_t mask = 0;
+    for (int i = 0; i < (int)nodes.size(); i++) mask |= 1ULL << nodes[i];
+    return mask;
+}
 
 AbstractAgent::AbstractAgent(vector<unsigned char> genome, int numSensors,
         int numHidden, int numMotors, bool deterministic) : genome(genome) {
@@ -11,113 +22,514 @@ AbstractAgent::AbstractAgent(vector<unsigned char> genome, int numSensors,
     // none.
     mNumMotors = numMotors;
     mNumNodes = mNumSensors + mNumHidden + mNumMotors;
-    mNumStates = 1 << mNumNodes;
+    if (mNumNodes > MAX_NODES)
+        throw std::invalid_argument("agents can have at most 64 nodes");
+    // Only agents whose TPM can be computed have their states counted
+    mNumStates = mNumNodes <= MAX_TPM_NODES ? 1 << mNumNodes : 0;
     mBodyLength = std::max(MIN_BODY_LENGTH, mNumSensors);
     mDeterministic = deterministic;
+    mStaleColumns = 0;
+    clearPhenotypeCache(~0ULL);
+    mHaveGates = false;
+    seedStreams(0, 0, 0);
 
-    states.resize(mNumNodes);
-    newStates.resize(mNumNodes);
-    for (int i = 0; i < mNumNodes; i++) {
-        states[i] = 0;
-        newStates[i] = 0;
-    }
+    state = 0;
     gates.clear();
 }
 
 int AbstractAgent::getAction() {
     if (mNumMotors > 0) {
-        return (states[mNumNodes - 2] << 1) + states[mNumNodes - 1];
+        return (((state >> (mNumNodes - 2)) & 1) << 1) +
+            ((state >> (mNumNodes - 1)) & 1);
     }
     else return 0;
 }
 
 void AbstractAgent::resetState() {
-    for (int i = 0; i < mNumNodes; i++)
-        states[i] = 0;
+    state = 0;
+}
+
+void AbstractAgent::updateStates(RandomStream &rng) {
+    updateStates(rng, program);
+}
+
+void AbstractAgent::updateStates(RandomStream &rng,
+        const GateProgram &stepProgram) {
+    if (!transitionTable.empty())
+        state = transitionTable[state];
+    else
+        state = stepProgram.step(state, rng);
 }
 
-void AbstractAgent::updateStates() {
+/**
+ * Compiles the gates into a single program. Called whenever the phenotype is
+ * regenerated, with the nodes written by the gates that changed; this also
+ * discards the transition table of the previous phenotype.
+ *
+ * A linear threshold gate overwrites its outputs, so the gates that only
+ * write to nodes a later one overwrites are left out of the program (their
+ * edges remain in the connectivity matrix).
+ */
+void AbstractAgent::compileProgram(uint64_t changedNodes) {
+    program.clear();
     for (int i = 0; i < (int)gates.size(); i++) {
-        gates[i]->update(states, newStates);
+        gates[i]->compile(program);
     }
-    for (int i = 0; i < mNumNodes; i++) {
-        states[i] = newStates[i];
-        newStates[i] = 0;
+    program.removeOverwritten();
+    transitionTable.clear();
+    clearPhenotypeCache(changedNodes);
+}
+
+/**
+ * Compiles the phenotype into a next-state lookup table, so that the agent is
+ * then updated with a single lookup instead of running its program. Does
+ * nothing if the agent is nondeterministic, has too many nodes, or already
+ * has a table.
+ */
+void AbstractAgent::compileTransitionTable() {
+    if (!mDeterministic || mNumNodes > MAX_TABLE_NODES ||
+            !transitionTable.empty())
+        return;
+    const vector<uint64_t> &next = getTransitions();
+    transitionTable.assign(next.begin(), next.end());
+}
+
+void AbstractAgent::seedStreams(uint64_t seed, uint64_t generation,
+        uint64_t index) {
+    mSeed = seed;
+    mGeneration = generation;
+    mIndex = index;
+    mGamesPlayed = 0;
+    rng = RandomStream(streamKey(seed, generation, index, AGENT_STREAM));
+    // Sampled transitions depend on the streams
+    if (!mDeterministic) {
+        mStaleColumns = ~0ULL;
+        mHavePhenotypeHash = false;
     }
 }
 
+RandomStream AbstractAgent::nextGameStream() {
+    return RandomStream(
+        streamKey(mSeed, mGeneration, mIndex, mGamesPlayed++));
+}
 
-void AbstractAgent::mutateGenome(double mutProb, double dupProb,
+/**
+ * Mutates the genome and regenerates the phenotype. Returns whether the
+ * phenotype may have changed: it didn't if no gate reads a changed
+ * nucleotide and no start codon was created or destroyed.
+ */
+bool AbstractAgent::mutateGenome(double mutProb, double dupProb,
         double delProb, int minGenomeLength, int maxGenomeLength,
         int minDupDelLength, int maxDupDelLength) {
+    // Build the gates first, so that the changes can be traced to them
+    if (!mHaveGates) generatePhenotype();
+    mutations.clear();
     // Mutation
-    for (int i = 0; i < (int)genome.size(); i++) {
-        if (randDouble() < mutProb) {
-            genome[i] = randCharInt();
+    //
+    // Each nucleotide mutates with probability `mutProb`, so the numbers of
+    // nucleotides between mutations are geometric: jump from one mutation to
+    // the next rather than drawing a number for every nucleotide
+    int size = (int)genome.size();
+    for (int i = -1;;) {
+        int skip = rng.randGeometric(mutProb);
+        if (skip >= size - 1 - i) break;
+        i += skip + 1;
+        unsigned char value = rng.randCharInt();
+        if (value != genome[i]) {
+            genome.set(i, value);
+            logGenomeEdit(i, 0);
         }
     }
     // Duplication
-    if ((randDouble() < dupProb) && ((int)genome.size() < maxGenomeLength)) {
-        int width = (minDupDelLength + randInt()) & maxDupDelLength;
-        int start = randInt() % ((int)genome.size() - width);
-        int insert = randInt() % (int)genome.size();
-        vector<unsigned char> buffer;
-        buffer.clear();
-        buffer.insert(buffer.begin(), genome.begin() + start, genome.begin() +
-                start + width);
-        genome.insert(genome.begin() + insert, buffer.begin(), buffer.end());
+    if ((rng.randDouble() < dupProb) && ((int)genome.size() < maxGenomeLength)) {
+        int width = (minDupDelLength + rng.randInt()) & maxDupDelLength;
+        int start = rng.randInt() % ((int)genome.size() - width);
+        int insert = rng.randInt() % (int)genome.size();
+        vector<unsigned char> buffer(width);
+        genome.copy(start, width, buffer.data());
+        genome.insert(insert, buffer);
+        if (width > 0) logGenomeEdit(insert, width);
     }
     // Deletion
-    if ((randDouble() < delProb) && ((int)genome.size() > minGenomeLength)) {
-        int width = (minDupDelLength + randInt()) & maxDupDelLength;
-        int start = randInt() % ((int)genome.size() - width);
-        genome.erase(genome.begin() + start, genome.begin() + start + width);
+    if ((rng.randDouble() < delProb) && ((int)genome.size() > minGenomeLength)) {
+        int width = (minDupDelLength + rng.randInt()) & maxDupDelLength;
+        int start = rng.randInt() % ((int)genome.size() - width);
+        genome.erase(start, width);
+        if (width > 0) logGenomeEdit(start, -width);
     }
+    return generatePhenotype();
+}
+
+void mutateAgents(const vector<AbstractAgent*> &agents, unsigned char
+        *changed, double mutProb, double dupProb, double delProb, int
+        minGenomeLength, int maxGenomeLength, int minDupDelLength, int
+        maxDupDelLength, int numThreads) {
+    // Each agent mutates with its own stream, so the results don't depend
+    // on the number of threads
+    parallelFor((int)agents.size(), numThreads, [&](int i) {
+        changed[i] = agents[i]->mutateGenome(mutProb, dupProb, delProb,
+                minGenomeLength, maxGenomeLength, minDupDelLength,
+                maxDupDelLength);
+    });
 }
 
 void AbstractAgent::injectStartCodons(int n, unsigned char codon_one,
         unsigned char codon_two) {
-    for (int i = 0; i < (int)genome.size(); i++)
-        genome[i] = randCharInt();
+    vector<unsigned char> nucleotides(genome.size());
+    for (int i = 0; i < (int)nucleotides.size(); i++)
+        nucleotides[i] = rng.randCharInt();
     for (int i = 0; i < n; i++) {
-        int j = randInt() % ((int)genome.size() - 100);
+        int j = rng.randInt() % ((int)nucleotides.size() - 100);
 
         // Start codon
-        genome[j] = codon_one;
-        genome[j + 1] = codon_two;
+        nucleotides[j] = codon_one;
+        nucleotides[j + 1] = codon_two;
 
         for (int k = 2; k < 20; k++)
-            genome[j + k] = randCharInt();
+            nucleotides[j + k] = rng.randCharInt();
+    }
+    genome.assign(nucleotides);
+    // The whole genome changed
+    mHaveGates = false;
+    genomeEdits.clear();
+}
+
+void AbstractAgent::logGenomeEdit(int position, int width) {
+    GenomeEdit edit = {position, width};
+    mutations.push_back(edit);
+    // Until the gates are built, there's nothing to update
+    if (!mHaveGates) return;
+    // Past a point, scanning the whole genome again is cheaper
+    if ((int)genomeEdits.size() >= genome.size()) {
+        mHaveGates = false;
+        genomeEdits.clear();
+        return;
     }
+    genomeEdits.push_back(edit);
+}
+
+bool AbstractAgent::isStartCodon(int i, unsigned char codonOne,
+        unsigned char codonTwo) {
+    return (genome[i] == codonOne) &&
+        (genome[(i + 1) % (int)genome.size()] == codonTwo);
 }
 
-vector< vector<bool> > AbstractAgent::getTransitions() {
-    // Save animat's original state.
-    unsigned char initial_states[mNumNodes];
-    for (int i = 0; i < mNumNodes; i++) {
-        initial_states[i] = states[i];
+bool AbstractAgent::buildGates(unsigned char codonOne,
+        unsigned char codonTwo) {
+    int size = (int)genome.size();
+    if (!mHaveGates) {
+        gates.clear();
+        gateStarts.clear();
+        // Read the genome a chunk at a time
+        for (int k = 0; k < genome.numChunks(); k++) {
+            const unsigned char *chunk = genome.chunkData(k);
+            int start = genome.chunkStart(k);
+            int end = genome.chunkSize(k) - 1;
+            for (int j = 0; j < end; j++) {
+                if (chunk[j] == codonOne && chunk[j + 1] == codonTwo) {
+                    gates.emplace_back(newGate(start + j));
+                    gateStarts.push_back(start + j);
+                }
+            }
+            // The codon may straddle the end of the chunk
+            if (end >= 0 && isStartCodon(start + end, codonOne, codonTwo)) {
+                gates.emplace_back(newGate(start + end));
+                gateStarts.push_back(start + end);
+            }
+        }
+        mHaveGates = true;
+        genomeEdits.clear();
+        compileProgram(~0ULL);
+        return true;
+    }
+    if (genomeEdits.empty()) return false;
+
+    // Replay the changes on the gates' start codons, dropping the gates that
+    // read a changed nucleotide and keeping track of the positions where a
+    // start codon may have appeared (or where a dropped gate must be rebuilt)
+    int numGates = (int)gates.size();
+    vector<int> starts(gateStarts);
+    vector<bool> dropped(numGates, false);
+    vector<int> candidates;
+    // The size of the genome before the changes
+    int current = size;
+    for (int e = 0; e < (int)genomeEdits.size(); e++)
+        current -= genomeEdits[e].width;
+    for (int e = 0; e < (int)genomeEdits.size(); e++) {
+        int position = genomeEdits[e].position;
+        int width = genomeEdits[e].width;
+        if (width == 0) {
+            for (int g = 0; g < numGates; g++) {
+                if (dropped[g]) continue;
+                int span = gates[g]->span;
+                if (span >= current ||
+                        (position - starts[g] + current) % current < span) {
+                    dropped[g] = true;
+                    candidates.push_back(starts[g]);
+                }
+            }
+            candidates.push_back((position - 1 + current) % current);
+            candidates.push_back(position);
+        } else if (width > 0) {
+            for (int c = 0; c < (int)candidates.size(); c++)
+                if (candidates[c] >= position) candidates[c] += width;
+            for (int g = 0; g < numGates; g++) {
+                if (dropped[g]) continue;
+                int start = starts[g];
+                // Gates that wrap around the end of the genome depend on its
+                // size
+                bool dirty = (start + gates[g]->span > current) ||
+                    (start < position && position < start + gates[g]->span);
+                if (start >= position) start += width;
+                if (dirty) {
+                    dropped[g] = true;
+                    candidates.push_back(start);
+                } else {
+                    starts[g] = start;
+                }
+            }
+            current += width;
+            for (int c = std::max(0, position - 1); c < position + width; c++)
+                candidates.push_back(c);
+            candidates.push_back(current - 1);
+        } else {
+            width = -width;
+            int c = 0;
+            for (int i = 0; i < (int)candidates.size(); i++) {
+                if (candidates[i] < position)
+                    candidates[c++] = candidates[i];
+                else if (candidates[i] >= position + width)
+                    candidates[c++] = candidates[i] - width;
+            }
+            candidates.resize(c);
+            for (int g = 0; g < numGates; g++) {
+                if (dropped[g]) continue;
+                int start = starts[g];
+                bool dirty = (start + gates[g]->span > current) ||
+                    (position < start + gates[g]->span &&
+                     start < position + width);
+                bool deleted = (position <= start && start < position + width);
+                if (start >= position + width) start -= width;
+                if (dirty) {
+                    dropped[g] = true;
+                    if (!deleted) candidates.push_back(start);
+                } else {
+                    starts[g] = start;
+                }
+            }
+            current -= width;
+            if (position > 0) candidates.push_back(position - 1);
+            if (position < current) candidates.push_back(position);
+            candidates.push_back(current - 1);
+        }
     }
-    vector< vector<bool> > tpm;
-    tpm.clear();
-    tpm.resize(mNumStates);
-    for (int i = 0; i < mNumStates; i++) {
-        // Set animat to the ith state (using little-endian mapping from states
-        // to integers).
-        for (int j = 0; j < mNumNodes; j++) {
-            states[j] = (i >> j) & 1;
+    genomeEdits.clear();
+
+    // Look for start codons at the candidate positions that aren't already
+    // the start of an unchanged gate
+    std::sort(candidates.begin(), candidates.end());
+    candidates.erase(std::unique(candidates.begin(), candidates.end()),
+            candidates.end());
+    vector< std::shared_ptr<const AbstractGate> > newGates;
+    vector<int> newStarts;
+    bool changed = false;
+    // The nodes written by the gates that were dropped or added
+    uint64_t changedNodes = 0;
+    int g = 0;
+    for (int c = 0; c < (int)candidates.size(); c++) {
+        int start = candidates[c];
+        if (start < 0 || start >= size) continue;
+        // Add the unchanged gates that come before the candidate
+        for (; g < numGates && (dropped[g] || starts[g] < start); g++) {
+            if (dropped[g]) continue;
+            newGates.push_back(gates[g]);
+            newStarts.push_back(starts[g]);
+        }
+        if (g < numGates && starts[g] == start) continue;
+        if (isStartCodon(start, codonOne, codonTwo)) {
+            newGates.emplace_back(newGate(start));
+            newStarts.push_back(start);
+            changed = true;
+            changedNodes |= nodeMask(newGates.back()->outputs);
         }
-        // Update the state to get the transition and record it.
-        updateStates();
-        tpm[i].resize(mNumNodes);
-        for (int j = 0; j < mNumNodes; j++) {
-            tpm[i][j] = states[j];
+    }
+    for (; g < numGates; g++) {
+        if (dropped[g]) continue;
+        newGates.push_back(gates[g]);
+        newStarts.push_back(starts[g]);
+    }
+    for (g = 0; g < numGates; g++) {
+        if (dropped[g]) {
+            changed = true;
+            changedNodes |= nodeMask(gates[g]->outputs);
         }
     }
-    // Return animat to its original state.
-    for (int i = 0; i < mNumNodes; i++) {
-        states[i] = initial_states[i];
+    gates.swap(newGates);
+    gateStarts.swap(newStarts);
+    if (changed) compileProgram(changedNodes);
+    return changed;
+}
+
+void AbstractAgent::clearPhenotypeCache(uint64_t changedNodes) {
+    mHaveEdges = false;
+    // Every sampled transition depends on every gate, since the gates draw
+    // from the same stream one after the other
+    mStaleColumns |= mDeterministic ? changedNodes : ~0ULL;
+    mHavePhenotypeHash = false;
+    mHaveMotorProgram = false;
+}
+
+const vector<int> &AbstractAgent::getEdgeList() {
+    if (!mHaveEdges) {
+        vector< vector<int> > edges = getEdges();
+        edgeList.clear();
+        connectivityMatrix.assign(mNumNodes * mNumNodes, 0);
+        for (int i = 0; i < (int)edges.size(); i++) {
+            edgeList.push_back(edges[i][0]);
+            edgeList.push_back(edges[i][1]);
+            connectivityMatrix[edges[i][0] * mNumNodes + edges[i][1]] = 1;
+        }
+        mHaveEdges = true;
+    }
+    return edgeList;
+}
+
+const vector<unsigned char> &AbstractAgent::getConnectivityMatrix() {
+    getEdgeList();
+    return connectivityMatrix;
+}
+
+static std::invalid_argument tpmTooLarge() {
+    return std::invalid_argument("the TPM of agents with more than " +
+        std::to_string(MAX_TPM_NODES) + " nodes is too large");
+}
+
+const vector<uint64_t> &AbstractAgent::getTransitions() {
+    if (transitions && !mStaleColumns) return *transitions;
+    if (mNumNodes > MAX_TPM_NODES)
+        throw tpmTooLarge();
+    uint64_t allNodes = (1ULL << mNumNodes) - 1;
+    std::shared_ptr< vector<uint64_t> > next;
+    if (!mDeterministic) {
+        // Nondeterministic transitions are sampled from a dedicated stream,
+        // so that the sample only depends on the animat and its phenotype
+        next = std::make_shared< vector<uint64_t> >(mNumStates);
+        RandomStream transitionsRng(streamKey(mSeed, mGeneration, mIndex,
+                    TRANSITIONS_STREAM));
+        for (int i = 0; i < mNumStates; i++)
+            (*next)[i] = program.step(i, transitionsRng);
+    } else if (!transitions) {
+        next = std::make_shared< vector<uint64_t> >(mNumStates);
+        computeColumns(*next, allNodes);
+    } else {
+        // Copies may still hold the previous transitions
+        next = std::make_shared< vector<uint64_t> >(*transitions);
+        computeColumns(*next, mStaleColumns & allNodes);
+    }
+    transitions = next;
+    mStaleColumns = 0;
+    return *transitions;
+}
+
+void AbstractAgent::getNextStates(const uint64_t *states, uint64_t *next,
+        int n) {
+    uint64_t allNodes = (mNumNodes == MAX_NODES) ? ~0ULL :
+        (1ULL << mNumNodes) - 1;
+    for (int i = 0; i < n; i++) {
+        if (states[i] & ~allNodes)
+            throw std::out_of_range("state out of range");
+    }
+    if (transitions && !mStaleColumns) {
+        for (int i = 0; i < n; i++) next[i] = (*transitions)[states[i]];
+        return;
+    }
+    // The TPM of a nondeterministic agent is sampled a state at a time from
+    // the same stream, and every state takes the same number of draws, so
+    // the stream can be started where the given state's sample begins
+    RandomStream transitionsRng(streamKey(mSeed, mGeneration, mIndex,
+                TRANSITIONS_STREAM));
+    uint64_t draws = (uint64_t)program.drawsPerStep();
+    for (int i = 0; i < n; i++) {
+        transitionsRng.counter = states[i] * draws;
+        next[i] = program.step(states[i], transitionsRng);
+    }
+}
+
+void AbstractAgent::getTransitionProbabilities(double *tpm) {
+    if (mNumNodes > MAX_TPM_NODES)
+        throw tpmTooLarge();
+    for (int i = 0; i < mNumStates; i++)
+        program.stepProbabilities(i, tpm + (size_t)i * mNumNodes, mNumNodes);
+}
+
+void AbstractAgent::computeColumns(vector<uint64_t> &next,
+        uint64_t nodes) const {
+    if (!nodes) return;
+    // Only the gates that write to the nodes matter
+    GateProgram restricted;
+    const GateProgram *columnProgram = &program;
+    if (nodes != (1ULL << mNumNodes) - 1) {
+        restricted = program.restrictedTo(nodes);
+        columnProgram = &restricted;
+    }
+    // Bit `l` of slice `i` is the state of node `i` in state `first + l`
+    static const uint64_t LANE_BITS[6] = {
+        0xAAAAAAAAAAAAAAAAULL, 0xCCCCCCCCCCCCCCCCULL, 0xF0F0F0F0F0F0F0F0ULL,
+        0xFF00FF00FF00FF00ULL, 0xFFFF0000FFFF0000ULL, 0xFFFFFFFF00000000ULL,
+    };
+    vector<uint64_t> slices(mNumNodes);
+    uint64_t nextStates[64];
+    for (int first = 0; first < mNumStates; first += 64) {
+        for (int i = 0; i < mNumNodes; i++)
+            slices[i] = (i < 6) ? LANE_BITS[i] :
+                (((first >> i) & 1) ? ~0ULL : 0);
+        std::fill(nextStates + mNumNodes, nextStates + 64, 0);
+        columnProgram->stepSlices(slices.data(), nextStates, mNumNodes);
+        transpose64(nextStates);
+        int numLanes = std::min(64, mNumStates - first);
+        for (int lane = 0; lane < numLanes; lane++) {
+            next[first + lane] = (next[first + lane] & ~nodes) |
+                (nextStates[lane] & nodes);
+        }
+    }
+}
+
+// Mix a word into a hash (with the finalizer of SplitMix64)
+static inline uint64_t mixHash(uint64_t hash, uint64_t word) {
+    uint64_t z = hash ^ (word + 0x9E3779B97F4A7C15ULL);
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
+}
+
+uint64_t AbstractAgent::getPhenotypeHash() {
+    if (!mHavePhenotypeHash) {
+        const vector<unsigned char> &cm = getConnectivityMatrix();
+        const vector<uint64_t> &tpm = getTransitions();
+        uint64_t hash = mixHash(0, (uint64_t)mNumNodes);
+        // The connectivity matrix, a row of bits at a time
+        for (int i = 0; i < mNumNodes; i++) {
+            uint64_t row = 0;
+            for (int j = 0; j < mNumNodes; j++)
+                row |= (uint64_t)cm[i * mNumNodes + j] << j;
+            hash = mixHash(hash, row);
+        }
+        for (int i = 0; i < (int)tpm.size(); i++)
+            hash = mixHash(hash, tpm[i]);
+        mPhenotypeHash = hash;
+        mHavePhenotypeHash = true;
+    }
+    return mPhenotypeHash;
+}
+
+const GateProgram &AbstractAgent::getMotorProgram() {
+    if (!mHaveMotorProgram) {
+        // Only the last 2 motors have an effect (see getAction)
+        uint64_t motors = mNumMotors > 0 ? 3ULL << (mNumNodes - 2) : 0;
+        motorProgram = program.affecting(motors);
+        mHaveMotorProgram = true;
     }
-    return tpm;
+    return motorProgram;
 }
 
 void AbstractAgent::printGates() {
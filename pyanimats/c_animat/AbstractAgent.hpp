@@ -2,11 +2,17 @@
 
 #pragma once
 
+#include <stdint.h>
+
+#include <algorithm>
+#include <memory>
 #include <vector>
 
 #include "./constants.hpp"
 #include "./rng.hpp"
 #include "./AbstractGate.hpp"
+#include "./GateProgram.hpp"
+#include "./Genome.hpp"
 
 using std::vector;
 
@@ -22,27 +28,149 @@ class AbstractAgent {
     int mNumHidden;
     int mNumMotors;
     int mNumNodes;
+    // 2^mNumNodes, or 0 if the agent has more than MAX_TPM_NODES nodes
     int mNumStates;
     int mBodyLength;
     bool mDeterministic;
 
-    vector<AbstractGate*> gates;
+    // The experiment seed, generation, and index that identify the animat's
+    // random number streams
+    uint64_t mSeed;
+    uint64_t mGeneration;
+    uint64_t mIndex;
+    // Number of games played since the streams were seeded; this is the
+    // replicate number of the next game's stream
+    uint64_t mGamesPlayed;
+    // The animat's own stream, used for mutation
+    RandomStream rng;
+
+    // Gates never change once built, so copies of the agent share them
+    vector< std::shared_ptr<const AbstractGate> > gates;
+    // The gates compiled into a single program that advances the state,
+    // without the gates whose outputs are all overwritten by later ones
+    GateProgram program;
+
+    // Maps each state (packed with the little-endian convention) to the next
+    // state. Only compiled for deterministic agents with at most
+    // MAX_TABLE_NODES nodes; empty otherwise or if not yet compiled.
+    vector<uint16_t> transitionTable;
 
-    vector<unsigned char> genome;
-    // TODO(wmayner) change these to bool?
-    vector<unsigned char> states;
-    vector<unsigned char> newStates;
+    Genome genome;
+
+    // A change to the genome: a point mutation at `position` if `width` is
+    // 0, the insertion of `width` nucleotides before `position` if it's
+    // positive, or the deletion of `-width` nucleotides from `position` on if
+    // it's negative
+    struct GenomeEdit {
+        int position;
+        int width;
+    };
+    // The changes made by the last call to mutateGenome, in order (positions
+    // are in the genome as it was when the change was made)
+    vector<GenomeEdit> mutations;
+
+    // The state of every node, packed with the little-endian convention
+    // (node `i` is bit `i`)
+    uint64_t state;
 
     int getAction();
     void resetState();
-    void updateStates();
+    void updateStates(RandomStream &rng);
+    // Advances the state with the given program (`program` or
+    // getMotorProgram()) unless there is a transition table
+    void updateStates(RandomStream &rng, const GateProgram &stepProgram);
+    void compileProgram(uint64_t changedNodes);
+    void compileTransitionTable();
+    void seedStreams(uint64_t seed, uint64_t generation, uint64_t index);
+    RandomStream nextGameStream();
     void injectStartCodons(int n, unsigned char codon_one,
             unsigned char codon_two);
-    void mutateGenome(double mutProb, double dupProb, double delProb, int
+    bool mutateGenome(double mutProb, double dupProb, double delProb, int
         minGenomeLength, int maxGenomeLength, int minDupDelLength,
         int maxDupDelLength);
-    vector< vector<bool> > getTransitions();
     void printGates();
 
-    virtual void generatePhenotype() = 0;
+    // What the phenotype determines, computed when first needed and kept
+    // until the phenotype is regenerated (or, for nondeterministic agents,
+    // whose transitions are sampled, until the streams are reseeded)
+    //
+    // The edges between nodes, a (from, to) pair after another; may contain
+    // duplicates
+    const vector<int> &getEdgeList();
+    // Whether node `i` is connected to node `j`, at `i * mNumNodes + j`
+    const vector<unsigned char> &getConnectivityMatrix();
+    // The next state of each state (packed with the little-endian convention).
+    // For deterministic agents, only the columns of the nodes written by a
+    // gate that changed since they were last computed are recomputed.
+    const vector<uint64_t> &getTransitions();
+    // The next state of each of the `n` given states, without computing the
+    // transitions of every state (unless they already are). Nondeterministic
+    // agents give the same sample as getTransitions.
+    void getNextStates(const uint64_t *states, uint64_t *next, int n);
+    // The probability of each node being on after each state, in a row of
+    // `mNumNodes` values per state: the exact state-by-node TPM that the
+    // transitions of a nondeterministic agent are a sample of
+    void getTransitionProbabilities(double *tpm);
+    // A hash of the connectivity matrix and transitions
+    uint64_t getPhenotypeHash();
+    // The program without the gates that can't affect the motors (see
+    // GateProgram::affecting): the agent moves the same way, but the states
+    // of the other nodes are meaningless
+    const GateProgram &getMotorProgram();
+
+    // Returns whether the phenotype may have changed
+    virtual bool generatePhenotype() = 0;
+    // The edges between nodes as (from, to) pairs
+    virtual vector< vector<int> > getEdges() = 0;
+    // A copy of the agent. It shares the chunks of the genome and the gates
+    // with this agent, until one of them is mutated.
+    virtual AbstractAgent *clone() const = 0;
+
+ protected:
+    // Brings the gates up to date with the genome. The first call scans the
+    // whole genome for start codons; after that, only the gates that read a
+    // part of the genome changed by mutateGenome are rebuilt, and only the
+    // positions around those changes are checked for new start codons. The
+    // program is recompiled only if a gate changed. Returns whether one did
+    // (always true after a full scan).
+    bool buildGates(unsigned char codonOne, unsigned char codonTwo);
+    // The gate whose start codon is at the given position
+    virtual AbstractGate *newGate(int start) = 0;
+
+ private:
+    // The changes to the genome since the gates were last built
+    vector<GenomeEdit> genomeEdits;
+    // Whether the gates were built and the changes logged since
+    bool mHaveGates;
+    // The position of each gate's start codon
+    vector<int> gateStarts;
+
+    void logGenomeEdit(int position, int width);
+    bool isStartCodon(int i, unsigned char codonOne, unsigned char codonTwo);
+
+    bool mHaveEdges;
+    vector<int> edgeList;
+    vector<unsigned char> connectivityMatrix;
+    // Shared with copies of the agent, like the gates
+    std::shared_ptr<const vector<uint64_t> > transitions;
+    // The nodes whose column of `transitions` is out of date
+    uint64_t mStaleColumns;
+    bool mHavePhenotypeHash;
+    uint64_t mPhenotypeHash;
+    bool mHaveMotorProgram;
+    GateProgram motorProgram;
+
+    void clearPhenotypeCache(uint64_t changedNodes);
+    // Computes the given nodes' columns of the transitions of a
+    // deterministic agent, leaving the others as they are
+    void computeColumns(vector<uint64_t> &next, uint64_t nodes) const;
 };
+
+// Mutates every agent (see AbstractAgent::mutateGenome) on a pool of threads
+// and stores whether the phenotype of agent `i` may have changed in
+// `changed[i]`. If `numThreads` is less than 1, one thread per hardware
+// thread is used.
+void mutateAgents(const vector<AbstractAgent*> &agents, unsigned char
+        *changed, double mutProb, double dupProb, double delProb, int
+        minGenomeLength, int maxGenomeLength, int minDupDelLength, int
+        maxDupDelLength, int numThreads);
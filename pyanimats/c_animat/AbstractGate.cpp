@@ -10,6 +10,7 @@ AbstractGate::AbstractGate(const int numSensors, const int numHidden,
     mNumMotors = numMotors;
     mNumNodes = numSensors + numHidden + numMotors;
     mDeterministic = deterministic;
+    span = 0;
 
     inputs.clear();
     outputs.clear();
@@ -6,6 +6,8 @@
 
 #include <vector>
 
+#include "./GateProgram.hpp"
+
 using std::vector;
 
 // Abstract base class for different types of gates
@@ -23,8 +25,12 @@ class AbstractGate {
 
     unsigned char numInputs, numOutputs;
     vector<unsigned char> inputs, outputs;
-
-    virtual void update(vector<unsigned char> &currentStates,
-            vector<unsigned char> &nextStates) = 0;
-    virtual void print() = 0;
+    // The number of nucleotides the gate reads, from its start codon on; the
+    // gate only depends on those (and on the genome's size, if they wrap
+    // around its end)
+    int span;
+
+    // Append the gate to the given program
+    virtual void compile(GateProgram &program) const = 0;
+    virtual void print() const = 0;
 };
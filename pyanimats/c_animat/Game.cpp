@@ -1,95 +1,437 @@
 // Game.cpp
 
+#include <string.h>
+
+#include <algorithm>
+
 #include "./rng.hpp"
 #include "./Game.hpp"
+#include "./ThreadPool.hpp"
 
-int wrap(int i, int width) {
-    // TODO This requires that width is a power of 2
-    return i & (width - 1);
+/**
+ * Scrambles the successive states of the world in a trial: the timesteps and
+ * the cells of the world are shuffled. The spatial permutation
+ * `worldTransform` accumulates from trial to trial.
+ */
+void scramble(vector<uint64_t> &world, vector<int> &worldTransform,
+        int worldWidth, RandomStream &rng) {
+    // Scramble time
+    rng.shuffle(world.begin(), world.end());
+    // Scramble space
+    rng.shuffle(worldTransform.begin(), worldTransform.end());
+    uint64_t worldState, scrambledWorldState;
+    for (int timestep = 0; timestep < (int)world.size(); timestep++) {
+        worldState = world[timestep];
+        scrambledWorldState = 0;
+        for (int i = 0; i < worldWidth; i++) {
+            scrambledWorldState +=
+                ((worldState >> worldTransform[i]) & 1) << i;
+        }
+        world[timestep] = scrambledWorldState;
+    }
 }
 
 /**
- * Executes a game, updates the agent's hit count accordingly, and returns a
- * vector of the agent's state transitions over the course of the game
+ * Returns the states of the sensors of an agent at the given position, packed
+ * with sensor `i` in bit `i`. The sensors are activated if the block is in
+ * their line of sight.
  */
-vector<int> executeGame(vector<unsigned char> &allAnimatStates, vector<int>
-        &allWorldStates, vector<int> &allAnimatPositions, vector<int>
-        &trialResults, AbstractAgent* agent, vector<int> hitMultipliers,
-        vector<int> patterns, int worldWidth, int worldHeight,
-        bool scrambleWorld, double noiseLevel) {
+uint64_t readSensors(uint64_t worldState, int agentPos,
+        const GameConfig &config) {
+    uint64_t view = config.relativeWorld(worldState, agentPos);
+    uint64_t sensors = 0;
+    for (int i = 0; i < (int)config.sensorCells.size(); i++)
+        sensors |= ((view >> config.sensorCells[i]) & 1) << i;
+    return sensors;
+}
+
+/**
+ * Returns whether an agent at the given position overlaps the block.
+ */
+bool detectHit(uint64_t worldState, int agentPos, const GameConfig &config) {
+    return (config.relativeWorld(worldState, agentPos) & config.bodyMask) != 0;
+}
+
+/**
+ * Returns the position of an agent after it takes the given action.
+ */
+int moveAgent(int agentPos, int action, int worldWidth) {
+    switch (action) {
+        // No motors on
+        case 0:
+            // Don't move
+            break;
+        // Both motors on
+        case 3:
+            // Don't move
+            break;
+        // Right motor on
+        case 1:
+            // Move left
+            agentPos = wrap(agentPos - 1, worldWidth);
+            break;
+        // Left motor on
+        case 2:
+            // Move right
+            agentPos = wrap(agentPos + 1, worldWidth);
+            break;
+    }
+    return agentPos;
+}
+
+/**
+ * Returns the result of a trial given whether the agent hit the block.
+ */
+int trialResult(bool hit, int hitMultiplier) {
+    if (hitMultiplier > 0)
+        return hit ? CORRECT_CATCH : WRONG_AVOID;
+    return hit ? WRONG_CATCH : CORRECT_AVOID;
+}
+
+/**
+ * Maps the configurations reached in a game (see `executeGame`), packed into
+ * single words, to the trial that first reached them. Open addressing;
+ * entries are invalidated in bulk by bumping a stamp, so the table can be
+ * reused from game to game.
+ */
+class ConfigurationTable {
+ public:
+    ConfigurationTable() : mStamp(0), mMask(0) {}
+
+    void reset(int numConfigurations) {
+        size_t capacity = 16;
+        while (capacity < 2 * (size_t)numConfigurations) capacity *= 2;
+        if (capacity > entries.size()) {
+            entries.assign(capacity, Entry());
+            mStamp = 0;
+        }
+        mMask = entries.size() - 1;
+        if (++mStamp == 0) {
+            std::fill(entries.begin(), entries.end(), Entry());
+            mStamp = 1;
+        }
+    }
+
+    // Returns the trial that first reached the configuration, or records that
+    // the given trial reached it and returns -1
+    int findOrInsert(uint64_t configuration, int trial) {
+        uint64_t h = configuration * 0x9E3779B97F4A7C15ULL;
+        for (size_t i = (h >> 32) & mMask; ; i = (i + 1) & mMask) {
+            Entry &entry = entries[i];
+            if (entry.stamp != mStamp) {
+                entry.configuration = configuration;
+                entry.trial = trial;
+                entry.stamp = mStamp;
+                return -1;
+            }
+            if (entry.configuration == configuration)
+                return entry.trial;
+        }
+    }
+
+ private:
+    struct Entry {
+        uint64_t configuration = 0;
+        int trial = 0;
+        uint32_t stamp = 0;
+    };
+    vector<Entry> entries;
+    uint32_t mStamp;
+    size_t mMask;
+};
+
+static thread_local ConfigurationTable configurations;
+
+/**
+ * Fills in the rest of a trial, from the given timestep on, with the rest of
+ * an earlier trial that reached the same configuration at that timestep. The
+ * world and the agent are shifted by the difference between the agents'
+ * positions.
+ */
+void copyTrialRemainder(const GameRecord &record, int source, int destination,
+        int timestep, int agentPos, int numNodes, const GameConfig &config) {
+    int worldWidth = config.worldWidth;
+    int worldHeight = config.worldHeight;
+    long from = (long)source * worldHeight + timestep;
+    long to = (long)destination * worldHeight + timestep;
+    int remaining = worldHeight - timestep;
+    if (record.worldStates) {
+        int shift = wrap(agentPos - record.animatPositions[from], worldWidth);
+        for (int t = 0; t < remaining; t++) {
+            record.worldStates[to + t] =
+                config.rotate(record.worldStates[from + t], shift);
+            record.animatPositions[to + t] = (uint8_t)wrap(
+                    record.animatPositions[from + t] + shift, worldWidth);
+        }
+    }
+    if (record.packedStates) {
+        std::copy(record.packedStates + from,
+                record.packedStates + from + remaining,
+                record.packedStates + to);
+    }
+    if (record.animatStates) {
+        std::copy(record.animatStates + from * numNodes,
+                record.animatStates + (from + remaining) * numNodes,
+                record.animatStates + to * numNodes);
+    }
+}
+
+// `spreadBits[b]` has bit `i` of the byte `b` in byte `i`, so that adding
+// spread bytes counts eight bits at once, one per byte
+struct SpreadBits {
+    uint64_t table[256];
+    SpreadBits() {
+        for (int b = 0; b < 256; b++) {
+            table[b] = 0;
+            for (int i = 0; i < 8; i++)
+                if (b & (1 << i)) table[b] |= 1ULL << (8 * i);
+        }
+    }
+};
+static const SpreadBits spreadBits;
+
+/**
+ * Records the state of the agent at the given index of a game.
+ */
+inline void recordState(const GameRecord &record, long index, uint64_t state,
+        int numNodes) {
+    if (record.packedStates) record.packedStates[index] = state;
+    if (record.animatStates) {
+        // Eight nodes at a time, spread into a byte each
+        unsigned char *row = record.animatStates + index * numNodes;
+        for (int n = 0; n < numNodes; n += 8) {
+            uint64_t bytes = spreadBits.table[(state >> n) & 0xff];
+#if __BYTE_ORDER__ == __ORDER_BIG_ENDIAN__
+            bytes = __builtin_bswap64(bytes);
+#endif
+            memcpy(row + n, &bytes, std::min(8, numNodes - n));
+        }
+    }
+}
+
+/**
+ * Plays the trials of a game 64 at a time, for deterministic agents.
+ *
+ * The state of each node in 64 trials is held in a single word (one trial per
+ * bit, or "lane"), and the agent's program is evaluated on those words, so
+ * that all the lanes advance together. The world, sensors, hits, and
+ * movement are handled lane by lane. Deterministic agents never draw from the
+ * game's stream while they're updated, so the scrambled worlds and sensor
+ * noise of every trial are drawn beforehand, in the same order as in
+ * `executeTrials`; the outputs are identical.
+ */
+vector<int> executeBitSlicedTrials(const GameRecord &record,
+        AbstractAgent* agent, const GateProgram &program,
+        const GameConfig &config, bool scrambleWorld, double noiseLevel,
+        RandomStream &rng) {
+    vector<int> totals;
+    totals.resize(2, 0);
+
+    int numNodes = agent->mNumNodes;
+    int numSensors = agent->mNumSensors;
+    int numTrials = config.numTrials;
+    int worldWidth = config.worldWidth;
+    int worldHeight = config.worldHeight;
+    bool recordStates = record.packedStates || record.animatStates;
+    if (record.activity)
+        std::fill(record.activity, record.activity + numNodes, 0);
+
+    // Draw the scrambled worlds and sensor noise of every trial
+    vector<uint64_t> scrambledWorlds;
+    vector<uint64_t> sensorNoise;
+    if (scrambleWorld) scrambledWorlds.resize(numTrials * worldHeight);
+    if (noiseLevel > 0.0) sensorNoise.resize(numTrials * worldHeight, 0);
+    vector<uint64_t> world(worldHeight);
+    vector<int> worldTransform(worldWidth);
+    for (int i = 0; i < worldWidth; i++) worldTransform[i] = i;
+    for (int trial = 0; trial < numTrials; trial++) {
+        if (scrambleWorld) {
+            world.assign(config.trialWorld(trial),
+                    config.trialWorld(trial) + worldHeight);
+            scramble(world, worldTransform, worldWidth, rng);
+            std::copy(world.begin(), world.end(),
+                    scrambledWorlds.begin() + trial * worldHeight);
+        }
+        if (noiseLevel > 0.0) {
+            for (int t = 0; t < worldHeight; t++) {
+                for (int i = 0; i < numSensors; i++) {
+                    if (rng.randDouble() < noiseLevel)
+                        sensorNoise[trial * worldHeight + t] |= 1ULL << i;
+                }
+            }
+        }
+    }
+
+    vector<uint64_t> slices(numNodes);
+    vector<uint64_t> nextSlices(numNodes);
+    int agentPos[64];
+    uint64_t worldStates[64];
+    uint64_t states[64];
+    for (int first = 0; first < numTrials; first += 64) {
+        int numLanes = std::min(64, numTrials - first);
+        std::fill(slices.begin(), slices.end(), 0);
+        for (int lane = 0; lane < numLanes; lane++)
+            agentPos[lane] = config.trialPositions[first + lane];
+
+        for (int timestep = 0; timestep < worldHeight; timestep++) {
+            for (int i = 0; i < numSensors; i++) slices[i] = 0;
+            for (int lane = 0; lane < numLanes; lane++) {
+                long index = (long)(first + lane) * worldHeight + timestep;
+                worldStates[lane] = scrambleWorld ? scrambledWorlds[index] :
+                    config.trialWorld(first + lane)[timestep];
+                // Record the world state and agent position
+                if (record.worldStates) {
+                    record.worldStates[index] = worldStates[lane];
+                    record.animatPositions[index] = (uint8_t)agentPos[lane];
+                }
+                uint64_t sensors = readSensors(worldStates[lane],
+                        agentPos[lane], config);
+                if (noiseLevel > 0.0) sensors ^= sensorNoise[index];
+                for (int i = 0; i < numSensors; i++)
+                    slices[i] |= ((sensors >> i) & 1) << lane;
+            }
+
+            // The sensors' slices before updating the agent, and the hidden
+            // units' and motors' after, are the agent's state in each lane
+            std::copy(slices.begin(), slices.begin() + numSensors, states);
+
+            program.stepSlices(slices.data(), nextSlices.data(), numNodes);
+            slices.swap(nextSlices);
+
+            std::copy(slices.begin() + numSensors, slices.end(),
+                    states + numSensors);
+            // Count activity a slice at a time, rather than from the states
+            if (record.activity) {
+                uint64_t laneMask = (numLanes == 64) ? ~0ULL :
+                    (1ULL << numLanes) - 1;
+                for (int n = 0; n < numNodes; n++)
+                    record.activity[n] += __builtin_popcountll(
+                            states[n] & laneMask);
+            }
+            if (recordStates) {
+                std::fill(states + numNodes, states + 64, 0);
+                transpose64(states);
+                for (int lane = 0; lane < numLanes; lane++) {
+                    long index = (long)(first + lane) * worldHeight + timestep;
+                    recordState(record, index, states[lane], numNodes);
+                }
+            }
+
+            if (timestep == worldHeight - 1) {
+                for (int lane = 0; lane < numLanes; lane++) {
+                    bool hit = detectHit(worldStates[lane], agentPos[lane],
+                            config);
+                    int result = trialResult(hit, config.hitMultipliers[
+                            config.trialPatterns[first + lane]]);
+                    if (result == CORRECT_CATCH || result == CORRECT_AVOID)
+                        totals[CORRECT]++;
+                    else
+                        totals[INCORRECT]++;
+                    record.trialResults[first + lane] = (uint8_t)result;
+                }
+                break;
+            }
+
+            if (agent->mNumMotors > 0) {
+                uint64_t leftMotor = slices[numNodes - 2];
+                uint64_t rightMotor = slices[numNodes - 1];
+                for (int lane = 0; lane < numLanes; lane++) {
+                    int action = (int)((((leftMotor >> lane) & 1) << 1) +
+                            ((rightMotor >> lane) & 1));
+                    agentPos[lane] = moveAgent(agentPos[lane], action,
+                            worldWidth);
+                }
+            }
+        }
+    }
+    return totals;
+}
+
+/**
+ * Plays the trials of a game one at a time, advancing the agent with the
+ * given program when it has no transition table.
+ */
+vector<int> executeTrials(const GameRecord &record, AbstractAgent* agent,
+        const GateProgram &program, const GameConfig &config,
+        bool scrambleWorld, double noiseLevel, RandomStream &rng) {
     // Holds the correct/incorrect counts; this is returned
     vector<int> totals;
     totals.resize(2, 0);
 
-    // Holds all the states of the world
-    vector<int> world;
-    world.clear();
-    world.resize(worldHeight);
+    const vector<int> &hitMultipliers = config.hitMultipliers;
+    const vector<uint64_t> &patterns = config.patterns;
+    int worldWidth = config.worldWidth;
+    int worldHeight = config.worldHeight;
+
+    // Holds the states of the world if they're scrambled; otherwise they're
+    // read from the config
+    vector<uint64_t> scrambledWorld;
+    const uint64_t *world;
 
     // Permutation that redirects agent's sensors. Defaults to doing nothing
     // (identity permutation)
     vector<int> worldTransform;
-    worldTransform.resize(worldWidth);
-    for (int i = 0; i < worldWidth; i++) worldTransform[i] = i;
+    if (scrambleWorld) {
+        worldTransform.resize(worldWidth);
+        for (int i = 0; i < worldWidth; i++) worldTransform[i] = i;
+    }
 
     int initAgentPos, agentPos;
     int patternIndex, direction, timestep;
     int action;
 
-    int allAnimatStatesIndex = 0;
-    int allWorldStatesIndex = 0;
-    int allAnimatPositionsIndex = 0;
-    int trialResultsIndex = 0;
+    // Advance deterministic agents with a single table lookup per timestep if
+    // possible
+    agent->compileTransitionTable();
+
+    // The bits of the agent's state that hold its sensors
+    uint64_t sensorMask = 0;
+    for (int i = 0; i < agent->mNumSensors; i++) sensorMask |= 1ULL << i;
+
+    // For a deterministic agent in an unscrambled, noise-free world, the rest
+    // of a trial only depends on the agent's state, the world as seen from
+    // the agent, the direction of the block, and the timestep. Trials often
+    // reach the same configuration, so the rest of such a trial is copied
+    // from the first one that reached it, shifted to the agent's position.
+    // Configurations are only looked up every MEMO_INTERVAL timesteps, since
+    // a lookup costs about as much as simulating a timestep. They're packed
+    // into a word: the agent's state (it has a transition table, so at most
+    // MAX_TABLE_NODES nodes), the world, the direction, and the timestep.
+    bool memoize = config.fastPaths && !agent->transitionTable.empty() &&
+        !scrambleWorld && noiseLevel == 0.0 && worldWidth <= 32 &&
+        worldHeight <= 32768;
+    ConfigurationTable &table = configurations;
+    if (memoize) {
+        table.reset(config.numTrials *
+                ((worldHeight + MEMO_INTERVAL - 1) / MEMO_INTERVAL));
+    }
+
+    int trial = 0;
     // Block patterns
     for (patternIndex = 0; patternIndex < (int)patterns.size(); patternIndex++) {
         // Directions (left/right)
         for (direction = -1; direction < 2; direction += 2) {
             // Agent starting position
-            for (initAgentPos = 0; initAgentPos < worldWidth; initAgentPos++) {
+            for (initAgentPos = 0; initAgentPos < worldWidth;
+                    initAgentPos++, trial++) {
                 // Set agent position
                 agentPos = initAgentPos;
 
                 agent->resetState();
 
-                // Generate world
-                world.resize(worldHeight);
-                int worldState = patterns[patternIndex];
-
-                for (timestep = 0; timestep < worldHeight; timestep++) {
-                    world[timestep] = worldState;
-                    // Move the block
-                    if (direction == -1) {
-                        // Left
-                        worldState = ((worldState >> 1) & 65535) +
-                            ((worldState & 1) << (worldWidth - 1));
-                    } else {
-                        // Right
-                        worldState = ((worldState << 1) & 65535) +
-                            ((worldState >> (worldWidth - 1)) & 1);
-                    }
-                }
-
+                // Get the world
+                world = config.trialWorld(trial);
                 if (scrambleWorld) {
-                    // Scramble time
-                    std::shuffle(world.begin(), world.end(), mersenne);
-                    // Scramble space
-                    std::shuffle(worldTransform.begin(), worldTransform.end(),
-                            mersenne);
-                    int scrambledWorldState;
-                    for (timestep = 0; timestep < worldHeight; timestep++) {
-                        worldState = world[timestep];
-                        scrambledWorldState = 0;
-                        for (int i = 0; i < worldWidth; i++) {
-                            scrambledWorldState +=
-                                ((worldState >> worldTransform[i]) & 1) << i;
-                        }
-                        world[timestep] = scrambledWorldState;
-                    }
+                    scrambledWorld.assign(world, world + worldHeight);
+                    scramble(scrambledWorld, worldTransform, worldWidth, rng);
+                    world = scrambledWorld.data();
                 }
+                uint64_t worldState;
 
                 #ifdef _DEBUG
                     printf("\n\n-------------------------");
-                    printf("\n   Block pattern: %i", patterns[patternIndex]);
+                    printf("\n   Block pattern: %llu",
+                        (unsigned long long)patterns[patternIndex]);
                     printf("\n       Direction: %i", direction);
                     printf("\nInitial position: %i", initAgentPos);
                     printf("\n\n");
@@ -98,36 +440,57 @@ vector<int> executeGame(vector<unsigned char> &allAnimatStates, vector<int>
                 // World loop
                 for (timestep = 0; timestep < worldHeight; timestep++) {
                     worldState = world[timestep];
-                    // Record the world state
-                    allWorldStates[allWorldStatesIndex++] = worldState;
-                    // Record agent position
-                    allAnimatPositions[allAnimatPositionsIndex++] = agentPos;
+                    long index = (long)trial * worldHeight + timestep;
 
-                    // Activate sensors if block is in line of sight
-                    // TODO(wmayner) parametrize sensor location on agent body
-                    if (agent->mNumSensors == 2) {
-                        agent->states[0] = (worldState >> agentPos) & 1;
-                        agent->states[1] =
-                            (worldState >> wrap(agentPos + 2, worldWidth)) & 1;
-                    }
-                    else {
-                        for (int i = 0; i < agent->mNumSensors; i++) {
-                            agent->states[i] =
-                                (worldState >> wrap(agentPos + i, worldWidth)) & 1;
+                    if (memoize && (timestep & (MEMO_INTERVAL - 1)) == 0) {
+                        uint64_t relativeWorld =
+                            config.relativeWorld(worldState, agentPos);
+                        uint64_t configuration =
+                            (agent->state & ~sensorMask) |
+                            (relativeWorld << 16) |
+                            ((uint64_t)(direction > 0) << 48) |
+                            ((uint64_t)timestep << 49);
+                        int first = table.findOrInsert(configuration, trial);
+                        if (first >= 0) {
+                            copyTrialRemainder(record, first, trial, timestep,
+                                    agentPos, agent->mNumNodes, config);
+                            int firstResult = record.trialResults[first];
+                            bool hit = (firstResult == CORRECT_CATCH ||
+                                    firstResult == WRONG_CATCH);
+                            int result = trialResult(hit,
+                                    hitMultipliers[patternIndex]);
+                            if (result == CORRECT_CATCH ||
+                                    result == CORRECT_AVOID)
+                                totals[CORRECT]++;
+                            else
+                                totals[INCORRECT]++;
+                            record.trialResults[trial] = (uint8_t)result;
+                            break;
                         }
                     }
 
+                    // Record the world state and agent position
+                    if (record.worldStates) {
+                        record.worldStates[index] = worldState;
+                        record.animatPositions[index] = (uint8_t)agentPos;
+                    }
+
+                    // Activate sensors if block is in line of sight
+                    uint64_t sensors = readSensors(worldState, agentPos,
+                            config);
+
                     // Independently flip sensor states according to noise level
                     if (noiseLevel > 0.0) {
                         for (int i = 0; i < agent->mNumSensors; i++) {
-                            if (randDouble() < noiseLevel) {
-                                agent->states[i] = ~agent->states[i] & 1;
+                            if (rng.randDouble() < noiseLevel) {
+                                sensors ^= 1ULL << i;
                                 #ifdef _DEBUG
                                     printf("! Flipped sensor %i\n", i);
                                 #endif
                             }
                         }
                     }
+                    agent->state = (agent->state & ~sensorMask) | sensors;
 
                     #ifdef _DEBUG
                         // Print the world
@@ -145,17 +508,17 @@ vector<int> executeGame(vector<unsigned char> &allAnimatStates, vector<int>
                         bool space;
                         for (int i = 0; i < worldWidth; i++) {
                             space = true;
-                            for (int k = 0; k < agent->mBodyLength; k++)
+                            for (int k = 0; k < config.bodyLength; k++)
                                 if (wrap(agentPos + k, worldWidth) == i) {
                                     if (agent->mNumSensors > 2) {
-                                        printf("%i", agent->states[k]);
+                                        printf("%i", (int)((agent->state >> k) & 1));
                                     } else {
                                         if (k == 0)
-                                            printf("%i", agent->states[0]);
+                                            printf("%i", (int)(agent->state & 1));
                                         if (k == 1)
                                             printf("-");
                                         if (k == 2)
-                                            printf("%i", agent->states[1]);
+                                            printf("%i", (int)((agent->state >> 1) & 1));
                                     }
                                     space = false;
                                 }
@@ -169,40 +532,31 @@ vector<int> executeGame(vector<unsigned char> &allAnimatStates, vector<int>
                     // TODO(wmayner) parameterize changing sensors mid-evolution
                     // Larissa: Set to 0 to evolve agents with just one sensor
 
-                    // Record state of sensors
-                    for (int n = 0; n < agent->mNumSensors; n++)
-                        allAnimatStates[allAnimatStatesIndex++] = agent->states[n];
+                    agent->updateStates(rng, program);
 
-                    agent->updateStates();
-
-                    // Record state of hidden units and motors after updating animat
-                    for (int n = agent->mNumSensors; n < agent->mNumNodes; n++) {
-                        allAnimatStates[allAnimatStatesIndex++] = agent->states[n];
-                    }
+                    // Record state of sensors, and of hidden units and motors
+                    // after updating animat
+                    recordState(record, index,
+                            (agent->state & ~sensorMask) | sensors,
+                            agent->mNumNodes);
 
                     // Update hitcount if this is the last timestep
                     if (timestep == worldHeight - 1) {
-                        int hit = 0;
-                        for (int i = 0; i < agent->mBodyLength; i++) {
-                            if (((worldState >>
-                                    (wrap(agentPos + i, worldWidth))) & 1)
-                                    == 1)
-                                hit = 1;
-                        }
+                        int hit = detectHit(worldState, agentPos, config);
                         #ifdef _DEBUG
                         printf("-----------------\n");
                         #endif
                         if (hitMultipliers[patternIndex] > 0) {
                             if (hit == 1) {
                                 totals[CORRECT]++;
-                                trialResults[trialResultsIndex++] = CORRECT_CATCH;
+                                record.trialResults[trial] = CORRECT_CATCH;
                                 #ifdef _DEBUG
                                 printf("CAUGHT (CORRECT!)");
                                 #endif
                             }
                             else {
                                 totals[INCORRECT]++;
-                                trialResults[trialResultsIndex++] = WRONG_AVOID;
+                                record.trialResults[trial] = WRONG_AVOID;
                                 #ifdef _DEBUG
                                 printf("AVOIDED (WRONG.)");
                                 #endif
@@ -211,14 +565,14 @@ vector<int> executeGame(vector<unsigned char> &allAnimatStates, vector<int>
                         if (hitMultipliers[patternIndex] <= 0) {
                             if (hit == 0) {
                                 totals[CORRECT]++;
-                                trialResults[trialResultsIndex++] = CORRECT_AVOID;
+                                record.trialResults[trial] = CORRECT_AVOID;
                                 #ifdef _DEBUG
                                 printf("AVOIDED (CORRECT!)");
                                 #endif
                             }
                             else {
                                 totals[INCORRECT]++;
-                                trialResults[trialResultsIndex++] = WRONG_CATCH;
+                                record.trialResults[trial] = WRONG_CATCH;
                                 #ifdef _DEBUG
                                 printf("CAUGHT (WRONG.)");
                                 #endif
@@ -232,29 +586,126 @@ vector<int> executeGame(vector<unsigned char> &allAnimatStates, vector<int>
                     action = agent->getAction();
 
                     // Move agent
-                    switch (action) {
-                        // No motors on
-                        case 0:
-                            // Don't move
-                            break;
-                        // Both motors on
-                        case 3:
-                            // Don't move
-                            break;
-                        // Right motor on
-                        case 1:
-                            // Move left
-                            agentPos = wrap(agentPos - 1, worldWidth);
-                            break;
-                        // Left motor on
-                        case 2:
-                            // Move right
-                            agentPos = wrap(agentPos + 1, worldWidth);
-                            break;
-                    }
+                    agentPos = moveAgent(agentPos, action, worldWidth);
                 } // End world loop
             }  // Agent starting position
         }  // Directions
     }  // Block patterns
     return totals;
-}  // executeGame
+}  // executeTrials
+
+// Scratch space for the packed states of a game, when they're needed to count
+// activity or histograms but aren't recorded
+static thread_local vector<uint64_t> packedScratch;
+
+
+// Add to `activity[i]` the number of the given states in which bit `i` is on,
+// for each of the lower `numNodes` bits
+static void countActivity(const uint64_t *states, long numStates,
+        int numNodes, int *activity) {
+    int numBytes = (numNodes + 7) / 8;
+    uint64_t counters[8];
+    for (long start = 0; start < numStates; start += 255) {
+        // Byte counters overflow after 255 states, so flush them every 255
+        long end = std::min(numStates, start + 255);
+        std::fill(counters, counters + numBytes, 0);
+        for (long t = start; t < end; t++) {
+            for (int b = 0; b < numBytes; b++)
+                counters[b] += spreadBits.table[(states[t] >> (8 * b)) & 0xff];
+        }
+        for (int i = 0; i < numNodes; i++)
+            activity[i] += (counters[i / 8] >> (8 * (i % 8))) & 0xff;
+    }
+}
+
+/**
+ * Executes a game, updates the agent's hit count accordingly, and returns a
+ * vector of the agent's state transitions over the course of the game.
+ * Records what the given record asks for (see GameRecord).
+ */
+vector<int> executeGame(const GameRecord &record, AbstractAgent* agent,
+        const GameConfig &config, bool scrambleWorld, double noiseLevel) {
+    long numTimesteps = (long)config.numTrials * config.worldHeight;
+    // A table lookup per trial beats advancing 64 trials at a time, so only
+    // deterministic agents too large for a transition table are bit-sliced
+    bool bitSliced = config.fastPaths && agent->mDeterministic &&
+        agent->mNumNodes > MAX_TABLE_NODES;
+    // Histograms, and the activity of games that aren't bit-sliced (which
+    // count it themselves), are counted from the packed states
+    bool countActivityHere = record.activity && !bitSliced;
+    GameRecord out = record;
+    if (!out.packedStates && (countActivityHere || out.histograms)) {
+        packedScratch.resize(numTimesteps);
+        out.packedStates = packedScratch.data();
+    }
+
+    // When only the outcomes are recorded, the agent's states don't matter
+    // beyond the moves they make, so the gates that can't affect the motors
+    // are skipped (the nondeterministic ones are kept, so the game draws the
+    // same numbers). A transition table is used as is.
+    bool outcomesOnly = !record.activity && !record.packedStates &&
+        !record.animatStates && !record.histograms;
+    bool usesProgram = !agent->mDeterministic ||
+        agent->mNumNodes > MAX_TABLE_NODES;
+    const GateProgram &program = outcomesOnly && usesProgram ?
+        agent->getMotorProgram() : agent->program;
+
+    // Each game draws from its own stream (the next replicate of the agent's)
+    RandomStream rng = agent->nextGameStream();
+
+    vector<int> totals;
+    if (bitSliced) {
+        totals = executeBitSlicedTrials(out, agent, program, config,
+                scrambleWorld, noiseLevel, rng);
+    } else {
+        totals = executeTrials(out, agent, program, config, scrambleWorld,
+                noiseLevel, rng);
+    }
+
+    if (countActivityHere) {
+        std::fill(out.activity, out.activity + agent->mNumNodes, 0);
+        countActivity(out.packedStates, numTimesteps, agent->mNumNodes,
+                out.activity);
+    }
+    if (out.histograms) {
+        out.histograms->count(out.packedStates, numTimesteps,
+                agent->mNumSensors, agent->mNumHidden, agent->mNumMotors);
+    }
+    return totals;
+}
+
+/**
+ * Executes a game for each of the given records with the same agent, one
+ * after the other, as successive calls to `executeGame` would. Replicate `i`
+ * is recorded in `records[i]`, and its correct and incorrect counts are
+ * written to `totals[2 * i]` and `totals[2 * i + 1]`.
+ */
+void executeReplicates(const vector<GameRecord> &records,
+        AbstractAgent* agent, int *totals, const GameConfig &config,
+        bool scrambleWorld, double noiseLevel) {
+    for (int i = 0; i < (int)records.size(); i++) {
+        vector<int> result = executeGame(records[i], agent, config,
+            scrambleWorld, noiseLevel);
+        totals[2 * i + CORRECT] = result[CORRECT];
+        totals[2 * i + INCORRECT] = result[INCORRECT];
+    }
+}
+
+/**
+ * Executes a game for each of the given agents, spreading the games over a
+ * pool of `numThreads` threads. Agent `i` is recorded in `records[i]`, and
+ * its correct and incorrect counts are written to `totals[2 * i]` and
+ * `totals[2 * i + 1]`.
+ */
+void executeGames(const vector<GameRecord> &records,
+        vector<AbstractAgent*> &agents, int *totals, const GameConfig &config,
+        bool scrambleWorld, double noiseLevel, int numThreads) {
+    // Every game draws from its agent's own random number streams, so the
+    // results don't depend on how the games are spread over the threads
+    parallelFor((int)agents.size(), numThreads, [&](int i) {
+        vector<int> result = executeGame(records[i], agents[i], config,
+            scrambleWorld, noiseLevel);
+        totals[2 * i + CORRECT] = result[CORRECT];
+        totals[2 * i + INCORRECT] = result[INCORRECT];
+    });
+}
@@ -2,16 +2,48 @@
 
 #pragma once
 
+#include <stdint.h>
+
 #include <vector>
 
 #include "./AbstractAgent.hpp"
 #include "./constants.hpp"
+#include "./GameConfig.hpp"
+#include "./GameHistograms.hpp"
 #include "./rng.hpp"
 
 using std::vector;
 
-vector<int> executeGame(std::vector<unsigned char> &allAnimatStates,
-        std::vector<int> &allWorldStates, vector<int> &allAnimatPositions,
-        vector<int> &trialResults, AbstractAgent* agent,
-        vector<int> hit_multipliers, vector<int> patterns, int worldWidth,
-        int worldHeight, bool scrambleWorld, double noiseLevel);
+// Where a game is recorded. Arrays have an entry for each timestep of each
+// trial, trial by trial, unless noted otherwise. Only `trialResults` is
+// required; whatever is null isn't recorded (see the RECORD_* levels).
+//
+// The agent's state at a timestep is the state of its sensors before it's
+// updated and of its hidden units and motors after.
+struct GameRecord {
+    // The result of each trial (one entry per trial)
+    uint8_t *trialResults = NULL;
+    // The number of timesteps at which each node was on (one entry per node)
+    int *activity = NULL;
+    // The state of the world and the agent's position; either both or
+    // neither are recorded
+    uint64_t *worldStates = NULL;
+    uint8_t *animatPositions = NULL;
+    // The state of the agent, packed into a word with node `i` in bit `i`
+    uint64_t *packedStates = NULL;
+    // The state of the agent, one byte per node
+    unsigned char *animatStates = NULL;
+    // Counts of the states the agent visits
+    GameHistograms *histograms = NULL;
+};
+
+vector<int> executeGame(const GameRecord &record, AbstractAgent* agent,
+        const GameConfig &config, bool scrambleWorld, double noiseLevel);
+
+void executeReplicates(const vector<GameRecord> &records,
+        AbstractAgent* agent, int *totals, const GameConfig &config,
+        bool scrambleWorld, double noiseLevel);
+
+void executeGames(const vector<GameRecord> &records,
+        vector<AbstractAgent*> &agents, int *totals, const GameConfig &config,
+        bool scrambleWorld, double noiseLevel, int numThreads);
@@ -0,0 +1,52 @@
+// GameConfig.cpp
+
+#include <stdexcept>
+
+#include "./GameConfig.hpp"
+
+
+GameConfig::GameConfig(const vector<int> &hitMultipliers,
+        const vector<uint64_t> &patterns, int worldWidth, int worldHeight,
+        const vector<int> &sensorLocations, int bodyLength, bool fastPaths)
+    : hitMultipliers(hitMultipliers), patterns(patterns),
+      worldWidth(worldWidth), worldHeight(worldHeight),
+      sensorLocations(sensorLocations), bodyLength(bodyLength),
+      fastPaths(fastPaths) {
+    if (hitMultipliers.size() != patterns.size())
+        throw std::invalid_argument(
+            "there must be one hit multiplier per block pattern");
+    if (worldWidth < 1 || worldWidth > MAX_WORLD_WIDTH)
+        throw std::invalid_argument(
+            "the world must be between 1 and 64 cells wide");
+    if (worldHeight < 1)
+        throw std::invalid_argument("the world must have at least one row");
+
+    worldMask = (worldWidth == 64) ? ~0ULL : (1ULL << worldWidth) - 1;
+    numTrials = (int)patterns.size() * 2 * worldWidth;
+    for (int patternIndex = 0; patternIndex < (int)patterns.size();
+            patternIndex++) {
+        // Directions (left/right)
+        for (int direction = -1; direction < 2; direction += 2) {
+            uint64_t worldState = patterns[patternIndex] & worldMask;
+            for (int timestep = 0; timestep < worldHeight; timestep++) {
+                worlds.push_back(worldState);
+                // Move the block (left is toward lower bits)
+                worldState = rotate(worldState,
+                        direction == -1 ? worldWidth - 1 : 1 % worldWidth);
+            }
+            // Agent starting position
+            for (int initAgentPos = 0; initAgentPos < worldWidth;
+                    initAgentPos++) {
+                trialPatterns.push_back(patternIndex);
+                trialDirections.push_back(direction);
+                trialPositions.push_back(initAgentPos);
+            }
+        }
+    }
+
+    bodyMask = 0;
+    for (int i = 0; i < bodyLength; i++)
+        bodyMask |= 1ULL << wrap(i, worldWidth);
+    for (int i = 0; i < (int)sensorLocations.size(); i++)
+        sensorCells.push_back(wrap(sensorLocations[i], worldWidth));
+}
@@ -0,0 +1,78 @@
+// GameConfig.hpp
+
+#pragma once
+
+#include <stdint.h>
+
+#include <vector>
+
+using std::vector;
+
+// Worlds are held in a single 64-bit word, cell `i` in bit `i`
+#define MAX_WORLD_WIDTH 64
+
+// Everything about a game that doesn't depend on the agent: the task, the
+// world, and where the agent's sensors and body are. Built once per
+// experiment, so that playing a game needs no setup.
+class GameConfig {
+ public:
+    GameConfig(const vector<int> &hitMultipliers,
+            const vector<uint64_t> &patterns, int worldWidth,
+            int worldHeight, const vector<int> &sensorLocations,
+            int bodyLength, bool fastPaths = true);
+
+    vector<int> hitMultipliers;
+    vector<uint64_t> patterns;
+    int worldWidth;
+    int worldHeight;
+    // The cell each sensor reads, relative to the agent's position
+    vector<int> sensorLocations;
+    int bodyLength;
+    // Whether games may take the faster paths (bit-slicing and memoized
+    // trials) that give the same results as the plain loop; turning them off
+    // is only useful to check them against it
+    bool fastPaths;
+
+    // Number of trials: for each block pattern, for each direction (left,
+    // then right), for each initial position of the agent
+    int numTrials;
+    // The pattern index, direction, and initial agent position of each trial
+    vector<int> trialPatterns;
+    vector<int> trialDirections;
+    vector<int> trialPositions;
+    // The successive states of the world for each pattern and direction,
+    // `worldHeight` at a time
+    vector<uint64_t> worlds;
+    // The cells of the world
+    uint64_t worldMask;
+    // The cells covered by an agent at position 0
+    uint64_t bodyMask;
+    // The cell each sensor reads for an agent at position 0, in [0, width)
+    vector<int> sensorCells;
+
+    // Return the successive states of the world in the given trial
+    const uint64_t *trialWorld(int trial) const {
+        return &worlds[(2 * trialPatterns[trial] +
+                        (trialDirections[trial] > 0)) * worldHeight];
+    }
+
+    // Return the world state rotated by `shift` cells toward higher bits,
+    // where `shift` is in [0, worldWidth)
+    uint64_t rotate(uint64_t worldState, int shift) const {
+        if (shift == 0) return worldState;
+        return ((worldState << shift) |
+                (worldState >> (worldWidth - shift))) & worldMask;
+    }
+
+    // Return the world as seen from the given position, i.e. rotated so that
+    // the cell at that position is bit 0
+    uint64_t relativeWorld(uint64_t worldState, int position) const {
+        return rotate(worldState, position == 0 ? 0 : worldWidth - position);
+    }
+};
+
+// Return `i` modulo `width`, in [0, width)
+inline int wrap(int i, int width) {
+    i %= width;
+    return (i < 0) ? i + width : i;
+}
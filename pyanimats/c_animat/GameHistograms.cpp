@@ -0,0 +1,78 @@
+// GameHistograms.cpp
+
+#include <algorithm>
+#include <utility>
+
+#include "./GameHistograms.hpp"
+
+
+/**
+ * Returns the index of the lowest `numBits` bits of a word, with bit 0 as the
+ * most significant.
+ */
+static uint64_t bigEndianIndex(uint64_t bits, int numBits) {
+    uint64_t index = 0;
+    for (int i = 0; i < numBits; i++)
+        index = (index << 1) | ((bits >> i) & 1);
+    return index;
+}
+
+/**
+ * Sorts the given keys and merges the counts of equal keys.
+ */
+static void mergeCounts(vector<std::pair<uint64_t, int> > &counts,
+        vector<uint64_t> &keys, vector<int> &totals) {
+    std::sort(counts.begin(), counts.end());
+    for (int i = 0; i < (int)counts.size(); i++) {
+        if (keys.empty() || keys.back() != counts[i].first) {
+            keys.push_back(counts[i].first);
+            totals.push_back(0);
+        }
+        totals.back() += counts[i].second;
+    }
+}
+
+void GameHistograms::count(const uint64_t *visits, long numTimesteps,
+        int numSensors, int numHidden, int numMotors) {
+    states.clear();
+    stateCounts.clear();
+    lastVisits.clear();
+    sensorMotorCounts.clear();
+    hiddenStates.clear();
+    hiddenCounts.clear();
+    // Sort the visits by state, then timestep, so that the last visit to a
+    // state ends its run
+    vector<std::pair<uint64_t, long> > sorted(numTimesteps);
+    for (long t = 0; t < numTimesteps; t++)
+        sorted[t] = std::make_pair(visits[t], t);
+    std::sort(sorted.begin(), sorted.end());
+    for (long i = 0; i < (long)sorted.size(); i++) {
+        if (states.empty() || states.back() != sorted[i].first) {
+            states.push_back(sorted[i].first);
+            stateCounts.push_back(0);
+            lastVisits.push_back(0);
+        }
+        stateCounts.back()++;
+        lastVisits.back() = sorted[i].second;
+    }
+
+    bool joint = numSensors + numMotors <= MAX_SENSOR_MOTOR_NODES;
+    long numMotorStates = 1L << numMotors;
+    if (joint) sensorMotorCounts.assign((1L << numSensors) * numMotorStates, 0);
+    // Sensors come first, so there are fewer than 64 hidden units
+    uint64_t hiddenMask = (1ULL << numHidden) - 1;
+    vector<std::pair<uint64_t, int> > hidden(states.size());
+    for (int i = 0; i < (int)states.size(); i++) {
+        uint64_t state = states[i];
+        if (joint) {
+            uint64_t sensors = bigEndianIndex(state, numSensors);
+            uint64_t motors = bigEndianIndex(
+                    state >> (numSensors + numHidden), numMotors);
+            sensorMotorCounts[sensors * numMotorStates + motors] +=
+                stateCounts[i];
+        }
+        hidden[i] = std::make_pair((state >> numSensors) & hiddenMask,
+                stateCounts[i]);
+    }
+    mergeCounts(hidden, hiddenStates, hiddenCounts);
+}
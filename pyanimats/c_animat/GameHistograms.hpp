@@ -0,0 +1,42 @@
+// GameHistograms.hpp
+
+#pragma once
+
+#include <stdint.h>
+
+#include <vector>
+
+using std::vector;
+
+// The joint sensor and motor histogram is only counted if there are at most
+// this many sensors and motors (2^16 entries)
+#define MAX_SENSOR_MOTOR_NODES 16
+
+// Counts of the states an agent visits during a game, accumulated by the
+// engine so that they needn't be recovered from the recorded node states.
+//
+// A visited state is the state recorded at a timestep: the sensors before
+// the agent is updated and the hidden units and motors after, packed with
+// the little-endian convention (node `i` is bit `i`).
+class GameHistograms {
+ public:
+    // The distinct visited states, in ascending order, the number of
+    // timesteps at which each was visited, and the last of those timesteps
+    vector<uint64_t> states;
+    vector<int> stateCounts;
+    vector<long> lastVisits;
+    // The number of timesteps at which each combination of sensor and motor
+    // states was visited, with a row for each sensor state and a column for
+    // each motor state. Sensor and motor states are indexed with the first
+    // node as the most significant bit. Empty if there are more than
+    // MAX_SENSOR_MOTOR_NODES sensors and motors.
+    vector<int> sensorMotorCounts;
+    // The distinct states of the hidden units, packed with the first hidden
+    // unit in bit 0, in ascending order, and their counts
+    vector<uint64_t> hiddenStates;
+    vector<int> hiddenCounts;
+
+    // Count the states visited at each of the given timesteps
+    void count(const uint64_t *visits, long numTimesteps, int numSensors,
+            int numHidden, int numMotors);
+};
@@ -0,0 +1,288 @@
+// GateProgram.cpp
+
+#include <algorithm>
+
+#include "./GateProgram.hpp"
+
+
+void GateProgram::clear() {
+    instructions.clear();
+    inputs.clear();
+    data.clear();
+}
+
+GateInstruction &GateProgram::add(uint8_t opcode,
+        const vector<unsigned char> &inputNodes,
+        const vector<unsigned char> &outputNodes) {
+    GateInstruction instruction;
+    instruction.opcode = opcode;
+    instruction.numInputs = (uint8_t)inputNodes.size();
+    instruction.inputs = (uint32_t)inputs.size();
+    instruction.data = (uint32_t)data.size();
+    instruction.inputMask = 0;
+    for (int i = 0; i < (int)inputNodes.size(); i++)
+        instruction.inputMask |= 1ULL << inputNodes[i];
+    instruction.outputMask = 0;
+    for (int i = 0; i < (int)outputNodes.size(); i++)
+        instruction.outputMask |= 1ULL << outputNodes[i];
+    instruction.threshold = 0;
+    inputs.insert(inputs.end(), inputNodes.begin(), inputNodes.end());
+    instructions.push_back(instruction);
+    return instructions.back();
+}
+
+uint64_t GateProgram::step(uint64_t state, RandomStream &rng) const {
+    uint64_t nextState = 0;
+    const uint8_t *nodes;
+    const uint64_t *table;
+    for (int g = 0; g < (int)instructions.size(); g++) {
+        const GateInstruction &gate = instructions[g];
+        nodes = &inputs[gate.inputs];
+        table = &data[gate.data];
+        switch (gate.opcode) {
+            case OP_DETERMINISTIC_HMM: {
+                // The first input is the most significant bit of the row
+                int row = 0;
+                for (int i = 0; i < gate.numInputs; i++)
+                    row = (row << 1) | ((state >> nodes[i]) & 1);
+                nextState |= table[row];
+                break;
+            }
+            case OP_NONDETERMINISTIC_HMM: {
+                int row = 0;
+                for (int i = 0; i < gate.numInputs; i++)
+                    row = (row << 1) | ((state >> nodes[i]) & 1);
+                int numColumns = (int)table[0];
+                const uint64_t *columnMasks = table + 1;
+                const uint64_t *alias =
+                    columnMasks + numColumns + row * (2 * numColumns + 1);
+                uint64_t total = alias[0];
+                // Pick a column uniformly, then keep it or take its alias
+                uint64_t bits = rng();
+                int column = (int)(((bits >> 32) * numColumns) >> 32);
+                uint64_t r = ((bits & 0xFFFFFFFFULL) * total) >> 32;
+                if (r < alias[1 + 2 * column])
+                    nextState |= columnMasks[column];
+                else
+                    nextState |= alias[2 + 2 * column];
+                break;
+            }
+            case OP_LINEAR_THRESHOLD: {
+                int inputCount =
+                    __builtin_popcountll(state & gate.inputMask);
+                // Overwrite the outputs (see LinearThresholdGate::compile)
+                nextState &= ~gate.outputMask;
+                if (inputCount > gate.threshold)
+                    nextState |= gate.outputMask;
+                break;
+            }
+        }
+    }
+    return nextState;
+}
+
+void GateProgram::stepProbabilities(uint64_t state, double *on,
+        int numNodes) const {
+    // The probability of each node being off, until the end
+    double *off = on;
+    for (int i = 0; i < numNodes; i++) off[i] = 1.0;
+    const uint8_t *nodes;
+    const uint64_t *table;
+    uint64_t mask;
+    for (int g = 0; g < (int)instructions.size(); g++) {
+        const GateInstruction &gate = instructions[g];
+        nodes = &inputs[gate.inputs];
+        table = &data[gate.data];
+        switch (gate.opcode) {
+            case OP_DETERMINISTIC_HMM: {
+                int row = 0;
+                for (int i = 0; i < gate.numInputs; i++)
+                    row = (row << 1) | ((state >> nodes[i]) & 1);
+                for (mask = table[row]; mask; mask &= mask - 1)
+                    off[__builtin_ctzll(mask)] = 0.0;
+                break;
+            }
+            case OP_NONDETERMINISTIC_HMM: {
+                int row = 0;
+                for (int i = 0; i < gate.numInputs; i++)
+                    row = (row << 1) | ((state >> nodes[i]) & 1);
+                int numColumns = (int)table[0];
+                const uint64_t *columnMasks = table + 1;
+                const uint64_t *alias =
+                    columnMasks + numColumns + row * (2 * numColumns + 1);
+                uint64_t total = alias[0];
+                // Each column is picked with probability 1 / numColumns, and
+                // then kept with probability threshold / total; the weight
+                // of the draws that switch a node on is a whole number out
+                // of numColumns * total
+                for (mask = gate.outputMask; mask; mask &= mask - 1) {
+                    int node = __builtin_ctzll(mask);
+                    uint64_t weight = 0;
+                    for (int j = 0; j < numColumns; j++) {
+                        uint64_t threshold = alias[1 + 2 * j];
+                        if ((columnMasks[j] >> node) & 1)
+                            weight += threshold;
+                        if ((alias[2 + 2 * j] >> node) & 1)
+                            weight += total - threshold;
+                    }
+                    off[node] *= 1.0 - (double)weight /
+                        ((double)numColumns * (double)total);
+                }
+                break;
+            }
+            case OP_LINEAR_THRESHOLD: {
+                int inputCount =
+                    __builtin_popcountll(state & gate.inputMask);
+                double value = (inputCount > gate.threshold) ? 0.0 : 1.0;
+                for (mask = gate.outputMask; mask; mask &= mask - 1)
+                    off[__builtin_ctzll(mask)] = value;
+                break;
+            }
+        }
+    }
+    for (int i = 0; i < numNodes; i++) on[i] = 1.0 - off[i];
+}
+
+void GateProgram::stepSlices(const uint64_t *slices, uint64_t *nextSlices,
+        int numNodes) const {
+    for (int i = 0; i < numNodes; i++) nextSlices[i] = 0;
+    // An HMM gate has at most 4 inputs, so its table at most 16 rows
+    uint64_t rows[16];
+    // Linear threshold gates may have up to 63 inputs
+    uint64_t atLeast[65];
+    uint64_t mask;
+    const uint8_t *nodes;
+    const uint64_t *table;
+    for (int g = 0; g < (int)instructions.size(); g++) {
+        const GateInstruction &gate = instructions[g];
+        nodes = &inputs[gate.inputs];
+        table = &data[gate.data];
+        switch (gate.opcode) {
+            case OP_DETERMINISTIC_HMM: {
+                // Find the lanes in which each row of the table is selected;
+                // the first input is the most significant bit of the row
+                int numRows = 1;
+                rows[0] = ~0ULL;
+                for (int i = 0; i < gate.numInputs; i++) {
+                    uint64_t input = slices[nodes[i]];
+                    for (int r = numRows - 1; r >= 0; r--) {
+                        rows[2 * r + 1] = rows[r] & input;
+                        rows[2 * r] = rows[r] & ~input;
+                    }
+                    numRows *= 2;
+                }
+                for (int r = 0; r < numRows; r++) {
+                    for (mask = table[r]; mask; mask &= mask - 1)
+                        nextSlices[__builtin_ctzll(mask)] |= rows[r];
+                }
+                break;
+            }
+            case OP_LINEAR_THRESHOLD: {
+                // `atLeast[k]` holds the lanes in which at least k of the
+                // inputs seen so far are on
+                int needed = gate.threshold + 1;
+                uint64_t active = 0;
+                if (needed <= gate.numInputs) {
+                    atLeast[0] = ~0ULL;
+                    for (int k = 1; k <= needed; k++) atLeast[k] = 0;
+                    for (int i = 0; i < gate.numInputs; i++) {
+                        uint64_t input = slices[nodes[i]];
+                        for (int k = std::min(i + 1, needed); k > 0; k--)
+                            atLeast[k] |= atLeast[k - 1] & input;
+                    }
+                    active = atLeast[needed];
+                }
+                // Overwrite the outputs (see LinearThresholdGate::compile)
+                for (mask = gate.outputMask; mask; mask &= mask - 1)
+                    nextSlices[__builtin_ctzll(mask)] = active;
+                break;
+            }
+        }
+    }
+}
+
+GateProgram GateProgram::restrictedTo(uint64_t nodes) const {
+    GateProgram restricted;
+    restricted.inputs = inputs;
+    restricted.data = data;
+    for (int g = 0; g < (int)instructions.size(); g++) {
+        if (instructions[g].outputMask & nodes)
+            restricted.instructions.push_back(instructions[g]);
+    }
+    return restricted;
+}
+
+int GateProgram::drawsPerStep() const {
+    int draws = 0;
+    for (int g = 0; g < (int)instructions.size(); g++)
+        draws += instructions[g].opcode == OP_NONDETERMINISTIC_HMM;
+    return draws;
+}
+
+void GateProgram::removeOverwritten() {
+    // The nodes that linear threshold instructions write to after the
+    // current one
+    uint64_t overwritten = 0;
+    vector<bool> keep(instructions.size(), true);
+    for (int g = (int)instructions.size() - 1; g >= 0; g--) {
+        const GateInstruction &gate = instructions[g];
+        if ((gate.outputMask & ~overwritten) == 0 &&
+                gate.opcode != OP_NONDETERMINISTIC_HMM)
+            keep[g] = false;
+        if (gate.opcode == OP_LINEAR_THRESHOLD)
+            overwritten |= gate.outputMask;
+    }
+    int kept = 0;
+    for (int g = 0; g < (int)instructions.size(); g++) {
+        if (keep[g]) instructions[kept++] = instructions[g];
+    }
+    instructions.resize(kept);
+}
+
+GateProgram GateProgram::affecting(uint64_t nodes) const {
+    // Add the inputs of the instructions that write to the nodes until there
+    // are no more
+    uint64_t relevant = nodes;
+    for (uint64_t previous = ~relevant; previous != relevant;) {
+        previous = relevant;
+        for (int g = 0; g < (int)instructions.size(); g++) {
+            if (instructions[g].outputMask & relevant)
+                relevant |= instructions[g].inputMask;
+        }
+    }
+    GateProgram affecting;
+    affecting.inputs = inputs;
+    affecting.data = data;
+    for (int g = 0; g < (int)instructions.size(); g++) {
+        if ((instructions[g].outputMask & relevant) ||
+                instructions[g].opcode == OP_NONDETERMINISTIC_HMM)
+            affecting.instructions.push_back(instructions[g]);
+    }
+    return affecting;
+}
+
+uint64_t outputColumnMask(const vector<unsigned char> &outputNodes,
+        int column) {
+    uint64_t mask = 0;
+    for (int i = 0; i < (int)outputNodes.size(); i++) {
+        if ((column >> i) & 1)
+            mask |= 1ULL << outputNodes[i];
+    }
+    return mask;
+}
+
+/**
+ * Transposes a 64 x 64 bit matrix held a row per word, with column `j` in bit
+ * `j`, in place: swaps ever smaller blocks across the diagonal, a row of
+ * blocks at a time.
+ */
+void transpose64(uint64_t *rows) {
+    uint64_t mask = 0x00000000FFFFFFFFULL;
+    for (int size = 32; size != 0; size >>= 1, mask ^= mask << size) {
+        for (int k = 0; k < 64; k = ((k | size) + 1) & ~size) {
+            uint64_t t = ((rows[k] >> size) ^ rows[k | size]) & mask;
+            rows[k] ^= t << size;
+            rows[k | size] ^= t;
+        }
+    }
+}
@@ -0,0 +1,94 @@
+// GateProgram.hpp
+
+#pragma once
+
+#include <stdint.h>
+
+#include <vector>
+
+#include "./rng.hpp"
+
+using std::vector;
+
+// Instruction opcodes, one for each kind of gate
+#define OP_DETERMINISTIC_HMM 0
+#define OP_NONDETERMINISTIC_HMM 1
+#define OP_LINEAR_THRESHOLD 2
+
+// A single gate of a compiled phenotype
+struct GateInstruction {
+    uint8_t opcode;
+    uint8_t numInputs;
+    // Offset of the gate's input node indices in `GateProgram::inputs`
+    uint32_t inputs;
+    // Offset of the gate's tables in `GateProgram::data`
+    uint32_t data;
+    // The nodes the gate reads from and writes to
+    uint64_t inputMask;
+    uint64_t outputMask;
+    // Linear threshold gates only
+    int threshold;
+};
+
+// A phenotype compiled into a contiguous program that advances an agent
+// state, packed into a single word with node `i` in bit `i`.
+//
+// Deterministic HMM gates store, for each row of the gate's table, the mask of
+// the nodes that the gate switches on. Nondeterministic HMM gates store the
+// number of columns of their table and the mask of the nodes switched on by
+// each column, followed by an alias table for each row (see
+// HiddenMarkovGate::compile). Linear threshold gates store nothing;
+// they overwrite the nodes in their output mask.
+class GateProgram {
+ public:
+    vector<GateInstruction> instructions;
+    vector<uint8_t> inputs;
+    vector<uint64_t> data;
+
+    void clear();
+    // Append an instruction and return it so that the caller can fill in its
+    // tables; the tables of the returned instruction begin at the current end
+    // of `data`
+    GateInstruction &add(uint8_t opcode,
+            const vector<unsigned char> &inputNodes,
+            const vector<unsigned char> &outputNodes);
+    // Return the state following the given one; nondeterministic gates draw
+    // from the given stream
+    uint64_t step(uint64_t state, RandomStream &rng) const;
+    // The probability of each node being on in the state following the
+    // given one, in `on[i]` for node `i`: the sampling distribution of `step`,
+    // computed exactly. HMM gates switch on the nodes of a column each,
+    // independently of each other, and linear threshold gates overwrite
+    // their outputs.
+    void stepProbabilities(uint64_t state, double *on, int numNodes) const;
+    // Advance 64 states at once: `slices[i]` holds the state of node `i` in
+    // each of the 64 states, one per bit. Only for deterministic programs.
+    void stepSlices(const uint64_t *slices, uint64_t *nextSlices,
+            int numNodes) const;
+    // The program made of the instructions that write to any of the given
+    // nodes, in order; it computes the same next state for those nodes
+    // (nondeterministic programs excepted, since their instructions share a
+    // stream)
+    GateProgram restrictedTo(uint64_t nodes) const;
+    // The number of values each call to `step` draws from the stream (one
+    // per nondeterministic gate)
+    int drawsPerStep() const;
+    // Drop the instructions whose outputs are all overwritten by later
+    // linear threshold instructions, unless they draw from the stream; the
+    // next states are the same
+    void removeOverwritten();
+    // The program made of the instructions that can affect the given nodes,
+    // at the next step or any later one, and of those that draw from the
+    // stream (so that the others draw the same numbers); the states of the
+    // given nodes are the same, step after step
+    GateProgram affecting(uint64_t nodes) const;
+};
+
+// Return the mask of the nodes switched on by the given column of an HMM
+// gate's table (bit `i` of the column is the state of the `i`th output).
+uint64_t outputColumnMask(const vector<unsigned char> &outputNodes,
+        int column);
+
+// Transpose a 64 x 64 bit matrix held a row per word, with column `j` in bit
+// `j`, in place (turns 64 slices into 64 states, and back)
+void transpose64(uint64_t *rows);
@@ -0,0 +1,109 @@
+// Genome.cpp
+
+#include <string.h>
+
+#include <algorithm>
+
+#include "./Genome.hpp"
+
+
+Genome::Genome() : mSize(0) {}
+
+Genome::Genome(const vector<unsigned char> &nucleotides) : mSize(0) {
+    assign(nucleotides);
+}
+
+int Genome::findChunk(int i) const {
+    return (int)(std::upper_bound(mEnds.begin(), mEnds.end(), i) -
+            mEnds.begin());
+}
+
+unsigned char Genome::operator[](int i) const {
+    int k = findChunk(i);
+    return (*mChunks[k])[i - chunkStart(k)];
+}
+
+void Genome::set(int i, unsigned char value) {
+    int k = findChunk(i);
+    // Copy the chunk if another genome shares it
+    if (mChunks[k].use_count() > 1)
+        mChunks[k] = std::make_shared<Chunk>(*mChunks[k]);
+    (*mChunks[k])[i - chunkStart(k)] = value;
+}
+
+void Genome::insert(int i, const vector<unsigned char> &nucleotides) {
+    if (nucleotides.empty()) return;
+    if (mChunks.empty()) {
+        assign(nucleotides);
+        return;
+    }
+    // Rewrite the chunk that holds the position (or the last one, when
+    // appending)
+    int k = std::min(findChunk(i), numChunks() - 1);
+    const Chunk &chunk = *mChunks[k];
+    int offset = i - chunkStart(k);
+    vector<unsigned char> buffer(chunk.begin(), chunk.begin() + offset);
+    buffer.insert(buffer.end(), nucleotides.begin(), nucleotides.end());
+    buffer.insert(buffer.end(), chunk.begin() + offset, chunk.end());
+    replaceChunks(k, k + 1, buffer);
+}
+
+void Genome::erase(int i, int n) {
+    if (n <= 0) return;
+    // Rewrite the chunks that hold the deleted nucleotides
+    int first = findChunk(i);
+    int last = findChunk(i + n - 1) + 1;
+    const Chunk &head = *mChunks[first];
+    const Chunk &tail = *mChunks[last - 1];
+    vector<unsigned char> buffer(head.begin(),
+            head.begin() + (i - chunkStart(first)));
+    buffer.insert(buffer.end(),
+            tail.begin() + (i + n - chunkStart(last - 1)), tail.end());
+    // Merge what's left with the next chunk, rather than leaving a small one
+    if ((int)buffer.size() < GENOME_CHUNK_SIZE / 2 && last < numChunks()) {
+        const Chunk &next = *mChunks[last];
+        buffer.insert(buffer.end(), next.begin(), next.end());
+        last++;
+    }
+    replaceChunks(first, last, buffer);
+}
+
+void Genome::assign(const vector<unsigned char> &nucleotides) {
+    replaceChunks(0, numChunks(), nucleotides);
+}
+
+void Genome::copy(int i, int n, unsigned char *out) const {
+    if (n <= 0) return;
+    for (int k = findChunk(i); n > 0; k++) {
+        int offset = i - chunkStart(k);
+        int m = std::min(n, chunkSize(k) - offset);
+        memcpy(out, chunkData(k) + offset, m);
+        out += m;
+        i += m;
+        n -= m;
+    }
+}
+
+void Genome::replaceChunks(int first, int last,
+        const vector<unsigned char> &nucleotides) {
+    // Split the nucleotides into as few chunks as possible, of even sizes
+    int n = (int)nucleotides.size();
+    int numNew = (n + GENOME_CHUNK_SIZE - 1) / GENOME_CHUNK_SIZE;
+    vector< std::shared_ptr<Chunk> > chunks(numNew);
+    for (int k = 0, start = 0; k < numNew; k++) {
+        int end = (int)((long long)n * (k + 1) / numNew);
+        chunks[k] = std::make_shared<Chunk>(nucleotides.begin() + start,
+                nucleotides.begin() + end);
+        start = end;
+    }
+    mChunks.erase(mChunks.begin() + first, mChunks.begin() + last);
+    mChunks.insert(mChunks.begin() + first, chunks.begin(), chunks.end());
+    // Update the ends of the chunks from the first one replaced on
+    mEnds.resize(mChunks.size());
+    int end = first ? mEnds[first - 1] : 0;
+    for (int k = first; k < numChunks(); k++) {
+        end += chunkSize(k);
+        mEnds[k] = end;
+    }
+    mSize = end;
+}
@@ -0,0 +1,53 @@
+// Genome.hpp
+
+#pragma once
+
+#include <memory>
+#include <vector>
+
+#include "./constants.hpp"
+
+using std::vector;
+
+// A sequence of nucleotides, stored in chunks that copies of the genome share
+// until one of them writes to it (copy-on-write). Copying a genome only copies
+// the pointers to its chunks, so a clone only pays for the chunks its
+// mutations touch.
+class Genome {
+ public:
+    Genome();
+    explicit Genome(const vector<unsigned char> &nucleotides);
+
+    int size() const { return mSize; }
+    // The nucleotide at position `i`
+    unsigned char operator[](int i) const;
+    // Set the nucleotide at position `i`
+    void set(int i, unsigned char value);
+    // Insert the given nucleotides before position `i`
+    void insert(int i, const vector<unsigned char> &nucleotides);
+    // Delete `n` nucleotides from position `i` on
+    void erase(int i, int n);
+    void assign(const vector<unsigned char> &nucleotides);
+    // Copy `n` nucleotides from position `i` on to `out`
+    void copy(int i, int n, unsigned char *out) const;
+
+    // The chunks, in order, for reading the genome sequentially
+    int numChunks() const { return (int)mChunks.size(); }
+    const unsigned char *chunkData(int k) const { return mChunks[k]->data(); }
+    int chunkStart(int k) const { return k ? mEnds[k - 1] : 0; }
+    int chunkSize(int k) const { return (int)mChunks[k]->size(); }
+
+ private:
+    typedef vector<unsigned char> Chunk;
+    vector< std::shared_ptr<Chunk> > mChunks;
+    // The position after the last nucleotide of each chunk
+    vector<int> mEnds;
+    int mSize;
+
+    // The index of the chunk that holds position `i`
+    int findChunk(int i) const;
+    // Replace the chunks in [first, last) with the given nucleotides, split
+    // into chunks of at most GENOME_CHUNK_SIZE
+    void replaceChunks(int first, int last,
+            const vector<unsigned char> &nucleotides);
+};
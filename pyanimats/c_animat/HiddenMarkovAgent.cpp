@@ -3,23 +3,14 @@
 #include "./HiddenMarkovAgent.hpp"
 
 
-void HiddenMarkovAgent::generatePhenotype() {
-    if (gates.size() != 0) {
-        for (int i = 0; i < (int)gates.size(); i++) {
-            delete gates[i];
-        }
-    }
-    gates.clear();
-    HiddenMarkovGate *gate;
-    for (int i = 0; i < (int)genome.size(); i++) {
-        if ((genome[i] == HiddenMarkovGate::START_CODON_ONE) &&
-                (genome[(i + 1) % (int)genome.size()] ==
-                 HiddenMarkovGate::START_CODON_TWO)) {
-            gate = new HiddenMarkovGate(genome, i, mNumSensors, mNumHidden,
-                    mNumMotors, mDeterministic);
-            gates.push_back(gate);
-        }
-    }
+bool HiddenMarkovAgent::generatePhenotype() {
+    return buildGates(HiddenMarkovGate::START_CODON_ONE,
+            HiddenMarkovGate::START_CODON_TWO);
+}
+
+AbstractGate *HiddenMarkovAgent::newGate(int start) {
+    return new HiddenMarkovGate(genome, start, mNumSensors, mNumHidden,
+            mNumMotors, mDeterministic);
 }
 
 void HiddenMarkovAgent::injectStartCodons(int n) {
@@ -45,11 +36,9 @@ vector< vector<int> > HiddenMarkovAgent::getEdges() {
     return edgeList;
 }
 
-HiddenMarkovAgent::~HiddenMarkovAgent() {
-    for (int i = 0; i < (int)gates.size(); i++) {
-        delete gates[i];
-    }
+AbstractAgent *HiddenMarkovAgent::clone() const {
+    return new HiddenMarkovAgent(*this);
 }
 
-unsigned char HiddenMarkovAgent::START_CODON_ONE = HiddenMarkovAgent::START_CODON_ONE;
-unsigned char HiddenMarkovAgent::START_CODON_TWO = HiddenMarkovAgent::START_CODON_TWO;
+const unsigned char HiddenMarkovAgent::START_CODON_ONE;
+const unsigned char HiddenMarkovAgent::START_CODON_TWO;
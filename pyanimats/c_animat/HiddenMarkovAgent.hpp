@@ -15,15 +15,20 @@ class HiddenMarkovAgent: public AbstractAgent {
             int numHidden, int numMotors, bool deterministic)
     : AbstractAgent(genome, numSensors, numHidden, numMotors, deterministic)
     {}
-    ~HiddenMarkovAgent();
 
-    static unsigned char START_CODON_ONE;
-    static unsigned char START_CODON_TWO;
+    static const unsigned char START_CODON_ONE =
+        HiddenMarkovGate::START_CODON_ONE;
+    static const unsigned char START_CODON_TWO =
+        HiddenMarkovGate::START_CODON_TWO;
 
-    void generatePhenotype();
+    bool generatePhenotype();
 
     using AbstractAgent::injectStartCodons;
     void injectStartCodons(int n);
 
     vector< vector<int> > getEdges();
+    AbstractAgent *clone() const;
+
+ protected:
+    AbstractGate *newGate(int start);
 };
@@ -2,12 +2,12 @@
 
 #include "./HiddenMarkovGate.hpp"
 
-// Define start codon pair for this gate
-unsigned char HiddenMarkovGate::START_CODON_ONE = 42;
-unsigned char HiddenMarkovGate::START_CODON_TWO = 255 - START_CODON_ONE;
+// Start codon pair for this gate (the values are in the header)
+const unsigned char HiddenMarkovGate::START_CODON_ONE;
+const unsigned char HiddenMarkovGate::START_CODON_TWO;
 
 
-HiddenMarkovGate::HiddenMarkovGate(vector<unsigned char> &genome, int start,
+HiddenMarkovGate::HiddenMarkovGate(const Genome &genome, int start,
         const int numSensors, const int numHidden, const int numMotors,
         const bool deterministic)
     : AbstractGate(numSensors, numHidden, numMotors, deterministic) {
@@ -38,6 +38,9 @@ HiddenMarkovGate::HiddenMarkovGate(vector<unsigned char> &genome, int start,
     int M = 1 << numInputs;
     // Number of columns
     int N = 1 << numOutputs;
+    // The table follows the start codon, the input and output counts and
+    // codons, and the intron
+    span = 20 + M * N;
 
     hmm.resize(M);
     sums.resize(M);
@@ -72,36 +75,75 @@ HiddenMarkovGate::HiddenMarkovGate(vector<unsigned char> &genome, int start,
     }
 }
 
-void HiddenMarkovGate::update(vector<unsigned char> &currentStates,
-        vector<unsigned char> &nextStates) {
-    // Encode the given states as an integer to index into the TPM
-    int pastStateIndex = 0;
-    for (int i = 0; i < (int)inputs.size(); i++)
-        pastStateIndex = (pastStateIndex << 1) + ((currentStates[inputs[i]]) & 1);
-    // Get the next state
-    int nextStateIndex = 0;
+void HiddenMarkovGate::compile(GateProgram &program) const {
+    program.add(mDeterministic ? OP_DETERMINISTIC_HMM : OP_NONDETERMINISTIC_HMM,
+            inputs, outputs);
+    // The index of the column we choose is the next state (we take its bits
+    // as the next states of individual nodes)
+    int N = (int)hmm[0].size();
     if (mDeterministic) {
-        // Find the index of the 1 in this row
-        while (1 > hmm[pastStateIndex][nextStateIndex]) {
-            nextStateIndex++;
+        // Each row has a single nonzero entry
+        for (int i = 0; i < (int)hmm.size(); i++) {
+            int j = 0;
+            while (1 > hmm[i][j]) j++;
+            program.data.push_back(outputColumnMask(outputs, j));
         }
     } else {
-        // Randomly pick a column index with probabilities weighted by the entries
-        // in the column.
-        // TODO this is [1, sums[pastStateIndex] - 1]; is that what we want?
-        int r = 1 + (randInt() % (sums[pastStateIndex] - 1));
-        while (r > hmm[pastStateIndex][nextStateIndex]) {
-            // Decrease the random threshold because it's given that we didn't
-            // pick column nextStateIndex, which we would have with probability
-            // hmm[pastStateIndex][nextStateIndex].
-            r -= hmm[pastStateIndex][nextStateIndex];
-            nextStateIndex++;
+        program.data.push_back(N);
+        for (int j = 0; j < N; j++)
+            program.data.push_back(outputColumnMask(outputs, j));
+        vector<uint64_t> weights(N);
+        for (int i = 0; i < (int)hmm.size(); i++) {
+            // Columns are picked by drawing r uniformly from [1, sums - 1]
+            // and walking the row until the entries seen so far add up to at
+            // least r, so the last column is one short of its entry.
+            // TODO is that what we want?
+            for (int j = 0; j < N; j++)
+                weights[j] = hmm[i][j];
+            weights[N - 1]--;
+            appendAliasTable(program, weights, sums[i] - 1, outputs);
         }
     }
-    // The index of the column we chose is the next state (we take the its bits
-    // as the next states of individual nodes)
-    for (int i = 0; i < (int)outputs.size(); i++) {
-        nextStates[outputs[i]] |= (nextStateIndex >> i) & 1;
+}
+
+/**
+ * Appends a row's alias table (Vose, 1991) to the program: the row's total
+ * weight, then for each column the threshold below which the column is kept
+ * and the output mask of its alias. The table is built with integers, scaling
+ * the weights by the number of columns, so it is exact.
+ */
+void HiddenMarkovGate::appendAliasTable(GateProgram &program,
+        const vector<uint64_t> &weights, uint64_t total,
+        const vector<unsigned char> &outputNodes) {
+    int N = (int)weights.size();
+    vector<uint64_t> scaled(N);
+    vector<uint64_t> threshold(N, total);
+    vector<int> alias(N);
+    vector<int> small, large;
+    for (int j = 0; j < N; j++) {
+        alias[j] = j;
+        scaled[j] = weights[j] * N;
+        if (scaled[j] < total)
+            small.push_back(j);
+        else
+            large.push_back(j);
+    }
+    while (!small.empty() && !large.empty()) {
+        int s = small.back();
+        small.pop_back();
+        int l = large.back();
+        threshold[s] = scaled[s];
+        alias[s] = l;
+        scaled[l] -= total - scaled[s];
+        if (scaled[l] < total) {
+            large.pop_back();
+            small.push_back(l);
+        }
+    }
+    program.data.push_back(total);
+    for (int j = 0; j < N; j++) {
+        program.data.push_back(threshold[j]);
+        program.data.push_back(outputColumnMask(outputNodes, alias[j]));
     }
 }
 
@@ -112,7 +154,7 @@ HiddenMarkovGate::~HiddenMarkovGate() {
     outputs.clear();
 }
 
-void HiddenMarkovGate::print() {
+void HiddenMarkovGate::print() const {
     printf("\n------------------");
     printf("\nHidden Markov Gate");
     printf("\n------------------");
@@ -2,27 +2,33 @@
 
 #pragma once
 
+#include <stdint.h>
+
 #include <vector>
 
 #include "./rng.hpp"
 #include "./AbstractGate.hpp"
+#include "./Genome.hpp"
 
 using std::vector;
 
 class HiddenMarkovGate: public AbstractGate {
  public:
-    HiddenMarkovGate(vector<unsigned char> &genome, int start,
+    HiddenMarkovGate(const Genome &genome, int start,
             const int numSensors, const int numHidden, const int numMotors,
             const bool deterministic);
     ~HiddenMarkovGate();
 
     // Start codon pair for this gate
-    static unsigned char START_CODON_ONE, START_CODON_TWO;
+    static const unsigned char START_CODON_ONE = 42;
+    static const unsigned char START_CODON_TWO = 255 - START_CODON_ONE;
 
     vector< vector<unsigned char> > hmm;
     vector<unsigned int> sums;
 
-    void update(vector<unsigned char> &currentStates,
-            vector<unsigned char> &nextStates) override;
-    void print() override;
+    void compile(GateProgram &program) const override;
+    static void appendAliasTable(GateProgram &program,
+            const vector<uint64_t> &weights, uint64_t total,
+            const vector<unsigned char> &outputNodes);
+    void print() const override;
 };
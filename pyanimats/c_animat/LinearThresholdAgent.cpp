@@ -3,23 +3,14 @@
 #include "./LinearThresholdAgent.hpp"
 
 
-void LinearThresholdAgent::generatePhenotype() {
-    if (gates.size() != 0) {
-        for (int i = 0; i < (int)gates.size(); i++) {
-            delete gates[i];
-        }
-    }
-    gates.clear();
-    LinearThresholdGate *gate;
-    for (int i = 0; i < (int)genome.size(); i++) {
-        if ((genome[i] == LinearThresholdGate::START_CODON_ONE) &&
-                (genome[(i + 1) % (int)genome.size()] ==
-                 LinearThresholdGate::START_CODON_TWO)) {
-            gate = new LinearThresholdGate(genome, i, mNumSensors, mNumHidden,
-                    mNumMotors, mDeterministic);
-            gates.push_back(gate);
-        }
-    }
+bool LinearThresholdAgent::generatePhenotype() {
+    return buildGates(LinearThresholdGate::START_CODON_ONE,
+            LinearThresholdGate::START_CODON_TWO);
+}
+
+AbstractGate *LinearThresholdAgent::newGate(int start) {
+    return new LinearThresholdGate(genome, start, mNumSensors, mNumHidden,
+            mNumMotors, mDeterministic);
 }
 
 void LinearThresholdAgent::injectStartCodons(int n) {
@@ -59,11 +50,9 @@ vector< vector<int> > LinearThresholdAgent::getEdges() {
     return edgeList;
 }
 
-LinearThresholdAgent::~LinearThresholdAgent() {
-    for (int i = 0; i < (int)gates.size(); i++) {
-        delete gates[i];
-    }
+AbstractAgent *LinearThresholdAgent::clone() const {
+    return new LinearThresholdAgent(*this);
 }
 
-unsigned char LinearThresholdAgent::START_CODON_ONE = LinearThresholdGate::START_CODON_ONE;
-unsigned char LinearThresholdAgent::START_CODON_TWO = LinearThresholdGate::START_CODON_TWO;
+const unsigned char LinearThresholdAgent::START_CODON_ONE;
+const unsigned char LinearThresholdAgent::START_CODON_TWO;
@@ -15,15 +15,20 @@ class LinearThresholdAgent: public AbstractAgent {
             numHidden, int numMotors, bool deterministic)
     : AbstractAgent(genome, numSensors, numHidden, numMotors, deterministic)
     {}
-    ~LinearThresholdAgent();
 
-    static unsigned char START_CODON_ONE;
-    static unsigned char START_CODON_TWO;
+    static const unsigned char START_CODON_ONE =
+        LinearThresholdGate::START_CODON_ONE;
+    static const unsigned char START_CODON_TWO =
+        LinearThresholdGate::START_CODON_TWO;
 
-    void generatePhenotype();
+    bool generatePhenotype();
 
     using AbstractAgent::injectStartCodons;
     void injectStartCodons(int n);
 
     vector< vector<int> > getEdges();
+    AbstractAgent *clone() const;
+
+ protected:
+    AbstractGate *newGate(int start);
 };
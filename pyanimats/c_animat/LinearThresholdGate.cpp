@@ -3,13 +3,12 @@
 #include "./LinearThresholdGate.hpp"
 
 
-// Define start codon pair for this gate
-// (Using 11, because 42 onward are used by Adami lab's MABE software)
-unsigned char LinearThresholdGate::START_CODON_ONE = 11;
-unsigned char LinearThresholdGate::START_CODON_TWO = 255 - START_CODON_ONE;
+// Start codon pair for this gate (the values are in the header)
+const unsigned char LinearThresholdGate::START_CODON_ONE;
+const unsigned char LinearThresholdGate::START_CODON_TWO;
 
 
-LinearThresholdGate::LinearThresholdGate(vector<unsigned char> &genome,
+LinearThresholdGate::LinearThresholdGate(const Genome &genome,
         int start, const int numSensors, const int numHidden,
         const int numMotors, const bool deterministic)
     : AbstractGate(numSensors, numHidden, numMotors, deterministic) {
@@ -52,6 +51,10 @@ LinearThresholdGate::LinearThresholdGate(vector<unsigned char> &genome,
     // Move past the input codon
     scan += maxInputs;
 
+    // The outputs follow the start codon, the threshold, the input and
+    // output counts, and the input codon
+    span = 5 + maxInputs + numOutputs;
+
     // Get outputs
     for (int i = 0; i < numOutputs; i++)
         // Exclude sensors from possible outputs.
@@ -59,25 +62,15 @@ LinearThresholdGate::LinearThresholdGate(vector<unsigned char> &genome,
             + mNumSensors;
 }
 
-void LinearThresholdGate::update(
-        vector<unsigned char> &currentStates,
-        vector<unsigned char> &nextStates) {
-    // Count the number of inputs that are on
-    int inputCount = 0;
-    for (int i = 0; i < (int)inputs.size(); i++)
-        inputCount += (currentStates[inputs[i]] & 1);
-    // Activate outputs if count exceeds threshold
+void LinearThresholdGate::compile(GateProgram &program) const {
+    GateInstruction &instruction = program.add(OP_LINEAR_THRESHOLD, inputs,
+            outputs);
+    // Outputs are activated if the number of inputs that are on exceeds the
+    // threshold.
     // NOTE: Overwriting the output, rather than merging it with an OR,
     // ensures that each node effectively only recieves input from one
     // threshold gate (the last one in the genome that outputs to it)
-    if (inputCount > threshold) {
-        for (int i = 0; i < (int)outputs.size(); i++)
-            nextStates[outputs[i]] = 1;
-    }
-    else {
-        for (int i = 0; i < (int)outputs.size(); i++)
-            nextStates[outputs[i]] = 0;
-    }
+    instruction.threshold = threshold;
 }
 
 LinearThresholdGate::~LinearThresholdGate() {
@@ -85,7 +78,7 @@ LinearThresholdGate::~LinearThresholdGate() {
     outputs.clear();
 }
 
-void LinearThresholdGate::print() {
+void LinearThresholdGate::print() const {
     printf("\n---------------------");
     printf("\nLinear Threshold Gate");
     printf("\n---------------------");
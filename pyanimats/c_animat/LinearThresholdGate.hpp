@@ -5,23 +5,25 @@
 #include <vector>
 
 #include "./AbstractGate.hpp"
+#include "./Genome.hpp"
 
 using std::vector;
 
 
 class LinearThresholdGate: public AbstractGate {
  public:
-    LinearThresholdGate(vector<unsigned char> &genome, int start,
+    LinearThresholdGate(const Genome &genome, int start,
             const int numSensors, const int numHidden, const int numMotors,
             const bool deterministic);
     ~LinearThresholdGate();
 
     // Start codon pair for this gate
-    static unsigned char START_CODON_ONE, START_CODON_TWO;
+    // (Using 11, because 42 onward are used by Adami lab's MABE software)
+    static const unsigned char START_CODON_ONE = 11;
+    static const unsigned char START_CODON_TWO = 255 - START_CODON_ONE;
 
     int threshold;
 
-    void update(vector<unsigned char> &currentStates,
-            vector<unsigned char> &nextStates) override;
-    void print() override;
+    void compile(GateProgram &program) const override;
+    void print() const override;
 };
@@ -0,0 +1,184 @@
+// Population.cpp
+
+#include <math.h>
+
+#include <algorithm>
+#include <stdexcept>
+
+#include "./Population.hpp"
+#include "./Game.hpp"
+#include "./rng.hpp"
+#include "./ThreadPool.hpp"
+
+
+Population::Population(const vector<AbstractAgent*> &agents,
+        const vector<double> &fitness, const vector<double> &rawFitness,
+        const vector<int> &correct, const vector<int> &incorrect)
+        : agents(agents), fitness(fitness), rawFitness(rawFitness),
+          correct(correct), incorrect(incorrect),
+          parents(agents.size(), -1), evaluated(agents.size(), 0) {
+    size_t n = agents.size();
+    if (fitness.size() != n || rawFitness.size() != n ||
+            correct.size() != n || incorrect.size() != n)
+        throw std::invalid_argument(
+            "there must be one fitness value per agent");
+}
+
+Population::~Population() {
+    clear();
+}
+
+void Population::clear() {
+    for (int i = 0; i < size(); i++)
+        delete agents[i];
+    agents.clear();
+}
+
+vector<int> Population::select(uint64_t seed, uint64_t generation) const {
+    int n = size();
+    vector<int> chosen(n);
+    if (n == 0) return chosen;
+    double maxFitness = *std::max_element(fitness.begin(), fitness.end());
+    if (!(maxFitness > 0))
+        throw std::domain_error("selection needs a positive fitness");
+    RandomStream rng(streamKey(seed, generation, 0, SELECTION_STREAM));
+    for (int k = 0; k < n; k++) {
+        int candidate;
+        do {
+            candidate = rng.randBelow(n);
+        } while (!(rng.randDouble() <= fitness[candidate] / maxFitness));
+        chosen[k] = candidate;
+    }
+    return chosen;
+}
+
+void Population::reproduce(const vector<int> &parents, uint64_t generation,
+        const EvolutionParams &params, const GameConfig &config,
+        int numThreads) {
+    int n = (int)parents.size();
+    for (int i = 0; i < n; i++) {
+        if (parents[i] < 0 || parents[i] >= size())
+            throw std::out_of_range("parent index out of range");
+    }
+    // Clone the parents
+    vector<AbstractAgent*> offspring(n);
+    parallelFor(n, numThreads, [&](int i) {
+        offspring[i] = agents[parents[i]]->clone();
+        offspring[i]->seedStreams(params.seed, generation, i);
+    });
+    // Mutate the clones
+    vector<unsigned char> changed(n, 0);
+    mutateAgents(offspring, changed.data(), params.mutProb, params.dupProb,
+            params.delProb, params.minGenomeLength, params.maxGenomeLength,
+            params.minDupDelLength, params.maxDupDelLength, numThreads);
+    // Inherit the fitness of the parents, and re-evaluate those offspring
+    // whose fitness may differ
+    vector<double> newFitness(n), newRawFitness(n);
+    vector<int> newCorrect(n), newIncorrect(n);
+    vector<int> dirty;
+    for (int i = 0; i < n; i++) {
+        newFitness[i] = fitness[parents[i]];
+        newRawFitness[i] = rawFitness[parents[i]];
+        newCorrect[i] = correct[parents[i]];
+        newIncorrect[i] = incorrect[parents[i]];
+        if (!params.skipUnchanged || changed[i])
+            dirty.push_back(i);
+    }
+    clear();
+    agents.swap(offspring);
+    fitness.swap(newFitness);
+    rawFitness.swap(newRawFitness);
+    correct.swap(newCorrect);
+    incorrect.swap(newIncorrect);
+    this->parents = parents;
+    evaluated.assign(n, 0);
+    evaluate(dirty, params, config, numThreads);
+}
+
+void Population::evolve(uint64_t generation, const EvolutionParams &params,
+        const GameConfig &config, int numThreads) {
+    reproduce(select(params.seed, generation), generation, params, config,
+            numThreads);
+}
+
+void Population::evaluate(const vector<int> &indices,
+        const EvolutionParams &params, const GameConfig &config,
+        int numThreads) {
+    int n = (int)indices.size();
+    if (n == 0) return;
+    int numTrials = config.numTrials;
+    int numNodes = agents[indices[0]]->mNumNodes;
+    bool food = params.fitnessFunction == FITNESS_FOOD;
+    // Only record as much of the games as the fitness function needs
+    vector<uint8_t> trialResults((size_t)n * numTrials);
+    vector<int> activity(food ? (size_t)n * numNodes : 0);
+    vector<GameRecord> records(n);
+    vector<AbstractAgent*> players(n);
+    for (int k = 0; k < n; k++) {
+        records[k].trialResults = &trialResults[(size_t)k * numTrials];
+        if (food) records[k].activity = &activity[(size_t)k * numNodes];
+        players[k] = agents[indices[k]];
+    }
+    vector<int> totals(2 * n);
+    executeGames(records, players, totals.data(), config, false,
+            params.noiseLevel, numThreads);
+    int numBlocks = (int)params.blockValues.size();
+    int trialsPerBlock = numBlocks ? numTrials / numBlocks : 0;
+    parallelFor(n, numThreads, [&](int k) {
+        int i = indices[k];
+        correct[i] = totals[2 * k + CORRECT];
+        incorrect[i] = totals[2 * k + INCORRECT];
+        double raw = correct[i];
+        if (params.fitnessFunction == FITNESS_NO_LSCC) {
+            if (largestComponentSize(agents[i]->getConnectivityMatrix(),
+                        agents[i]->mNumNodes) > 1)
+                raw = 0;
+        } else if (food) {
+            // Energy from the blocks caught
+            double energy = 0;
+            const uint8_t *results = records[k].trialResults;
+            for (int t = 0; t < trialsPerBlock * numBlocks; t++) {
+                if (results[t] == CORRECT_CATCH || results[t] == WRONG_CATCH)
+                    energy += params.blockValues[t / trialsPerBlock];
+            }
+            // Penalties
+            long long timestepsOn = 0;
+            for (int j = 0; j < numNodes; j++)
+                timestepsOn += records[k].activity[j];
+            raw = energy + params.baselinePenalty +
+                params.activityPenalty * timestepsOn;
+        }
+        double normalized = (raw - params.rangeMin) /
+            (params.rangeMax - params.rangeMin);
+        rawFitness[i] = raw;
+        fitness[i] = pow(params.base, normalized * params.scale + params.add);
+        evaluated[i] = 1;
+    });
+}
+
+int largestComponentSize(const vector<unsigned char> &cm, int numNodes) {
+    // The nodes each node reaches (itself included), as bits of a word
+    vector<uint64_t> reach(numNodes);
+    for (int i = 0; i < numNodes; i++) {
+        reach[i] = (uint64_t)1 << i;
+        for (int j = 0; j < numNodes; j++) {
+            if (cm[i * numNodes + j]) reach[i] |= (uint64_t)1 << j;
+        }
+    }
+    // Transitive closure (Floyd-Warshall, a row at a time)
+    for (int k = 0; k < numNodes; k++) {
+        for (int i = 0; i < numNodes; i++) {
+            if ((reach[i] >> k) & 1) reach[i] |= reach[k];
+        }
+    }
+    // Node `i`'s component is the set of nodes it reaches that reach it
+    int largest = 0;
+    for (int i = 0; i < numNodes; i++) {
+        int size = 0;
+        for (int j = 0; j < numNodes; j++) {
+            size += ((reach[i] >> j) & 1) && ((reach[j] >> i) & 1);
+        }
+        largest = std::max(largest, size);
+    }
+    return largest;
+}
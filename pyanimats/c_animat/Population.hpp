@@ -0,0 +1,113 @@
+// Population.hpp
+
+#pragma once
+
+#include <stdint.h>
+
+#include <vector>
+
+#include "./AbstractAgent.hpp"
+#include "./GameConfig.hpp"
+
+using std::vector;
+
+// The fitness functions a Population can evaluate itself
+// The number of correct trials
+#define FITNESS_NAT 0
+// The number of correct trials, or 0 if the connectivity matrix has a cycle
+// (a strongly connected component with more than one node)
+#define FITNESS_NO_LSCC 1
+// The energy gained from catching blocks, minus the baseline and activity
+// penalties
+#define FITNESS_FOOD 2
+
+// Everything about an evolution that the Population needs to simulate a
+// generation
+struct EvolutionParams {
+    // The experiment seed, from which all random number streams are derived
+    uint64_t seed = 0;
+    // See AbstractAgent::mutateGenome
+    double mutProb = 0;
+    double dupProb = 0;
+    double delProb = 0;
+    int minGenomeLength = 0;
+    int maxGenomeLength = 0;
+    int minDupDelLength = 0;
+    int maxDupDelLength = 0;
+    // One of the FITNESS_* functions
+    int fitnessFunction = FITNESS_NAT;
+    // The raw fitness is normalized from [rangeMin, rangeMax] to [0, 1] and
+    // transformed into base^(scale * normalized + add)
+    double rangeMin = 0;
+    double rangeMax = 1;
+    double base = 1;
+    double scale = 1;
+    double add = 0;
+    // The parameters of FITNESS_FOOD: the penalty added to every game, the
+    // penalty per timestep a node is on, and the energy of catching a block
+    // of each type (the trials are split evenly between the types, in order)
+    double baselinePenalty = 0;
+    double activityPenalty = 0;
+    vector<int> blockValues;
+    // The noise level of the games
+    double noiseLevel = 0;
+    // Whether an offspring whose phenotype didn't change inherits its
+    // parent's fitness instead of playing a game (only valid if its games
+    // are deterministic)
+    bool skipUnchanged = false;
+};
+
+// A population whose agents are selected, cloned, mutated, and evaluated a
+// whole generation at a time, without leaving the engine. Only the fitness
+// of each agent and the index of its parent in the previous generation are
+// kept for the caller; the genomes of clones share their storage with their
+// parents' until they're mutated (see Genome).
+class Population {
+ public:
+    // The population takes ownership of the agents. Their fitness, raw
+    // fitness, and numbers of correct and incorrect trials are given, one
+    // entry per agent.
+    Population(const vector<AbstractAgent*> &agents,
+            const vector<double> &fitness, const vector<double> &rawFitness,
+            const vector<int> &correct, const vector<int> &incorrect);
+    ~Population();
+    Population(const Population&) = delete;
+    Population &operator=(const Population&) = delete;
+
+    vector<AbstractAgent*> agents;
+    vector<double> fitness;
+    vector<double> rawFitness;
+    vector<int> correct;
+    vector<int> incorrect;
+    // The index of each agent's parent in the previous generation
+    vector<int> parents;
+    // Whether each agent played a game this generation (rather than
+    // inheriting its parent's fitness)
+    vector<unsigned char> evaluated;
+
+    int size() const { return (int)agents.size(); }
+
+    // Pick as many parents as there are agents, with fitness-proportionate
+    // (roulette wheel) selection by rejection sampling. The picks are drawn
+    // from a stream derived from the seed and the generation.
+    vector<int> select(uint64_t seed, uint64_t generation) const;
+    // Replace the population with a mutated clone of each of the given
+    // parents and evaluate the clones. Clone `i` has the streams of index
+    // `i` in the given generation.
+    void reproduce(const vector<int> &parents, uint64_t generation,
+            const EvolutionParams &params, const GameConfig &config,
+            int numThreads);
+    // Simulate a generation: select the parents and reproduce
+    void evolve(uint64_t generation, const EvolutionParams &params,
+            const GameConfig &config, int numThreads);
+
+ private:
+    void clear();
+    // Play the games of the agents with the given indices and score them
+    void evaluate(const vector<int> &indices, const EvolutionParams &params,
+            const GameConfig &config, int numThreads);
+};
+
+// The number of nodes in the largest strongly connected component of the
+// graph with the given connectivity matrix
+int largestComponentSize(const vector<unsigned char> &cm, int numNodes);
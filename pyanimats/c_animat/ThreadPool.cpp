@@ -0,0 +1,94 @@
+// ThreadPool.cpp
+
+#include <algorithm>
+#include <memory>
+
+#include "./ThreadPool.hpp"
+
+
+ThreadPool::ThreadPool(int numThreads) : mTask(nullptr), mNext(0), mEnd(0),
+        mBusy(0), mRound(0), mStop(false) {
+    for (int i = 1; i < numThreads; i++) {
+        mWorkers.push_back(std::thread(&ThreadPool::work, this));
+    }
+}
+
+ThreadPool::~ThreadPool() {
+    {
+        std::lock_guard<std::mutex> lock(mMutex);
+        mStop = true;
+    }
+    mWake.notify_all();
+    for (int i = 0; i < (int)mWorkers.size(); i++) {
+        mWorkers[i].join();
+    }
+}
+
+int ThreadPool::size() {
+    return (int)mWorkers.size() + 1;
+}
+
+void ThreadPool::runTasks() {
+    int i;
+    while ((i = mNext++) < mEnd) {
+        (*mTask)(i);
+    }
+}
+
+void ThreadPool::work() {
+    unsigned long round = 0;
+    while (true) {
+        {
+            std::unique_lock<std::mutex> lock(mMutex);
+            mWake.wait(lock, [&] { return mStop || mRound != round; });
+            if (mStop) return;
+            round = mRound;
+        }
+        runTasks();
+        {
+            std::lock_guard<std::mutex> lock(mMutex);
+            if (--mBusy == 0) mDone.notify_one();
+        }
+    }
+}
+
+void ThreadPool::parallelFor(int n, const std::function<void(int)> &task) {
+    if (n <= 0) return;
+    // Don't bother waking the workers if there's nothing to share
+    if (mWorkers.empty() || n == 1) {
+        for (int i = 0; i < n; i++) task(i);
+        return;
+    }
+    {
+        std::lock_guard<std::mutex> lock(mMutex);
+        mTask = &task;
+        mNext = 0;
+        mEnd = n;
+        mBusy = (int)mWorkers.size();
+        mRound++;
+    }
+    mWake.notify_all();
+    runTasks();
+    std::unique_lock<std::mutex> lock(mMutex);
+    mDone.wait(lock, [this] { return mBusy == 0; });
+    mTask = nullptr;
+}
+
+static std::unique_ptr<ThreadPool> pool;
+static std::mutex poolMutex;
+
+ThreadPool &getThreadPool(int numThreads) {
+    if (numThreads < 1) {
+        numThreads = std::max(1, (int)std::thread::hardware_concurrency());
+    }
+    if (!pool || pool->size() != numThreads) {
+        pool.reset(new ThreadPool(numThreads));
+    }
+    return *pool;
+}
+
+void parallelFor(int n, int numThreads,
+        const std::function<void(int)> &task) {
+    std::lock_guard<std::mutex> lock(poolMutex);
+    getThreadPool(numThreads).parallelFor(n, task);
+}
@@ -0,0 +1,53 @@
+// ThreadPool.hpp
+
+#pragma once
+
+#include <atomic>
+#include <condition_variable>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+using std::vector;
+
+// A fixed set of worker threads that execute the iterations of a parallel
+// loop. Iterations are handed out one at a time with an atomic counter, so
+// uneven workloads (e.g. animats with very different numbers of gates) are
+// balanced across the threads. The calling thread takes part in the work.
+class ThreadPool {
+ public:
+    explicit ThreadPool(int numThreads);
+    ~ThreadPool();
+
+    // Total number of threads, including the calling thread
+    int size();
+
+    // Call `task(i)` for every `i` in [0, n) and return once all calls have
+    // returned. Must not be called from more than one thread at a time.
+    void parallelFor(int n, const std::function<void(int)> &task);
+
+ private:
+    vector<std::thread> mWorkers;
+    std::mutex mMutex;
+    std::condition_variable mWake;
+    std::condition_variable mDone;
+    const std::function<void(int)> *mTask;
+    std::atomic<int> mNext;
+    int mEnd;
+    int mBusy;
+    unsigned long mRound;
+    bool mStop;
+
+    void work();
+    void runTasks();
+};
+
+// Return the process-wide pool, (re)creating it with `numThreads` threads if
+// necessary. If `numThreads` is less than 1, one thread per hardware thread is
+// used.
+ThreadPool &getThreadPool(int numThreads);
+
+// Run `task(i)` for every `i` in [0, n) on the process-wide pool. Calls from
+// different threads are serialized.
+void parallelFor(int n, int numThreads, const std::function<void(int)> &task);
@@ -7,6 +7,8 @@
 # c_animat.pyx
 
 
+from libc.stdint cimport uint8_t, uint64_t
+from libc.string cimport memcpy
 from libcpp.vector cimport vector
 from libcpp.string cimport string
 from libcpp cimport bool, string
@@ -16,6 +18,8 @@ cimport cython
 import numpy as np
 cimport numpy as cnp
 
+cnp.import_array()
+
 
 ctypedef unsigned char uchar
 
@@ -26,14 +30,27 @@ cdef extern from 'constants.hpp':
     cdef int _CORRECT_AVOID 'CORRECT_AVOID'
     cdef int _WRONG_AVOID 'WRONG_AVOID'
     cdef int _MIN_BODY_LENGTH 'MIN_BODY_LENGTH'
+    cdef int _RECORD_OUTCOMES 'RECORD_OUTCOMES'
+    cdef int _RECORD_ACTIVITY 'RECORD_ACTIVITY'
+    cdef int _RECORD_PACKED 'RECORD_PACKED'
+    cdef int _RECORD_FULL 'RECORD_FULL'
+    cdef int _MAX_TPM_NODES 'MAX_TPM_NODES'
 CORRECT_CATCH = _CORRECT_CATCH
 WRONG_CATCH = _WRONG_CATCH
 CORRECT_AVOID = _CORRECT_AVOID
 WRONG_AVOID = _WRONG_AVOID
 MIN_BODY_LENGTH = _MIN_BODY_LENGTH
+RECORD_OUTCOMES = _RECORD_OUTCOMES
+RECORD_ACTIVITY = _RECORD_ACTIVITY
+RECORD_PACKED = _RECORD_PACKED
+RECORD_FULL = _RECORD_FULL
 
 
 cdef extern from 'rng.hpp':
+    cdef cppclass RandomStream:
+        unsigned long long key
+        unsigned long long counter
+
     cdef double randDouble()
     cdef int randInt()
     cdef int randCharInt()
@@ -44,47 +61,58 @@ cdef extern from 'rng.hpp':
 
 def randint():
     """Return a random integer.
-    
-    Draws from a uniform distribution generated by the C++ mersenne twister
-    (mt19937).
+
+    Draws from a uniform distribution generated by the module-level C++
+    counter-based stream (Philox4x32-10). Animats don't use this stream; see
+    ``pyAbstractAgent.seed_rng``.
     """
     return randInt()
 
 
 def random():
-    """Return a random float between 0 and 1 (inclusive).
+    """Return a random float between 0 (inclusive) and 1 (exclusive).
 
-    Draws from a uniform distribution generated by the C++ mersenne twister
-    (mt19937).
+    Draws from a uniform distribution generated by the module-level C++
+    counter-based stream (Philox4x32-10).
     """
     return randDouble()
 
 
 def randchar():
     """Return a random integer between 0 and 255 (inclusive).
-    
-    Draws from a uniform distribution generated by the C++ mersenne twister
-    (mt19937).
+
+    Draws from a uniform distribution generated by the module-level C++
+    counter-based stream (Philox4x32-10).
     """
     return randCharInt()
 
 
 def seed(s):
-    """Seed the C++ random number generator."""
+    """Seed the module-level C++ random number stream."""
     seedRNG(s)
 
 
 def get_rng_state():
-    """Return the state of the C++ random number generator."""
+    """Return the state of the module-level C++ random number stream."""
     return getState()
 
 
 def set_rng_state(state):
-    """Set the state of the C++ random number generator."""
+    """Set the state of the module-level C++ random number stream."""
     setState(state)
 
 
+cdef extern from 'Genome.hpp':
+    cdef cppclass Genome:
+        int size()
+        void copy(int i, int n, uchar *out)
+
+
 cdef extern from 'AbstractAgent.hpp':
+    cdef struct GenomeEdit 'AbstractAgent::GenomeEdit':
+        int position
+        int width
+
     cdef cppclass AbstractAgent:
         AbstractAgent(
             vector[uchar] genome, int numSensors, int numHidden, int numMotors,
@@ -99,16 +127,40 @@ cdef extern from 'AbstractAgent.hpp':
         int mBodyLength
         bool mDeterministic
 
-        vector[uchar] genome
+        unsigned long long mSeed
+        unsigned long long mGeneration
+        unsigned long long mIndex
+        unsigned long long mGamesPlayed
+        RandomStream rng
+
+        Genome genome
+        vector[GenomeEdit] mutations
+
+        void seedStreams(unsigned long long seed,
+                         unsigned long long generation,
+                         unsigned long long index)
 
         void injectStartCodons(int n, uchar codon_one, uchar codon_two)
-        void generatePhenotype();
-        void mutateGenome(
+        bool generatePhenotype();
+        bool mutateGenome(
             double mutProb, double dupProb, double delProb, int
             minGenomeLength, int maxGenomeLength, int minDupDelLength, 
             int maxDupDelLength)
-        vector[vector[bool]] getTransitions()
+        vector[int] &getEdgeList()
+        vector[uchar] &getConnectivityMatrix()
+        vector[uint64_t] &getTransitions() except +
+        void getNextStates(const uint64_t *states, uint64_t *next,
+                           int n) except +
+        void getTransitionProbabilities(double *tpm) except +
+        uint64_t getPhenotypeHash() except +
         void printGates()
+        AbstractAgent *clone() except +
+
+    cdef void mutateAgents(
+        vector[AbstractAgent*] &agents, uchar *changed, double mutProb,
+        double dupProb, double delProb, int minGenomeLength,
+        int maxGenomeLength, int minDupDelLength, int maxDupDelLength,
+        int numThreads) nogil
 
 
 cdef extern from 'HiddenMarkovAgent.hpp':
@@ -121,8 +173,7 @@ cdef extern from 'HiddenMarkovAgent.hpp':
         uchar START_CODON_ONE;
         uchar START_CODON_TWO;
 
-        vector[vector[int]] getEdges()
-        void generatePhenotype();
+        bool generatePhenotype();
 
         void injectStartCodons(int n);
 
@@ -137,111 +188,419 @@ cdef extern from 'LinearThresholdAgent.hpp':
         uchar START_CODON_ONE;
         uchar START_CODON_TWO;
 
-        vector[vector[int]] getEdges()
-        void generatePhenotype();
+        bool generatePhenotype();
 
         void injectStartCodons(int n);
 
 
-cdef extern from 'Game.hpp':
-    cdef vector[int] executeGame(
-        vector[uchar] animatStates, vector[int] worldStates, 
-        vector[int] animatPositions, vector[int] trialResults, 
-        AbstractAgent* agent, vector[int] hitMultipliers, vector[int] patterns,
-        int worldWidth, int worldHeight, bool scrambleWorld, double noiseLevel)
-
-
-cdef extern from 'asvoid.hpp':
-    void *asvoid(vector[uchar] *buf)
-    void *asvoid(vector[int] *buf)
-
+cdef extern from 'GameConfig.hpp':
+    cdef cppclass GameConfig:
+        GameConfig(
+            vector[int] &hitMultipliers, vector[uint64_t] &patterns,
+            int worldWidth, int worldHeight, vector[int] &sensorLocations,
+            int bodyLength, bool fastPaths
+        ) except +
+        vector[int] hitMultipliers
+        vector[uint64_t] patterns
+        int worldWidth
+        int worldHeight
+        vector[int] sensorLocations
+        int bodyLength
+        bool fastPaths
+        int numTrials
+
+
+cdef extern from 'GameHistograms.hpp':
+    cdef cppclass GameHistograms:
+        vector[uint64_t] states
+        vector[int] stateCounts
+        vector[long] lastVisits
+        vector[int] sensorMotorCounts
+        vector[uint64_t] hiddenStates
+        vector[int] hiddenCounts
 
-class StdVectorBase:
-    pass
 
+cdef extern from 'Game.hpp':
+    cdef struct GameRecord:
+        uint8_t *trialResults
+        int *activity
+        uint64_t *worldStates
+        uint8_t *animatPositions
+        uint64_t *packedStates
+        uchar *animatStates
+        GameHistograms *histograms
 
-# See https://groups.google.com/d/topic/cython-users/13Bo4zXb930/discussion
-cdef class UnsignedCharWrapper:
+    cdef vector[int] executeGame(
+        GameRecord &record, AbstractAgent* agent, GameConfig &config,
+        bool scrambleWorld, double noiseLevel) nogil
+    cdef void executeReplicates(
+        vector[GameRecord] &records, AbstractAgent* agent, int *totals,
+        GameConfig &config, bool scrambleWorld, double noiseLevel) nogil
+    cdef void executeGames(
+        vector[GameRecord] &records, vector[AbstractAgent*] &agents,
+        int *totals, GameConfig &config, bool scrambleWorld,
+        double noiseLevel, int numThreads) nogil
+
+
+cdef extern from 'Population.hpp':
+    cdef int _FITNESS_NAT 'FITNESS_NAT'
+    cdef int _FITNESS_NO_LSCC 'FITNESS_NO_LSCC'
+    cdef int _FITNESS_FOOD 'FITNESS_FOOD'
+
+    cdef struct EvolutionParams:
+        unsigned long long seed
+        double mutProb
+        double dupProb
+        double delProb
+        int minGenomeLength
+        int maxGenomeLength
+        int minDupDelLength
+        int maxDupDelLength
+        int fitnessFunction
+        double rangeMin
+        double rangeMax
+        double base
+        double scale
+        double add
+        double baselinePenalty
+        double activityPenalty
+        vector[int] blockValues
+        double noiseLevel
+        bool skipUnchanged
+
+    cdef cppclass Population:
+        Population(
+            vector[AbstractAgent*] &agents, vector[double] &fitness,
+            vector[double] &rawFitness, vector[int] &correct,
+            vector[int] &incorrect
+        ) except +
+        vector[AbstractAgent*] agents
+        vector[double] fitness
+        vector[double] rawFitness
+        vector[int] correct
+        vector[int] incorrect
+        vector[int] parents
+        vector[uchar] evaluated
+
+        int size()
+        vector[int] select(unsigned long long seed,
+                           unsigned long long generation) except +
+        void reproduce(
+            vector[int] &parents, unsigned long long generation,
+            EvolutionParams &params, GameConfig &config,
+            int numThreads) nogil except +
+        void evolve(
+            unsigned long long generation, EvolutionParams &params,
+            GameConfig &config, int numThreads) nogil except +
+
+# The fitness functions that a population can evaluate in the engine (see
+# ``pyPopulation``).
+NATIVE_FITNESS_FUNCTIONS = {
+    'nat': _FITNESS_NAT,
+    'no_lscc': _FITNESS_NO_LSCC,
+    'food': _FITNESS_FOOD,
+}
+
+
+cdef _histogram_arrays(GameHistograms &histograms, num_sensors, num_motors):
+    """Return the histograms of a game as NumPy arrays.
+
+    Returns:
+        tuple: The distinct states visited (packed with the little-endian
+        convention, in ascending order), the number of timesteps at which
+        each was visited, and the index of the last of those timesteps in the
+        game; the joint histogram of sensor and motor states, with
+        a row for each sensor state and a column for each motor state (or
+        ``None`` if there are too many sensors and motors); and the distinct
+        states of the hidden units (packed likewise) and their counts.
+    """
+    sensor_motor_counts = None
+    if histograms.sensorMotorCounts.size():
+        sensor_motor_counts = np.array(
+            histograms.sensorMotorCounts, dtype=np.int32).reshape(
+                2**num_sensors, 2**num_motors)
+    return (np.array(histograms.states, dtype=np.uint64),
+            np.array(histograms.stateCounts, dtype=np.int32),
+            np.array(histograms.lastVisits, dtype=np.int64),
+            sensor_motor_counts,
+            np.array(histograms.hiddenStates, dtype=np.uint64),
+            np.array(histograms.hiddenCounts, dtype=np.int32))
+
+
+def _record_arrays(record, num_games, num_trials, num_timesteps, num_nodes,
+                   out=None):
+    """Allocate the arrays that games record at the given level.
+
+    Each array has a row for each game; those that aren't recorded at the
+    given level are ``None``. If ``out`` is given, it must hold arrays like
+    the ones that would be allocated, which are used instead; only those that
+    are ``None`` are allocated.
+
+    Returns:
+        tuple: The animat states, world states, animat positions, trial
+        results, packed animat states, and activity.
+    """
+    layout = [(record >= RECORD_FULL, num_timesteps * num_nodes, np.uint8),
+              (record >= RECORD_PACKED, num_timesteps, np.uint64),
+              (record >= RECORD_PACKED, num_timesteps, np.uint8),
+              (True, num_trials, np.uint8),
+              (record >= RECORD_PACKED, num_timesteps, np.uint64),
+              (record >= RECORD_ACTIVITY, num_nodes, np.int32)]
+    if out is None:
+        out = (None,) * len(layout)
+    if len(out) != len(layout):
+        raise ValueError('expected {} output arrays, got {}'.format(
+            len(layout), len(out)))
+    arrays = []
+    for array, (recorded, size, dtype) in zip(out, layout):
+        if not recorded:
+            array = None
+        elif array is None:
+            array = np.empty((num_games, size), dtype=dtype)
+        elif (not isinstance(array, np.ndarray) or
+                array.shape != (num_games, size) or array.dtype != dtype or
+                not array.flags.c_contiguous or not array.flags.writeable):
+            raise ValueError(
+                'output arrays must be writeable, C-contiguous {} arrays of '
+                'shape {}'.format(np.dtype(dtype).name, (num_games, size)))
+        arrays.append(array)
+    return tuple(arrays)
+
+
+cdef void *_row(array, int i):
+    """Return a pointer to row ``i`` of a 2-D array, or NULL if there's no
+    array."""
+    if array is None:
+        return NULL
+    return cnp.PyArray_GETPTR1(array, i)
+
+
+cdef GameRecord _game_record(arrays, int i, GameHistograms *histograms):
+    """Return where the game of agent ``i`` is recorded in the given arrays
+    (see ``_record_arrays``)."""
+    (animat_states, world_states, animat_positions, trial_results,
+     packed_states, activity) = arrays
+    cdef GameRecord record
+    record.animatStates = <uchar*> _row(animat_states, i)
+    record.worldStates = <uint64_t*> _row(world_states, i)
+    record.animatPositions = <uint8_t*> _row(animat_positions, i)
+    record.trialResults = <uint8_t*> _row(trial_results, i)
+    record.packedStates = <uint64_t*> _row(packed_states, i)
+    record.activity = <int*> _row(activity, i)
+    record.histograms = histograms
+    return record
+
+
+cdef class pyGameConfig:
+    """The parts of a game that don't depend on the animat.
+
+    The worlds of every trial are generated once, when the config is built, so
+    games played with the same config need no setup.
+
+    Args:
+        hit_multipliers (list(int)): Whether each block should be caught
+            (positive) or avoided.
+        patterns (list(int)): The block patterns, as integers.
+        world_width (int): The width of the world, at most 64.
+        world_height (int): The number of timesteps in a trial.
+        sensor_locations (list(int)): The cell each sensor reads, relative to
+            the animat's position.
+        body_length (int): The number of cells the animat covers.
+
+    Keyword Args:
+        fast_paths (bool): Whether games may be played 64 trials at a time or
+            reuse the rest of trials that reach a known configuration. The
+            results are the same either way; turn them off only to check that.
+    """
+    # Hold the C++ instance that we're wrapping.
+    cdef GameConfig *thisptr
 
-    cdef vector[uchar] *buf 
+    def __cinit__(self, hit_multipliers, patterns, world_width, world_height,
+                  sensor_locations, body_length, fast_paths=True):
+        self.thisptr = new GameConfig(hit_multipliers, patterns, world_width,
+                                      world_height, sensor_locations,
+                                      body_length, fast_paths)
 
-    def __cinit__(UnsignedCharWrapper self, n): 
-        self.buf = NULL 
+    def __dealloc__(self):
+        del self.thisptr
 
-    def __init__(UnsignedCharWrapper self, cnp.intp_t n): 
-        self.buf = new vector[uchar](n) 
+    def __reduce__(self):
+        return (pyGameConfig, (self.hit_multipliers, self.patterns,
+                               self.world_width, self.world_height,
+                               self.sensor_locations, self.body_length,
+                               self.fast_paths))
 
-    def __dealloc__(UnsignedCharWrapper self): 
-        if self.buf != NULL: 
-            del self.buf 
+    def __eq__(self, other):
+        if not isinstance(other, pyGameConfig):
+            return NotImplemented
+        return self.__reduce__()[1] == other.__reduce__()[1]
 
-    def asarray(UnsignedCharWrapper self): 
-        """Interpret the vector as an np.ndarray without copying the data.""" 
-        base = StdVectorBase() 
-        intbuf = <cnp.uintp_t> asvoid(self.buf) 
-        n = <cnp.intp_t> self.buf.size()
-        dtype = np.dtype(np.uint8) 
-        base.__array_interface__ = dict( 
-            data=(intbuf, False), 
-            descr=dtype.descr, 
-            shape=(n,),
-            strides=(dtype.itemsize,), 
-            typestr=dtype.str, 
-            version=3,
-        ) 
-        base.vector_wrapper = self 
-        return np.asarray(base) 
+    property hit_multipliers:
+        def __get__(self):
+            return self.thisptr.hitMultipliers
 
+    property patterns:
+        def __get__(self):
+            return self.thisptr.patterns
 
-cdef class Int32Wrapper:
+    property world_width:
+        def __get__(self):
+            return self.thisptr.worldWidth
 
-    cdef vector[int] *buf 
+    property world_height:
+        def __get__(self):
+            return self.thisptr.worldHeight
 
-    def __cinit__(int self, n): 
-        self.buf = NULL 
+    property sensor_locations:
+        def __get__(self):
+            return self.thisptr.sensorLocations
 
-    def __init__(int self, cnp.intp_t n): 
-        self.buf = new vector[int](n) 
+    property body_length:
+        def __get__(self):
+            return self.thisptr.bodyLength
 
-    def __dealloc__(int self): 
-        if self.buf != NULL: 
-            del self.buf 
+    property fast_paths:
+        def __get__(self):
+            return self.thisptr.fastPaths
 
-    def asarray(int self): 
-        """Interpret the vector as an np.ndarray without copying the data.""" 
-        base = StdVectorBase() 
-        intbuf = <cnp.uintp_t> asvoid(self.buf) 
-        n = <cnp.intp_t> self.buf.size()
-        dtype = np.dtype(np.int32) 
-        base.__array_interface__ = dict( 
-            data=(intbuf, False), 
-            descr=dtype.descr, 
-            shape=(n,),
-            strides=(dtype.itemsize,), 
-            typestr=dtype.str, 
-            version=3,
-        ) 
-        base.vector_wrapper = self 
-        return np.asarray(base) 
+    property num_trials:
+        def __get__(self):
+            return self.thisptr.numTrials
+
+    def _check_agent(self, agent):
+        if agent.num_sensors != self.thisptr.sensorLocations.size():
+            raise ValueError(
+                'the game config has {} sensor locations but the agent has {} '
+                'sensors'.format(self.thisptr.sensorLocations.size(),
+                                 agent.num_sensors))
+
+
+# The element types a TPM can be written as (booleans are written as bytes).
+ctypedef fused tpm_t:
+    uint8_t
+    float
+    double
+
+
+cdef void _write_tpm(const uint64_t *transitions, tpm_t[:, ::1] out) nogil:
+    """Write the state of each node after each state into a row of ``out``."""
+    cdef Py_ssize_t i, j
+    cdef uint64_t row
+    for i in range(out.shape[0]):
+        row = transitions[i]
+        for j in range(out.shape[1]):
+            out[i, j] = (row >> j) & 1
+
+
+cdef vector[uchar] _as_genome(genome) except *:
+    """Convert a genome (bytes, or an iterable of integers from 0 to 255) to a
+    C++ vector, without going through a Python integer per nucleotide unless
+    it's given as such."""
+    if isinstance(genome, (bytes, bytearray, memoryview)):
+        array = np.frombuffer(genome, dtype=np.uint8)
+    else:
+        array = np.asarray(genome)
+        if array.dtype != np.uint8:
+            if array.size and (array.min() < 0 or array.max() > 255):
+                raise OverflowError(
+                    'genome values must be between 0 and 255')
+            array = array.astype(np.uint8)
+    cdef const uint8_t[::1] view = np.ascontiguousarray(array).ravel()
+    cdef vector[uchar] c_genome
+    if view.shape[0]:
+        c_genome.assign(&view[0], &view[0] + view.shape[0])
+    return c_genome
+
+
+# Passed as the genome to make an agent whose C++ instance is set afterwards
+# (see ``pyAbstractAgent.__copy__``).
+_COPY = object()
 
 
 cdef class pyAbstractAgent:
     # Hold the C++ instance that we're wrapping.
     cdef AbstractAgent *thisptr
     cdef bool _dirty_phenotype
+    # A read-only copy of the genome, until it's mutated.
+    cdef object _genome
 
     def __reduce__(self):
         # When pickling or copying, simply regenerate an instance.
         # NOTE: This means that changes in the implementation of
         # pyAbstractAgent that occur between pickling and unpickling can cause
         # a SILENT change in behavior!
-        return (pyAbstractAgent, (self.genome, self.num_sensors,
+        return (pyAbstractAgent, (self.genome.tobytes(), self.num_sensors,
                                   self.num_hidden, self.num_motors,
-                                  self.deterministic))
+                                  self.deterministic), self.rng_state)
+
+    def __setstate__(self, state):
+        self.rng_state = state
+
+    def __copy__(self):
+        """Return a copy of the agent.
+
+        The copy shares the genome's storage and the gates with this agent
+        until one of them is mutated, so it's cheap to make.
+        """
+        if self.thisptr == NULL:
+            raise TypeError('{} agents wrap no agent to copy'.format(
+                type(self).__name__))
+        cdef pyAbstractAgent copy = type(self).__new__(
+            type(self), _COPY, None, None, None, None)
+        copy._adopt(self.thisptr.clone())
+        copy._dirty_phenotype = self._dirty_phenotype
+        copy._genome = self._genome
+        return copy
+
+    def __deepcopy__(self, memo):
+        # Nothing the copy shares with this agent is ever modified in place.
+        return self.__copy__()
+
+    cdef _adopt(self, AbstractAgent *agent):
+        """Take ownership of a native agent; subclasses wrap their own."""
+        del agent
+        raise TypeError('{} agents cannot wrap a native agent'.format(
+            type(self).__name__))
+
+    def seed_rng(self, seed, generation, index):
+        """Seed the animat's random number streams.
+
+        Every stream the animat uses (for mutation, for each game it plays,
+        and for sampling its TPM) is derived from the experiment seed, the
+        generation, and the animat's index in the population, so the results
+        don't depend on the order in which animats are evaluated.
+        """
+        self.thisptr.seedStreams(seed, generation, index)
+
+    property rng_state:
+        """The seed, generation, index, number of games played, and position
+        of the animat's own random number stream."""
+        def __get__(self):
+            return (self.thisptr.mSeed, self.thisptr.mGeneration,
+                    self.thisptr.mIndex, self.thisptr.mGamesPlayed,
+                    self.thisptr.rng.counter)
+
+        def __set__(self, state):
+            seed, generation, index, games_played, counter = state
+            self.thisptr.seedStreams(seed, generation, index)
+            self.thisptr.mGamesPlayed = games_played
+            self.thisptr.rng.counter = counter
 
     property genome:
+        """The genome, as a read-only array of bytes.
+
+        The array is a snapshot: it isn't affected by later mutations.
+        """
         def __get__(self):
-            return self.thisptr.genome
+            if self._genome is None:
+                size = self.thisptr.genome.size()
+                genome = np.empty(size, dtype=np.uint8)
+                if size:
+                    self.thisptr.genome.copy(
+                        0, size, <uchar*> cnp.PyArray_DATA(genome))
+                genome.flags.writeable = False
+                self._genome = genome
+            return self._genome
 
     property num_sensors:
         def __get__(self):
@@ -272,10 +631,139 @@ cdef class pyAbstractAgent:
             return self.thisptr.mBodyLength
 
     property tpm:
+        """The TPM, as a read-only array with a row for each state (in
+        little-endian order) giving the next state of each node."""
+        def __get__(self):
+            tpm = self.transition_matrix()
+            tpm.flags.writeable = False
+            return tpm
+
+    def transition_matrix(self, dtype=np.uint8):
+        """Return the TPM (see ``tpm``) as a new array of the given type.
+
+        The TPM is written directly as ``bool``, ``uint8``, ``float32``, or
+        ``float64``, without intermediate arrays.
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in (np.bool_, np.uint8, np.float32, np.float64):
+            raise ValueError('cannot write a TPM as {}.'.format(dtype))
+        # Update the phenotype if necessary before getting the TPM.
+        self._update_phenotype()
+        cdef const vector[uint64_t] *transitions = \
+            &self.thisptr.getTransitions()
+        tpm = np.empty((transitions.size(), self.thisptr.mNumNodes),
+                       dtype=dtype)
+        if dtype == np.bool_ or dtype == np.uint8:
+            _write_tpm[uint8_t](transitions.data(), tpm.view(np.uint8))
+        elif dtype == np.float32:
+            _write_tpm[float](transitions.data(), tpm)
+        else:
+            _write_tpm[double](transitions.data(), tpm)
+        return tpm
+
+    def transition_probabilities(self):
+        """Return the exact state-by-node TPM, as a new array of ``float64``.
+
+        Row ``i`` gives the probability of each node being on after state
+        ``i``; nondeterministic animats' ``tpm`` is a sample of it. Computed
+        from the gates' tables in a single pass.
+        """
+        num_nodes = self.thisptr.mNumNodes
+        if num_nodes > _MAX_TPM_NODES:
+            raise ValueError('the TPM of agents with more than {} nodes is '
+                             'too large'.format(_MAX_TPM_NODES))
+        self._update_phenotype()
+        tpm = np.empty((2**num_nodes, num_nodes), dtype=np.float64)
+        self.thisptr.getTransitionProbabilities(
+            <double*> cnp.PyArray_DATA(tpm))
+        return tpm
+
+    def next_states(self, states=None):
+        """Return the state following each of the given states.
+
+        States are packed with the little-endian convention (node ``i`` is
+        bit ``i``). Only the given states are computed, so this works for
+        animats whose TPM would be too large; the states of a nondeterministic
+        animat are the same sample as its TPM.
+
+        Args:
+            states (np.ndarray): The packed states, of any shape. Defaults to
+                every state, in order.
+
+        Returns:
+            np.ndarray: The packed next states, as ``uint64``, in the shape of
+            ``states``.
+        """
+        self._update_phenotype()
+        cdef const vector[uint64_t] *transitions
+        if states is None:
+            transitions = &self.thisptr.getTransitions()
+            next_states = np.empty(transitions.size(), dtype=np.uint64)
+            memcpy(cnp.PyArray_DATA(next_states), transitions.data(),
+                   transitions.size() * sizeof(uint64_t))
+            return next_states
+        states = np.asarray(states, dtype=np.uint64)
+        cdef const uint64_t[::1] view = \
+            np.ascontiguousarray(states).ravel()
+        next_states = np.empty(states.shape, dtype=np.uint64)
+        if view.shape[0]:
+            self.thisptr.getNextStates(
+                &view[0], <uint64_t*> cnp.PyArray_DATA(next_states),
+                view.shape[0])
+        return next_states
+
+    property cm:
+        """The connectivity matrix, as a read-only array."""
         def __get__(self):
-            # Update the phenotype if necessary before getting the TPM.
             self._update_phenotype()
-            return self.thisptr.getTransitions()
+            cdef const vector[uchar] *cm = \
+                &self.thisptr.getConnectivityMatrix()
+            num_nodes = self.thisptr.mNumNodes
+            array = np.empty((num_nodes, num_nodes), dtype=np.uint8)
+            if num_nodes:
+                memcpy(cnp.PyArray_DATA(array), cm.data(), cm.size())
+            array.flags.writeable = False
+            return array
+
+    property edges:
+        """The edges between nodes, as a read-only array of (from, to) pairs,
+        one per row. May contain duplicates."""
+        def __get__(self):
+            self._update_phenotype()
+            cdef const vector[int] *edges = &self.thisptr.getEdgeList()
+            array = np.empty((edges.size() // 2, 2), dtype=np.int32)
+            if edges.size():
+                memcpy(cnp.PyArray_DATA(array), edges.data(),
+                       edges.size() * sizeof(int))
+            array.flags.writeable = False
+            return array
+
+    property mutations:
+        """The changes made to the genome by the last mutation, in order, as
+        a read-only array of (position, width) pairs, one per row.
+
+        A width of 0 is a point mutation at the position, a positive width is
+        an insertion of that many nucleotides before it, and a negative width
+        a deletion of that many nucleotides from it on. Positions refer to the
+        genome as it was when the change was made.
+        """
+        def __get__(self):
+            cdef const vector[GenomeEdit] *edits = &self.thisptr.mutations
+            cdef cnp.ndarray[int, ndim=2] array = np.empty(
+                (edits.size(), 2), dtype=np.int32)
+            cdef Py_ssize_t i
+            for i in range(<Py_ssize_t> edits.size()):
+                array[i, 0] = edits[0][i].position
+                array[i, 1] = edits[0][i].width
+            array.flags.writeable = False
+            return array
+
+    property phenotype_hash:
+        """A hash of the connectivity matrix and TPM, which together determine
+        the animat's behavior; equal phenotypes have equal hashes."""
+        def __get__(self):
+            self._update_phenotype()
+            return self.thisptr.getPhenotypeHash()
 
     def _update_phenotype(self):
         if self._dirty_phenotype:
@@ -287,35 +775,102 @@ cdef class pyAbstractAgent:
 
     def mutate(self, mutProb, dupProb, delProb, minGenomeLength,
                maxGenomeLength, minDupDelLength, maxDupDelLength):
-        self.thisptr.mutateGenome(mutProb, dupProb, delProb, minGenomeLength,
-                                  maxGenomeLength, minDupDelLength,
-                                  maxDupDelLength)
-        # The phenotype now needs to be updated.
-        self._dirty_phenotype = True
-
-    def play_game(self, hit_multipliers, patterns, worldWidth, worldHeight,
-                  scramble_world=False, noise_level=0.0):
+        """Mutate the genome in place.
+
+        Returns:
+            bool: Whether the phenotype may have changed. It didn't if no gate
+            reads a changed nucleotide and no start codon was created or
+            destroyed.
+        """
+        changed = self.thisptr.mutateGenome(
+            mutProb, dupProb, delProb, minGenomeLength, maxGenomeLength,
+            minDupDelLength, maxDupDelLength)
+        # The genome snapshot needs to be updated; the phenotype was
+        # regenerated along with the genome.
+        self._genome = None
+        self._dirty_phenotype = False
+        return changed
+
+    def play_game(self, pyGameConfig config, scramble_world=False,
+                  noise_level=0.0, histograms=False, record=RECORD_FULL):
+        """Play a game.
+
+        Keyword Args:
+            histograms (bool): Whether to count the states the agent visits.
+            record (int): What to record; one of the ``RECORD_*`` levels, each
+                of which records everything the previous ones do.
+
+        Returns:
+            tuple: The animat states, world states, animat positions, trial
+            results, correct and incorrect counts, packed animat states,
+            activity, and histograms (see ``_histogram_arrays``) of the game.
+            Whatever isn't recorded is ``None``.
+        """
+        config._check_agent(self)
         # Ensure the phenotype reflects the genome before playing the game.
         self._update_phenotype()
-        # Calculate the size of the state transition vector, which has an entry
-        # for every node state of every timestep of every trial, and initialize.
-        num_trials = len(patterns) * 2 * worldWidth
-        num_timesteps = num_trials * worldHeight
-        cdef UnsignedCharWrapper animat_states = \
-            UnsignedCharWrapper(num_timesteps * self.num_nodes)
-        cdef Int32Wrapper world_states = Int32Wrapper(num_timesteps)
-        cdef Int32Wrapper animat_positions = Int32Wrapper(num_timesteps)
-        cdef Int32Wrapper trial_results = Int32Wrapper(num_trials)
+        num_trials = config.thisptr.numTrials
+        num_timesteps = num_trials * config.thisptr.worldHeight
+        arrays = _record_arrays(record, 1, num_trials, num_timesteps,
+                                self.num_nodes)
+        cdef GameHistograms c_histograms
+        cdef GameRecord c_record = _game_record(
+            arrays, 0, &c_histograms if histograms else NULL)
         # Play the game, updating the animats hit and miss counts and filling
-        # the given transition vector with the states the animat went through.
-        correct, incorrect = executeGame(
-            animat_states.buf[0], world_states.buf[0], animat_positions.buf[0],
-            trial_results.buf[0], self.thisptr, hit_multipliers, patterns,
-            worldWidth, worldHeight, scramble_world, noise_level)
-        # Return the state transitions and world states as NumPy arrays.
-        return (animat_states.asarray(), world_states.asarray(),
-                animat_positions.asarray(), trial_results.asarray(), correct,
-                incorrect)
+        # the arrays with what it went through.
+        correct, incorrect = executeGame(c_record, self.thisptr,
+                                         config.thisptr[0], scramble_world,
+                                         noise_level)
+        (animat_states, world_states, animat_positions, trial_results,
+         packed_states, activity) = (None if array is None else array[0]
+                                     for array in arrays)
+        return (animat_states, world_states, animat_positions, trial_results,
+                correct, incorrect, packed_states, activity,
+                _histogram_arrays(c_histograms, self.num_sensors,
+                                  self.num_motors) if histograms else None)
+
+    def play_game_replicates(self, pyGameConfig config, num_replicates,
+                             scramble_world=False, noise_level=0.0,
+                             record=RECORD_FULL, out=None):
+        """Play several replicates of a game, as successive calls to
+        ``play_game`` would, in a single call into the engine.
+
+        Keyword Args:
+            record (int): What to record (see ``play_game``).
+            out (tuple): Arrays to record the games in, as returned by a
+                previous call with the same arguments. Arrays that are
+                ``None`` are allocated, as they all are by default.
+
+        Returns:
+            tuple: The animat states, world states, animat positions, and trial
+            results of every replicate as arrays whose first axis is indexed by
+            replicate, followed by an array of the correct and incorrect counts
+            of each replicate, and the packed animat states and activity of
+            every replicate. Whatever isn't recorded is ``None``.
+        """
+        config._check_agent(self)
+        # Ensure the phenotype reflects the genome before playing the games.
+        self._update_phenotype()
+        num_trials = config.thisptr.numTrials
+        num_timesteps = num_trials * config.thisptr.worldHeight
+        if out is not None:
+            out = tuple(out[:4]) + tuple(out[5:])
+        arrays = _record_arrays(record, num_replicates, num_trials,
+                                num_timesteps, self.num_nodes, out=out)
+        cdef cnp.ndarray[int, ndim=2] totals = np.empty(
+            (num_replicates, 2), dtype=np.int32)
+        cdef vector[GameRecord] c_records
+        for i in range(num_replicates):
+            c_records.push_back(_game_record(arrays, i, NULL))
+        cdef bool c_scramble = scramble_world
+        cdef double c_noise = noise_level
+        with nogil:
+            executeReplicates(c_records, self.thisptr, <int*> totals.data,
+                              config.thisptr[0], c_scramble, c_noise)
+        (animat_states, world_states, animat_positions, trial_results,
+         packed_states, activity) = arrays
+        return (animat_states, world_states, animat_positions, trial_results,
+                totals, packed_states, activity)
 
 
 cdef class pyHiddenMarkovAgent(pyAbstractAgent):
@@ -323,22 +878,30 @@ cdef class pyHiddenMarkovAgent(pyAbstractAgent):
 
     def __cinit__(self, genome, numSensors, numHidden, numMotors,
                   deterministic):
-        self.derivedptr = new HiddenMarkovAgent(genome, numSensors, numHidden,
-                                       numMotors, deterministic)
+        if genome is _COPY:
+            return
+        self.derivedptr = new HiddenMarkovAgent(_as_genome(genome),
+                                                numSensors, numHidden,
+                                                numMotors, deterministic)
         self.thisptr = self.derivedptr
         self._dirty_phenotype = True
 
     def __dealloc__(self):
         del self.derivedptr
 
+    cdef _adopt(self, AbstractAgent *agent):
+        self.derivedptr = <HiddenMarkovAgent*> agent
+        self.thisptr = agent
+
     def __reduce__(self):
         # When pickling or copying, simply regenerate an instance.
         # NOTE: This means that changes in the implementation of this class
         # that occur between pickling and unpickling can cause a SILENT change
         # in behavior!
-        return (pyHiddenMarkovAgent, (self.genome, self.num_sensors,
+        return (pyHiddenMarkovAgent, (self.genome.tobytes(), self.num_sensors,
                                       self.num_hidden, self.num_motors,
-                                      self.deterministic))
+                                      self.deterministic),
+                self.rng_state)
 
     property START_CODON_ONE:
         def __get__(self):
@@ -348,14 +911,10 @@ cdef class pyHiddenMarkovAgent(pyAbstractAgent):
         def __get__(self):
             return self.derivedptr.START_CODON_TWO
 
-    property edges:
-        def __get__(self):
-            # Update the phenotype if necessary before getting the edge list.
-            self._update_phenotype()
-            return self.derivedptr.getEdges()
-
     def injectStartCodons(self, n):
         self.derivedptr.injectStartCodons(n)
+        self._genome = None
+        self._dirty_phenotype = True
 
 
 cdef class pyLinearThresholdAgent(pyAbstractAgent):
@@ -363,23 +922,30 @@ cdef class pyLinearThresholdAgent(pyAbstractAgent):
 
     def __cinit__(self, genome, numSensors, numHidden, numMotors,
                   deterministic):
-        self.derivedptr = new LinearThresholdAgent(genome, numSensors,
-                                                   numHidden, numMotors,
-                                                   deterministic)
+        if genome is _COPY:
+            return
+        self.derivedptr = new LinearThresholdAgent(_as_genome(genome),
+                                                   numSensors, numHidden,
+                                                   numMotors, deterministic)
         self.thisptr = self.derivedptr
         self._dirty_phenotype = True
 
     def __dealloc__(self):
         del self.derivedptr
 
+    cdef _adopt(self, AbstractAgent *agent):
+        self.derivedptr = <LinearThresholdAgent*> agent
+        self.thisptr = agent
+
     def __reduce__(self):
         # When pickling or copying, simply regenerate an instance.
         # NOTE: This means that changes in the implementation of this class
         # that occur between pickling and unpickling can cause a SILENT change
         # in behavior!
-        return (pyLinearThresholdAgent, (self.genome, self.num_sensors,
-                                         self.num_hidden, self.num_motors,
-                                         self.deterministic))
+        return (pyLinearThresholdAgent, (self.genome.tobytes(),
+                                         self.num_sensors, self.num_hidden,
+                                         self.num_motors, self.deterministic),
+                self.rng_state)
 
     property START_CODON_ONE:
         def __get__(self):
@@ -392,11 +958,293 @@ cdef class pyLinearThresholdAgent(pyAbstractAgent):
     def __dealloc__(self):
         del self.derivedptr
 
-    property edges:
-        def __get__(self):
-            # Update the phenotype if necessary before getting the edge list.
-            self._update_phenotype()
-            return self.derivedptr.getEdges()
-
     def injectStartCodons(self, n):
         self.derivedptr.injectStartCodons(n)
+        self._genome = None
+        self._dirty_phenotype = True
+
+
+def play_games(agents, pyGameConfig config, scramble_world=False,
+               noise_level=0.0, num_threads=0, histograms=False,
+               record=RECORD_FULL):
+    """Play a game with each of the given agents.
+
+    The games are run on a pool of C++ threads without holding the GIL. All
+    agents must have the same number of nodes.
+
+    Keyword Args:
+        num_threads (int): The number of threads to use. If less than 1, one
+            thread per hardware thread is used.
+        histograms (bool): Whether to count the states each agent visits.
+        record (int): What to record (see ``play_game``).
+
+    Returns:
+        tuple: The animat states, world states, animat positions, and trial
+        results of every game as arrays whose first axis is indexed by agent,
+        followed by an array of the correct and incorrect counts of each
+        agent, the packed animat states and activity of every game, and the
+        histograms of each game. Whatever isn't recorded is ``None``.
+    """
+    cdef pyAbstractAgent agent
+    cdef vector[AbstractAgent*] agentptrs
+    cdef bool c_scramble = scramble_world
+    cdef double c_noise = noise_level
+    cdef int c_threads = num_threads
+    cdef vector[GameHistograms] c_histograms
+    cdef vector[GameRecord] c_records
+    num_agents = len(agents)
+    num_nodes = agents[0].num_nodes if num_agents else 0
+    for agent in agents:
+        config._check_agent(agent)
+        # The records of every game are slices of the same arrays.
+        if agent.num_nodes != num_nodes:
+            raise ValueError(
+                'all agents must have the same number of nodes; got {} and '
+                '{}'.format(num_nodes, agent.num_nodes))
+        # Ensure the phenotype reflects the genome before playing the game.
+        agent._update_phenotype()
+        agentptrs.push_back(agent.thisptr)
+    num_trials = config.thisptr.numTrials
+    num_timesteps = num_trials * config.thisptr.worldHeight
+    arrays = _record_arrays(record, num_agents, num_trials, num_timesteps,
+                            num_nodes)
+    cdef cnp.ndarray[int, ndim=2] totals = np.empty(
+        (num_agents, 2), dtype=np.int32)
+    if histograms:
+        c_histograms.resize(num_agents)
+    for i in range(num_agents):
+        c_records.push_back(_game_record(
+            arrays, i, &c_histograms[i] if histograms else NULL))
+    if num_agents:
+        with nogil:
+            executeGames(c_records, agentptrs, <int*> totals.data,
+                         config.thisptr[0], c_scramble, c_noise, c_threads)
+    (animat_states, world_states, animat_positions, trial_results,
+     packed_states, activity) = arrays
+    return (animat_states, world_states, animat_positions, trial_results,
+            totals, packed_states, activity,
+            [_histogram_arrays(c_histograms[i], agents[i].num_sensors,
+                               agents[i].num_motors)
+             for i in range(num_agents)] if histograms else None)
+
+
+def mutate_agents(agents, mutProb, dupProb, delProb, minGenomeLength,
+                  maxGenomeLength, minDupDelLength, maxDupDelLength,
+                  num_threads=0):
+    """Mutate each of the given agents in place (see ``mutate``).
+
+    The agents are mutated on a pool of C++ threads without holding the GIL.
+    Each agent uses its own random number stream, so the results don't depend
+    on the number of threads.
+
+    Keyword Args:
+        num_threads (int): The number of threads to use. If less than 1, one
+            thread per hardware thread is used.
+
+    Returns:
+        np.ndarray: Whether the phenotype of each agent may have changed.
+    """
+    cdef pyAbstractAgent agent
+    cdef vector[AbstractAgent*] agentptrs
+    for agent in agents:
+        agentptrs.push_back(agent.thisptr)
+    cdef cnp.ndarray[uint8_t, ndim=1] changed = np.zeros(
+        len(agents), dtype=np.uint8)
+    cdef double c_mut = mutProb, c_dup = dupProb, c_del = delProb
+    cdef int c_min_length = minGenomeLength, c_max_length = maxGenomeLength
+    cdef int c_min_width = minDupDelLength, c_max_width = maxDupDelLength
+    cdef int c_threads = num_threads
+    if len(agents):
+        with nogil:
+            mutateAgents(agentptrs, <uchar*> changed.data, c_mut, c_dup,
+                         c_del, c_min_length, c_max_length, c_min_width,
+                         c_max_width, c_threads)
+    for agent in agents:
+        # The genome snapshot needs to be updated; the phenotype was
+        # regenerated along with the genome.
+        agent._genome = None
+        agent._dirty_phenotype = False
+    return changed.view(np.bool_)
+
+
+cdef _array(const void *data, Py_ssize_t n, dtype):
+    """Return a copy of ``n`` elements of the given type at ``data`` as a
+    NumPy array."""
+    array = np.empty(n, dtype=dtype)
+    if n:
+        memcpy(cnp.PyArray_DATA(array), data, n * array.itemsize)
+    return array
+
+
+cdef class pyPopulation:
+    """A population evolved a whole generation at a time by the C++ engine.
+
+    Selection, cloning, mutation, and evaluation happen in a single call per
+    generation, without holding the GIL; only the fitness of each agent and
+    the index of its parent in the previous generation are exposed. The
+    population owns copies of the given agents (see ``agent``).
+
+    Args:
+        agents (list(pyAbstractAgent)): The initial population. All agents
+            must be of the same type.
+        config (pyGameConfig): The game the agents are evaluated on.
+        fitness (Iterable(float)): The fitness of each agent.
+        raw_fitness (Iterable(float)): The raw fitness of each agent.
+        correct (Iterable(int)): The number of correct trials of each agent.
+        incorrect (Iterable(int)): The number of incorrect trials of each
+            agent.
+        seed (int): The experiment seed, from which the selection stream and
+            every agent's streams are derived.
+        mutation (tuple): The arguments of ``mutate``.
+        fitness_function (str): One of ``NATIVE_FITNESS_FUNCTIONS``.
+        fitness_range (tuple(float)): The range of raw fitness that is
+            normalized to [0, 1].
+        fitness_transform (dict): The ``base``, ``scale``, and ``add``
+            constants of the exponential fitness transform.
+
+    Keyword Args:
+        function_params (tuple): The baseline penalty, activity penalty, and
+            block values of the ``food`` fitness function.
+        noise_level (float): The noise level of the games.
+        skip_unchanged (bool): Whether an offspring whose phenotype didn't
+            change inherits its parent's fitness instead of playing a game.
+            Only valid if the games are deterministic.
+    """
+    cdef Population *thisptr
+    cdef EvolutionParams params
+    # Keep the game config alive while the engine refers to it.
+    cdef pyGameConfig config
+    cdef object agent_type
+
+    def __cinit__(self, agents, pyGameConfig config, fitness, raw_fitness,
+                  correct, incorrect, seed, mutation, fitness_function,
+                  fitness_range, fitness_transform, function_params=None,
+                  noise_level=0.0, skip_unchanged=False):
+        if not agents:
+            raise ValueError('a population needs at least one agent')
+        if fitness_function not in NATIVE_FITNESS_FUNCTIONS:
+            raise ValueError(
+                'the `{}` fitness function cannot be evaluated by the '
+                'engine'.format(fitness_function))
+        self.config = config
+        self.agent_type = type(agents[0])
+        cdef EvolutionParams *p = &self.params
+        p.seed = seed
+        (p.mutProb, p.dupProb, p.delProb, p.minGenomeLength,
+         p.maxGenomeLength, p.minDupDelLength, p.maxDupDelLength) = mutation
+        p.fitnessFunction = NATIVE_FITNESS_FUNCTIONS[fitness_function]
+        p.rangeMin, p.rangeMax = fitness_range
+        p.base = fitness_transform['base']
+        p.scale = fitness_transform['scale']
+        p.add = fitness_transform['add']
+        if fitness_function == 'food':
+            baseline_penalty, activity_penalty, block_values = function_params
+            p.baselinePenalty = baseline_penalty
+            p.activityPenalty = activity_penalty
+            # Block values are whole amounts of energy.
+            p.blockValues = [int(value) for value in block_values]
+        p.noiseLevel = noise_level
+        p.skipUnchanged = skip_unchanged
+        cdef pyAbstractAgent agent
+        for agent in agents:
+            if type(agent) is not self.agent_type:
+                raise ValueError('all agents must be of the same type')
+            config._check_agent(agent)
+        cdef vector[double] c_fitness = fitness
+        cdef vector[double] c_raw_fitness = raw_fitness
+        cdef vector[int] c_correct = correct
+        cdef vector[int] c_incorrect = incorrect
+        cdef vector[AbstractAgent*] agentptrs
+        for agent in agents:
+            # Clones are made from the phenotype, so it must be up to date.
+            agent._update_phenotype()
+            agentptrs.push_back(agent.thisptr.clone())
+        try:
+            self.thisptr = new Population(agentptrs, c_fitness, c_raw_fitness,
+                                          c_correct, c_incorrect)
+        except:
+            for i in range(agentptrs.size()):
+                del agentptrs[i]
+            raise
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    def __len__(self):
+        return self.thisptr.size()
+
+    def select(self, generation):
+        """Return the indices of the parents of the given generation, as
+        ``evolve`` would select them."""
+        return np.array(self.thisptr.select(self.params.seed, generation),
+                        dtype=np.int32)
+
+    def evolve(self, generation, parents=None, num_threads=0):
+        """Replace the population with the next generation.
+
+        Each agent is replaced with a mutated clone of one selected with
+        fitness-proportionate selection, which is then evaluated. The result
+        only depends on the population, the seed, and the generation.
+
+        Keyword Args:
+            parents (Iterable(int)): The indices of the parents of the next
+                generation. By default, they're selected.
+            num_threads (int): The number of threads to use. If less than 1,
+                one thread per hardware thread is used.
+        """
+        cdef unsigned long long c_generation = generation
+        cdef int c_threads = num_threads
+        cdef vector[int] c_parents
+        if parents is None:
+            with nogil:
+                self.thisptr.evolve(c_generation, self.params,
+                                    self.config.thisptr[0], c_threads)
+        else:
+            c_parents = parents
+            with nogil:
+                self.thisptr.reproduce(c_parents, c_generation, self.params,
+                                       self.config.thisptr[0], c_threads)
+
+    def agent(self, i):
+        """Return a copy of agent ``i``."""
+        if not 0 <= i < self.thisptr.size():
+            raise IndexError('agent index out of range')
+        cdef pyAbstractAgent copy = self.agent_type.__new__(
+            self.agent_type, _COPY, None, None, None, None)
+        copy._adopt(self.thisptr.agents[i].clone())
+        copy._dirty_phenotype = False
+        return copy
+
+    property fitness:
+        def __get__(self):
+            return _array(self.thisptr.fitness.data(), self.thisptr.size(),
+                          np.float64)
+
+    property raw_fitness:
+        def __get__(self):
+            return _array(self.thisptr.rawFitness.data(), self.thisptr.size(),
+                          np.float64)
+
+    property correct:
+        def __get__(self):
+            return _array(self.thisptr.correct.data(), self.thisptr.size(),
+                          np.int32)
+
+    property incorrect:
+        def __get__(self):
+            return _array(self.thisptr.incorrect.data(), self.thisptr.size(),
+                          np.int32)
+
+    property parents:
+        """The index of each agent's parent in the previous generation (-1
+        for the initial population)."""
+        def __get__(self):
+            return _array(self.thisptr.parents.data(), self.thisptr.size(),
+                          np.int32)
+
+    property evaluated:
+        """Whether each agent played a game in the last generation, rather
+        than inheriting its parent's fitness."""
+        def __get__(self):
+            return _array(self.thisptr.evaluated.data(), self.thisptr.size(),
+                          np.uint8).view(np.bool_)
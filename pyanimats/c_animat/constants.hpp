@@ -7,6 +7,26 @@
 
 // Agent parameters
 #define MIN_BODY_LENGTH 3
+// Agent states are packed into a single 64-bit word
+#define MAX_NODES 64
+
+// Deterministic agents with at most this many nodes are advanced with a
+// compiled next-state lookup table (2^14 two-byte entries fill 32 KiB, the
+// size of a typical L1 data cache); larger agents play their games 64 trials
+// at a time (see executeBitSlicedTrials)
+#define MAX_TABLE_NODES 14
+
+// Genomes are stored in chunks of about this many nucleotides, which copies
+// share until they're mutated (see Genome)
+#define GENOME_CHUNK_SIZE 64
+
+// The TPM has a row for each of the 2^n states, so it's only computed for
+// agents with at most this many nodes
+#define MAX_TPM_NODES 30
+
+// Deterministic games look for trials that reached the same configuration
+// every this many timesteps (a power of 2)
+#define MEMO_INTERVAL 4
 
 // Enumeration constants
 #define CORRECT 0
@@ -15,3 +35,14 @@
 #define WRONG_CATCH 1
 #define CORRECT_AVOID 2
 #define CORRECT_CATCH 3
+
+// Recording levels of a game (see GameRecord); each level records everything
+// the previous ones do
+// The trial results and the numbers of correct and incorrect trials
+#define RECORD_OUTCOMES 0
+// The number of timesteps at which each node was on
+#define RECORD_ACTIVITY 1
+// The world states, agent positions, and the agent states packed into words
+#define RECORD_PACKED 2
+// The agent states, one byte per node
+#define RECORD_FULL 3
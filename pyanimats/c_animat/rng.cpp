@@ -1,32 +1,114 @@
-// rng.hpp
+// rng.cpp
+
+#include <climits>
+#include <cmath>
+#include <sstream>
 
 #include "./rng.hpp"
 
+// Philox4x32 constants (Salmon et al., 2011)
+#define PHILOX_M0 0xD2511F53U
+#define PHILOX_M1 0xCD9E8D57U
+#define PHILOX_W0 0x9E3779B9U
+#define PHILOX_W1 0xBB67AE85U
+#define PHILOX_ROUNDS 10
+
+
+RandomStream::RandomStream(uint64_t key, uint64_t counter)
+    : key(key), counter(counter) {}
+
+RandomStream::result_type RandomStream::operator()() {
+    // Each block of the cipher yields 128 bits: the first half for an even
+    // counter, the second half for the following odd counter
+    uint64_t block = counter >> 1;
+    uint32_t x0 = (uint32_t)block;
+    uint32_t x1 = (uint32_t)(block >> 32);
+    uint32_t x2 = 0, x3 = 0;
+    uint32_t k0 = (uint32_t)key;
+    uint32_t k1 = (uint32_t)(key >> 32);
+    for (int round = 0; round < PHILOX_ROUNDS; round++) {
+        uint64_t p0 = (uint64_t)PHILOX_M0 * x0;
+        uint64_t p1 = (uint64_t)PHILOX_M1 * x2;
+        uint32_t y0 = (uint32_t)(p1 >> 32) ^ x1 ^ k0;
+        uint32_t y2 = (uint32_t)(p0 >> 32) ^ x3 ^ k1;
+        x1 = (uint32_t)p1;
+        x3 = (uint32_t)p0;
+        x0 = y0;
+        x2 = y2;
+        k0 += PHILOX_W0;
+        k1 += PHILOX_W1;
+    }
+    uint64_t result = (counter & 1) ? (((uint64_t)x3 << 32) | x2)
+                                    : (((uint64_t)x1 << 32) | x0);
+    counter++;
+    return result;
+}
+
+double RandomStream::randDouble() {
+    return ((*this)() >> 11) * (1.0 / 9007199254740992.0);
+}
+
+int RandomStream::randInt() {
+    return (int)((((*this)() >> 32) * ((uint64_t)RAND_MAX + 1)) >> 32);
+}
+
+int RandomStream::randCharInt() {
+    return (int)((*this)() >> 56);
+}
+
+int RandomStream::randBelow(int n) {
+    return (int)((((*this)() >> 32) * (uint64_t)n) >> 32);
+}
+
+int RandomStream::randGeometric(double p) {
+    if (p >= 1) return 0;
+    if (p <= 0) return INT_MAX;
+    // Invert the distribution function (1 - U is in (0, 1])
+    double n = std::floor(std::log(1.0 - randDouble()) / std::log1p(-p));
+    return n < INT_MAX ? (int)n : INT_MAX;
+}
+
+// SplitMix64 finalizer
+static uint64_t mix(uint64_t z) {
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
+}
+
+uint64_t streamKey(uint64_t seed, uint64_t generation, uint64_t index,
+        uint64_t replicate) {
+    uint64_t h = mix(seed + 0x9E3779B97F4A7C15ULL);
+    h = mix(h ^ (generation + 0x9E3779B97F4A7C15ULL));
+    h = mix(h ^ (index + 0x9E3779B97F4A7C15ULL));
+    return mix(h ^ (replicate + 0x9E3779B97F4A7C15ULL));
+}
+
+static RandomStream globalStream(streamKey(1729, 0, 0, AGENT_STREAM));
 
 void seedRNG(int s) {
-    mersenne.seed(s);
+    globalStream = RandomStream(streamKey(s, 0, 0, AGENT_STREAM));
 }
 
 int randInt() {
-    return uniform_int_dist(mersenne);
+    return globalStream.randInt();
 }
 
 double randDouble() {
-    return uniform_double_dist(mersenne);
+    return globalStream.randDouble();
 }
 
 int randCharInt() {
-    return uniform_char_int_dist(mersenne);
+    return globalStream.randCharInt();
 }
 
 std::string getState() {
     std::stringstream stream;
-    stream << mersenne;
+    stream << globalStream.key << " " << globalStream.counter;
     return stream.str();
 }
 
 void setState(std::string state) {
     std::stringstream stream;
     stream << state;
-    stream >> mersenne;
+    stream >> globalStream.key >> globalStream.counter;
 }
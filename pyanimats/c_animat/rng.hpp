@@ -2,19 +2,72 @@
 
 #pragma once
 
-#include <iostream>
-#include <iterator>
-#include <random>
-#include <sstream>
+#include <stdint.h>
+
+#include <cstdlib>
 #include <string>
-#include <algorithm>
+#include <utility>
+
+
+// Replicate numbers reserved for streams that aren't used to play games
+#define AGENT_STREAM 0xFFFFFFFFFFFFFFFFULL
+#define TRANSITIONS_STREAM 0xFFFFFFFFFFFFFFFEULL
+// The stream a Population selects the parents of a generation from (with the
+// index set to 0)
+#define SELECTION_STREAM 0xFFFFFFFFFFFFFFFDULL
+
+// A counter-based random number stream (Philox4x32-10).
+//
+// The n-th number of a stream is a pure function of the stream's key and of
+// n, so streams can be created, copied, and resumed anywhere without any
+// shared state. Different keys give statistically independent streams.
+class RandomStream {
+ public:
+    typedef uint64_t result_type;
+
+    explicit RandomStream(uint64_t key = 0, uint64_t counter = 0);
+
+    uint64_t key;
+    // Number of 64-bit values drawn so far
+    uint64_t counter;
+
+    static constexpr result_type min() { return 0; }
+    static constexpr result_type max() { return UINT64_MAX; }
+    // Return the next 64 random bits
+    result_type operator()();
+
+    // Uniform on [0, 1)
+    double randDouble();
+    // Uniform on [0, RAND_MAX]
+    int randInt();
+    // Uniform on [0, 255]
+    int randCharInt();
+    // Uniform on [0, n)
+    int randBelow(int n);
+    // The number of failures before the first success in a sequence of
+    // independent trials that succeed with probability `p` (capped at
+    // INT_MAX)
+    int randGeometric(double p);
 
+    // Shuffle the range [first, last) uniformly at random
+    template <class RandomIt>
+    void shuffle(RandomIt first, RandomIt last) {
+        for (int i = (int)(last - first) - 1; i > 0; i--) {
+            std::swap(first[i], first[randBelow(i + 1)]);
+        }
+    }
+};
 
-static std::mt19937 mersenne(1729);
-static std::uniform_int_distribution<int> uniform_int_dist(0, RAND_MAX);
-static std::uniform_real_distribution<double> uniform_double_dist(0.0, 1.0);
-static std::uniform_int_distribution<int> uniform_char_int_dist(0, 255);
+// Return the key of the stream used by the animat with the given index in the
+// given generation of the experiment with the given seed. Replicates number
+// the games the animat plays; `AGENT_STREAM` and `TRANSITIONS_STREAM` are the
+// animat's own stream (used for mutation) and the stream used to sample its
+// TPM.
+uint64_t streamKey(uint64_t seed, uint64_t generation, uint64_t index,
+        uint64_t replicate);
 
+// A stream that is not tied to any animat, for use by the module-level
+// functions exposed to Python
 double randDouble();
 int randInt();
 int randCharInt();
@@ -16,11 +16,12 @@ import numpy as np
 from deap import base, tools
 from munch import Munch
 
-from . import animat, c_animat, fitness_functions, utils, validate
+from . import animat, fitness_functions, utils, validate
 from .fitness_transforms import ExponentialMultiFitness
 from .animat import Animat
 from .experiment import Experiment
 from .phylogeny import Phylogeny
+from .population import Population
 from .utils import rounder
 
 
@@ -37,12 +38,10 @@ class Evolution:
         self.elapsed = 0
         # Get our own RNG.
         self.random = random.Random()
-        # Seed the random number generators.
+        # Seed the random number generator.
         self.random.seed(self.experiment.rng_seed)
-        c_animat.seed(self.experiment.rng_seed)
-        # Get their states to pass to the evolution.
+        # Get its state to pass to the evolution.
         self.python_rng_state = self.random.getstate()
-        self.c_rng_state = c_animat.get_rng_state()
         # Initialize the DEAP toolbox.
         self.toolbox = base.Toolbox()
         # Register the various genetic algorithm components to the toolbox.
@@ -56,12 +55,37 @@ class Evolution:
         self.logbook.chapters['fitness'].header = ['raw', 'exp']
         # Create initial population.
         self.population = self.toolbox.population(n=self.experiment.popsize)
+        # Give each animat its own C++ random number streams. These are
+        # derived from the seed, generation, and index alone, so they need no
+        # state to be saved in checkpoints.
+        for i, a in enumerate(self.population):
+            a.seed_rng(self.generation, i)
         # If we're using an expensive fitness function, then check if the TPM
         # has changed before re-evaluating fitness (with cheap functions, like
         # `nat`, it's actually more expensive to generate the TPM and check it)
         self.CHECK_FOR_TPM_CHANGE = any(
             f not in fitness_functions.CHEAP
             for f in self.experiment.fitness_function)
+        # Don't re-evaluate an offspring whose mutations left its phenotype
+        # unchanged if its fitness only depends on the phenotype (games of
+        # deterministic animats are only random if there's noise, and
+        # expensive fitness functions are already only re-evaluated when the
+        # TPM changes)
+        self.SKIP_UNCHANGED_PHENOTYPES = self.experiment.deterministic and (
+            self.CHECK_FOR_TPM_CHANGE or self.experiment.noise_level == 0)
+        # Play the games of the whole population at once in the C++ engine if
+        # the fitness function plays a game at all.
+        self.PREFETCH_GAMES = any(
+            f not in fitness_functions.GAMELESS
+            for f in self.experiment.fitness_function)
+        # Count visited states while prefetching if the fitness function uses
+        # them.
+        self.PREFETCH_HISTOGRAMS = any(
+            f in fitness_functions.HISTOGRAMS
+            for f in self.experiment.fitness_function)
+        # Only record as much of the games as the fitness function needs.
+        self.PREFETCH_RECORD = fitness_functions.record_level(
+            self.experiment.fitness_function)
         # Transform the fitness function.
         self.fitness_function = ExponentialMultiFitness(
             self.experiment.fitness_function,
@@ -82,8 +106,15 @@ class Evolution:
 
     def evaluate(self, population):
         animats = [a for a in population if a._dirty_fitness]
+        if self.PREFETCH_GAMES:
+            animat.play_games(animats, num_threads=self.simulation.num_threads,
+                              prefetch=True,
+                              histograms=self.PREFETCH_HISTOGRAMS,
+                              record=self.PREFETCH_RECORD)
         for a in animats:
             a.fitness, a.raw_fitness = self.fitness_function(a)
+            # Don't hold on to the game if the fitness function didn't use it.
+            a._prefetched_game = None
 
     def update_simulation(self, opts):
         self.simulation.update(opts)
@@ -96,6 +127,8 @@ class Evolution:
         # Remove unpicklable attributes.
         del state['mstats']
         del state['fitness_function']
+        # Resume from the current state of the RNG rather than the initial one.
+        state['python_rng_state'] = self.random.getstate()
         # Save the population as a Phylogeny to recover lineages later.
         state['population'] = Phylogeny(state['population'],
                                         step=self.simulation.sample_interval)
@@ -145,6 +178,21 @@ class Evolution:
             record = self.mstats.compile(population)
             self.logbook.record(gen=gen, **record)
 
+    def record_native(self, population, gen):
+        if gen % self.simulation.logbook_interval == 0:
+            fitness = population.fitness
+            raw_fitness = population.raw_fitness
+            correct = population.correct
+            # Break ties like the keys of `mstats` do.
+            fittest = np.lexsort((raw_fitness, fitness))[-1]
+            by_game = np.lexsort((correct, fitness))
+            self.logbook.record(
+                gen=gen,
+                fitness={'raw': rounder((raw_fitness[fittest],)),
+                         'exp': rounder(fitness[fittest])},
+                game={'fittest': correct[by_game[-1]].item(),
+                      'weakest': correct[by_game[0]].item()})
+
     def new_gen(self, population, gen):
         # Update generation number.
         self.generation = gen
@@ -161,12 +209,18 @@ class Evolution:
             a.parent = population[i]
             # Update generation number.
             a.gen = gen
-            # Mutate.
-            a.mutate()
+            # Reseed the C++ random number streams for this generation.
+            a.seed_rng(gen, i)
+        # Mutate.
+        phenotype_changed = animat.mutate_population(
+            offspring, num_threads=self.simulation.num_threads)
+        for i, a in enumerate(offspring):
             # Check whether fitness needs updating (if desired and CM is
             # nontrivial).
-            if self.CHECK_FOR_TPM_CHANGE and not a.cm.sum() == 0:
-                a._dirty_fitness = not np.array_equal(a.tpm, a.parent.tpm)
+            if self.SKIP_UNCHANGED_PHENOTYPES and not phenotype_changed[i]:
+                a._dirty_fitness = False
+            elif self.CHECK_FOR_TPM_CHANGE and not a.cm.sum() == 0:
+                a._dirty_fitness = a.phenotype_hash != a.parent.phenotype_hash
             else:
                 a._dirty_fitness = True
         # Evaluation.
@@ -175,6 +229,17 @@ class Evolution:
         self.record(offspring, gen)
         return offspring
 
+    def new_gen_native(self, population, gen):
+        # Update generation number.
+        self.generation = gen
+        # Selection, cloning, variation, and evaluation, all in the engine.
+        population.evolve(gen)
+        # Keep the animats of sampled generations for the lineages.
+        if gen % self.simulation.sample_interval == 0:
+            population.sample()
+        # Recording.
+        self.record_native(population, gen)
+
     def run(self, checkpoint_file, ngen=None):
         """Evolve."""
         if ngen is None:
@@ -185,9 +250,8 @@ class Evolution:
         if not generations:
             return 0.0
 
-        # Set the random number generator states.
+        # Set the random number generator state.
         self.random.setstate(self.python_rng_state)
-        c_animat.set_rng_state(self.c_rng_state)
 
         if self.generation == 0:
             # Inject start codons.
@@ -210,12 +274,24 @@ class Evolution:
             # Print initial status
             self.print_status(self.logbook.__str__(startindex=-1), 0)
 
+        # Evolve in the C++ engine if desired, only making animats when they're
+        # sampled or checkpointed.
+        native = None
+        if self.simulation.native:
+            native = Population(
+                self.experiment, self.population, self.fitness_function,
+                skip_unchanged=self.SKIP_UNCHANGED_PHENOTYPES,
+                num_threads=self.simulation.num_threads)
+
         last_status, last_checkpoint = [timer()] * 2
 
         for gen in generations:
             self.generation = gen
             # Evolution.
-            self.population = self.new_gen(self.population, gen)
+            if native is None:
+                self.population = self.new_gen(self.population, gen)
+            else:
+                self.new_gen_native(native, gen)
             # Reporting.
             if gen % self.simulation.status_interval == 0:
                 # Get time since last report was printed.
@@ -231,12 +307,18 @@ class Evolution:
                     self.experiment.rng_seed, checkpoint_file),
                     end='', flush=True)
                 self.elapsed += timer() - last_checkpoint
+                if native is not None:
+                    self.population = native.animats()
                 with gzip.open(checkpoint_file, 'wb') as f:
                     pickle.dump(self, f)
                 last_checkpoint = timer()
                 print('done.')
 
         self.elapsed += timer() - last_checkpoint
+        if native is not None:
+            self.population = native.animats()
+        # Continue from here if run again.
+        self.python_rng_state = self.random.getstate()
 
         # Save final checkpoint.
         print('[Seed {}]\tSaving final checkpoint to `{}`... '.format(
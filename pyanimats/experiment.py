@@ -11,6 +11,7 @@ import pyphi
 import yaml
 from munch import Munch
 
+from . import c_animat
 from . import constants
 from . import validate
 
@@ -24,7 +25,8 @@ class Experiment(Munch):
     provided upon initialization; these can also be accessed directly as
     attributes on this object, though they're stored under the ``_derived`` key
     and are not printed. See ``experiment._derived.keys()`` for a list of
-    these.
+    these. Those that grow exponentially with the number of nodes (see
+    ``_LAZY_PARAMS``) are only derived when they're first used.
 
     Keyword Args:
         dictionary (dict): A dictionary containing experiment parameters.
@@ -66,7 +68,10 @@ class Experiment(Munch):
                 try:
                     return self._derived[k]
                 except KeyError:
-                    raise AttributeError(k)
+                    if k not in _LAZY_PARAMS:
+                        raise AttributeError(k)
+                    self._derived[k] = _LAZY_PARAMS[k](self)
+                    return self._derived[k]
 
     def __repr__(self):
         """Return a readable representation of the experiment.
@@ -89,6 +94,27 @@ def load(filepath):
         return Experiment(yaml.load(f)['experiment'])
 
 
+# Derived parameters that grow exponentially with the number of nodes, and are
+# too large to derive up front for large animats, with the functions that
+# derive them from the experiment.
+_LAZY_PARAMS = {
+    # Power sets of the nodes
+    'hidden_powerset': lambda e: tuple(pyphi.utils.powerset(e.hidden_indices)),
+    'sensors_and_hidden_powerset': lambda e: tuple(
+        pyphi.utils.powerset(e.sensor_indices + e.hidden_indices)),
+    'hidden_and_motor_powerset': lambda e: tuple(
+        pyphi.utils.powerset(e.hidden_indices + e.motor_indices)),
+    # Every animat state, and every sensor and motor state
+    'possible_states': lambda e: [
+        pyphi.convert.le_index2state(i, e.num_nodes)
+        for i in range(e.num_possible_states)],
+    'sensor_motor_states': lambda e: [
+        ((i, j), _bitlist(i, e.num_sensors) + _bitlist(j, e.num_motors))
+        for i in range(e.num_sensor_states)
+        for j in range(e.num_motor_states)],
+}
+
+
 def _derive_params(d):
     """Derive various secondary parameters from the given dictionary."""
     num_nodes = d['num_sensors'] + d['num_hidden'] + d['num_motors']
@@ -117,11 +143,6 @@ def _derive_params(d):
     num_sensor_states = 2**d['num_sensors']
     num_hidden_states = 2**d['num_hidden']
     num_motor_states = 2**d['num_motors']
-    sensor_motor_states = [
-        ((i, j), (_bitlist(i, d['num_sensors']) +
-                  _bitlist(j, d['num_motors'])))
-        for i in range(num_sensor_states) for j in range(num_motor_states)
-    ]
     # Get sensor locations (mapping them to the sensor index).
     if d['num_sensors'] < constants.MIN_BODY_LENGTH:
         gap = constants.MIN_BODY_LENGTH - d['num_sensors']
@@ -131,6 +152,11 @@ def _derive_params(d):
                                         constants.MIN_BODY_LENGTH)))
     else:
         sensor_locations = list(range(d['num_sensors']))
+    hit_multipliers = [condition[0] for condition in d['task']]
+    # Convert task-strings into integers. Note that in the C++ implementation,
+    # the world is mirrored; hence the reversal of the string.
+    block_patterns = [int(condition[1].replace('_', '0')[::-1], 2)
+                      for condition in d['task']]
     # Fill and return the dictionary.
     return {
         'num_nodes': num_nodes,
@@ -140,33 +166,27 @@ def _derive_params(d):
         #   (number of tasks * two directions *
         #    number of initial positions for the animat)
         'num_trials': len(d['task']) * 2 * d['world_width'],
-        'hit_multipliers': [condition[0] for condition in d['task']],
-        # Convert task-strings into integers. Note that in the C++
-        # implementation, the world is mirrored; hence the reversal of the
-        # string.
-        'block_patterns': [int(condition[1].replace('_', '0')[::-1], 2)
-                           for condition in d['task']],
+        'hit_multipliers': hit_multipliers,
+        'block_patterns': block_patterns,
         'sensor_indices': sensor_indices,
         'hidden_indices': hidden_indices,
         'motor_indices': motor_indices,
         'sensor_hidden_indices': sensor_indices + hidden_indices,
         'hidden_motor_indices': hidden_indices + motor_indices,
         'sensor_motor_indices': sensor_indices + motor_indices,
-        # Get their power sets.
-        'hidden_powerset': tuple(pyphi.utils.powerset(hidden_indices)),
-        'sensors_and_hidden_powerset': tuple(
-            pyphi.utils.powerset(sensor_indices + hidden_indices)),
-        'hidden_and_motor_powerset': tuple(
-            pyphi.utils.powerset(hidden_indices + motor_indices)),
         # Get information about possible animat states.
         'num_sensor_states': num_sensor_states,
         'num_hidden_states': num_hidden_states,
         'num_motor_states': num_motor_states,
         'num_possible_states': 2**num_nodes,
-        'possible_states': [pyphi.convert.le_index2state(i, num_nodes)
-                            for i in range(2**num_nodes)],
-        'sensor_motor_states': sensor_motor_states,
         'sensor_locations': sensor_locations,
+        # Everything the C++ engine needs to play a game, built once so games
+        # need no setup. The engine's body length is the larger of the minimum
+        # body length and the number of sensors.
+        'game_config': c_animat.pyGameConfig(
+            hit_multipliers, block_patterns, d['world_width'],
+            d['world_height'], list(sensor_locations),
+            max(constants.MIN_BODY_LENGTH, d['num_sensors'])),
     }
 
 
@@ -16,8 +16,9 @@ from sklearn.metrics import mutual_info_score
 import networkx as nx
 
 from . import constants
-from .utils import unique_rows
-from c_animat import CORRECT_CATCH, WRONG_CATCH
+from .utils import unique_packed_states, unique_rows, unpack_states
+from c_animat import (CORRECT_CATCH, RECORD_ACTIVITY, RECORD_FULL,
+                      RECORD_OUTCOMES, WRONG_CATCH)
 
 _WRAPPER_WIDTH = 72
 _base_wrapper = textwrap.TextWrapper(width=_WRAPPER_WIDTH)
@@ -41,6 +42,30 @@ LaTeX_NAMES = {
 }
 MULTIVALUED = ['mat']
 CHEAP = ['nat']
+# Fitness functions that don't play the game.
+GAMELESS = ['zero']
+# Fitness functions that the C++ engine can evaluate itself, so that a
+# population can be evolved without leaving it (see ``population``).
+NATIVE = ['nat', 'no_lscc', 'food']
+# Fitness functions that use the histograms of the states visited in a game.
+HISTOGRAMS = ['mi', 'mi_wvn', 'ex', 'sp', 'bp']
+# The recording level of the games played by fitness functions that don't need
+# the full trace of the game.
+RECORD_LEVELS = {
+    'nat': RECORD_OUTCOMES,
+    'no_lscc': RECORD_OUTCOMES,
+    'food': RECORD_ACTIVITY,
+    'ex': RECORD_OUTCOMES,
+    'sp': RECORD_OUTCOMES,
+    'bp': RECORD_OUTCOMES,
+}
+
+
+def record_level(names):
+    """Return the recording level needed by all the given fitness
+    functions."""
+    return max((RECORD_LEVELS.get(name, RECORD_FULL) for name in names
+                if name not in GAMELESS), default=RECORD_OUTCOMES)
 
 
 def _register(data_function=None):
@@ -110,10 +135,13 @@ def avg_over_visited_states(upto_attr=False, transform=False, n=None,
         @wraps(func)
         def wrapper(ind, **kwargs):
             upto = getattr(ind, upto_attr) if upto_attr else False
-            game = ind.play_game(scrambled=scrambled)
+            game = ind.play_game(scrambled=scrambled, histograms=True,
+                                 record=RECORD_OUTCOMES)
             sort = n is not None
-            unique_states = unique_rows(game.animat_states, upto=upto,
-                                        sort=sort)[:n]
+            states, _ = unique_packed_states(
+                game.visited_states, game.visit_counts, upto=upto, sort=sort,
+                last_visits=game.last_visits)
+            unique_states = unpack_states(states[:n], ind.num_nodes)
             values = [func(ind, state, **kwargs) for state in unique_states]
             if transform:
                 values = list(map(transform, values))
@@ -231,7 +259,7 @@ def nat(ind, scrambled=False):
     parameter, there is one trial per direction (left or right) of block
     descent, per initial animat position (given by
     ``experiment.world_width``)."""
-    return ind.play_game(scrambled=scrambled).correct
+    return ind.play_game(scrambled=scrambled, record=RECORD_OUTCOMES).correct
 _register()(nat)
 
 
@@ -257,16 +285,20 @@ def mi(ind, scrambled=False):
     """
     if ind.num_motors == 0:
         return 0.0
-    states = ind.play_game(scrambled=scrambled).animat_states
+    game = ind.play_game(scrambled=scrambled, histograms=True)
     # The contingency matrix has a row for every sensor state and a column for
-    # every motor state.
-    contingency = np.zeros([ind.num_sensor_states, ind.num_motor_states])
-    # Get only the sensor and motor states.
-    sensor_motor = np.concatenate([states[:, :, :ind.num_sensors],
-                                   states[:, :, -ind.num_motors:]], axis=2)
-    # Count!
-    for idx, state in ind.sensor_motor_states:
-        contingency[idx] = (sensor_motor == state).all(axis=2).sum()
+    # every motor state; the engine counts it unless there are too many.
+    contingency = game.sensor_motor_counts
+    if contingency is None:
+        states = game.animat_states
+        contingency = np.zeros([ind.num_sensor_states, ind.num_motor_states])
+        # Get only the sensor and motor states.
+        sensor_motor = np.concatenate([states[:, :, :ind.num_sensors],
+                                       states[:, :, -ind.num_motors:]],
+                                      axis=2)
+        # Count!
+        for idx, state in ind.sensor_motor_states:
+            contingency[idx] = (sensor_motor == state).all(axis=2).sum()
     # Calculate mutual information in nats.
     mi_nats = mutual_info_score(None, None, contingency=contingency)
     # Convert from nats to bits and return.
@@ -399,8 +431,8 @@ def sd_wvn(ind, upto_attr='hidden_indices', iterations=10):
     world = unscrambled_game.animat_states
     num_trials = world.shape[0]
     state_differentiation = np.zeros(iterations)
-    for iteration in range(iterations):
-        noise = ind.play_game(scrambled=True).animat_states
+    noise_games = ind.play_game_replicates(iterations, scrambled=True)
+    for iteration, noise in enumerate(noise_games.animat_states):
         # Get a permutation of the trials.
         shuffled_trials = list(range(num_trials))
         ind.random.shuffle(shuffled_trials)
@@ -591,8 +623,8 @@ def food(ind, baseline_penalty=None, activity_penalty=None,
     activity_penalty = activity_penalty or ind.function_params[1]
     block_values = block_values or ind.function_params[2]
 
-    game = ind.play_game()
-    animat_states, trial_results = game[0], game[3]
+    game = ind.play_game(record=RECORD_ACTIVITY)
+    trial_results = game.trial_results
 
     num_trials_per_block = int(len(trial_results) / len(block_values))
     block_values = np.concatenate([np.full(num_trials_per_block, val, int)
@@ -605,7 +637,7 @@ def food(ind, baseline_penalty=None, activity_penalty=None,
     food[catches] = 1
     food = np.sum(food * block_values)
     # Cumulative activity penalty
-    total_activity_penalty = activity_penalty * np.sum(animat_states)
+    total_activity_penalty = activity_penalty * np.sum(game.activity)
 
     return sum([food, baseline_penalty, total_activity_penalty])
 _register()(food)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# population.py
+
+"""
+A population evolved entirely by the C++ engine.
+
+With a cheap fitness function (see ``fitness_functions.NATIVE``), most of the
+time of a generation goes to handling animats in Python. Here the engine
+selects, clones, mutates, and evaluates a whole generation in one call, and
+only the fitness of each animat and the index of its parent come back.
+:class:`~pyanimats.animat.Animat` objects are only made when asked for, so
+lineages are kept by linking the animats made at sampled generations.
+"""
+
+import numpy as np
+
+from . import c_animat, fitness_functions
+from .animat import Animat
+
+
+def check_native(experiment):
+    """Raise a ``ValueError`` if the engine can't evolve the experiment."""
+    if (len(experiment.fitness_function) != 1 or
+            experiment.fitness_function[0] not in fitness_functions.NATIVE):
+        raise ValueError(
+            'only a single one of the fitness functions `{}` can be evolved '
+            'natively; got `{}`.'.format(
+                '`, `'.join(fitness_functions.NATIVE),
+                ','.join(experiment.fitness_function)))
+    if experiment.fitness_function[0] == 'food':
+        block_values = experiment.function_params[2]
+        if experiment.num_trials % len(block_values):
+            raise ValueError('the number of trials must be divisible by the '
+                             'number of block values.')
+
+
+class Population:
+
+    """A population of animats evolved by the C++ engine.
+
+    Args:
+        experiment (Experiment): The experiment the animats are part of.
+        animats (list(Animat)): The initial population, which must have been
+            evaluated. The engine evolves copies of them; the animats
+            themselves become the ancestors of later generations.
+        fitness_function (ExponentialMultiFitness): The fitness function the
+            animats were evaluated with.
+
+    Keyword Args:
+        skip_unchanged (bool): Whether an offspring whose phenotype didn't
+            change inherits its parent's fitness instead of being evaluated
+            again.
+        num_threads (int): The number of threads to use. If less than 1, one
+            thread per hardware thread is used.
+    """
+
+    def __init__(self, experiment, animats, fitness_function,
+                 skip_unchanged=False, num_threads=0):
+        check_native(experiment)
+        self.experiment = experiment
+        self.num_threads = num_threads
+        self._engine = c_animat.pyPopulation(
+            [a._c_animat for a in animats], experiment.game_config,
+            [a.fitness for a in animats],
+            [a.raw_fitness[0] for a in animats],
+            [a.correct for a in animats], [a.incorrect for a in animats],
+            experiment.rng_seed,
+            (experiment.mutation_prob, experiment.duplication_prob,
+             experiment.deletion_prob, experiment.min_genome_length,
+             experiment.max_genome_length, experiment.min_dup_del_width,
+             experiment.max_dup_del_width),
+            experiment.fitness_function[0], fitness_function.ranges[0],
+            fitness_function.transform,
+            function_params=experiment.get('function_params'),
+            noise_level=experiment.noise_level,
+            skip_unchanged=skip_unchanged)
+        self.gen = animats[0].gen
+        # The animats that later generations descend from, and the index in
+        # that list of the ancestor of each current animat.
+        self._ancestors = list(animats)
+        self._ancestry = np.arange(len(animats))
+
+    def __len__(self):
+        return len(self._engine)
+
+    @property
+    def fitness(self):
+        """The fitness of each animat."""
+        return self._engine.fitness
+
+    @property
+    def raw_fitness(self):
+        """The raw fitness of each animat."""
+        return self._engine.raw_fitness
+
+    @property
+    def correct(self):
+        """The number of correct trials of each animat."""
+        return self._engine.correct
+
+    @property
+    def parents(self):
+        """The index of each animat's parent in the previous generation."""
+        return self._engine.parents
+
+    def evolve(self, gen):
+        """Replace the population with generation ``gen``.
+
+        The result only depends on the population, the experiment's seed, and
+        ``gen``.
+        """
+        self._engine.evolve(gen, num_threads=self.num_threads)
+        self.gen = gen
+        self._ancestry = self._ancestry[self._engine.parents]
+
+    def animats(self):
+        """Return the current population as a list of animats.
+
+        Each animat's parent is its most recent ancestor that was sampled (see
+        ``sample``) or part of the initial population.
+        """
+        # Don't make the animats of a sampled generation twice.
+        if self._ancestors[0].gen == self.gen:
+            return list(self._ancestors)
+        fitness = self.fitness
+        raw_fitness = self.raw_fitness
+        correct = self.correct
+        incorrect = self._engine.incorrect
+        animats = []
+        for i in range(len(self)):
+            a = Animat._from_c_animat(self.experiment, self._engine.agent(i))
+            a.parent = self._ancestors[self._ancestry[i]]
+            a.gen = self.gen
+            a.fitness = fitness[i].item()
+            a.raw_fitness = (raw_fitness[i].item(),)
+            a._dirty_fitness = False
+            a._correct = correct[i].item()
+            a._incorrect = incorrect[i].item()
+            animats.append(a)
+        return animats
+
+    def sample(self):
+        """Return the current population as a list of animats, and make them
+        the ancestors that later generations link to."""
+        self._ancestors = self.animats()
+        self._ancestry = np.arange(len(self))
+        return self._ancestors
@@ -59,6 +59,63 @@ def ensure_exists(path):
     return path
 
 
+def unpack_states(indices, num_nodes):
+    """Return the states packed into the given indices with the little-endian
+    convention, one per row."""
+    indices = np.asarray(indices, dtype=np.uint64)
+    bits = np.arange(num_nodes, dtype=np.uint64)
+    return ((indices[:, np.newaxis] >> bits) & np.uint64(1)).astype(np.uint8)
+
+
+def unique_packed_states(states, counts, upto=False, sort=False,
+                         last_visits=None):
+    """Return the unique states of a histogram of packed states and their
+    counts.
+
+    Like ``unique_rows`` with ``counts=True``, but takes the distinct visited
+    states of a game and their counts (see ``animat.HISTOGRAM_FIELDS``)
+    instead of the state of every timestep. The states are chosen and ordered
+    as ``unique_rows`` would given the state of every timestep.
+
+    Args:
+        states (np.ndarray): The distinct states, packed with the
+            little-endian convention, in ascending order.
+        counts (np.ndarray): The count of each state.
+
+    Keyword Args:
+        upto (tuple(int)): Consider uniqueness only up to these nodes. Each
+            state returned is the last visited of those it stands for.
+        sort (bool): Return the unique states in descending order by count.
+        last_visits (np.ndarray): The timestep of the last visit to each
+            state. Required with ``upto``.
+    """
+    states = np.asarray(states, dtype=np.uint64)
+    # Counts are sorted as ``unique_rows`` sorts them, so that ties are broken
+    # the same way.
+    counts = np.asarray(counts).astype(np.intp)
+    if upto:
+        if last_visits is None:
+            raise ValueError('the last visits are needed to choose among the '
+                             'states that agree on the given nodes.')
+        # Order groups like the lexicographical sort of ``unique_rows``, whose
+        # primary key is the last node given.
+        keys = np.zeros(len(states), dtype=np.uint64)
+        for i, node in enumerate(upto):
+            keys |= ((states >> np.uint64(node)) & np.uint64(1)) << np.uint64(i)
+        _, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        # The last state of each group, by group then visit
+        order = np.lexsort((np.asarray(last_visits), inverse))
+        last = np.flatnonzero(np.diff(np.append(inverse[order], -1)))
+        states = states[order[last]]
+        counts = np.bincount(inverse, weights=counts,
+                             minlength=len(last)).astype(np.intp)
+    if sort:
+        order = np.argsort(counts)[::-1]
+        states, counts = states[order], counts[order]
+    return states, counts
+
+
 def rowset(array, **kwargs):
     """Return the unique rows of an array as a set of tuples."""
     return set(map(tuple, unique_rows(array, **kwargs)))
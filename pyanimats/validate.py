@@ -33,6 +33,10 @@ REQUIRED_SIMULATION_KEYS = {
 REQUIRED_FITNESS_TRANSFORM_KEYS = {'base', 'scale', 'add'}
 
 GATE_TYPES = ['hmm', 'lt']
+# Animat states are packed into a single 64-bit word
+MAX_NUM_NODES = 64
+# World states are packed into a single 64-bit word
+MAX_WORLD_WIDTH = 64
 
 
 def json_animat(animat, dictionary):
@@ -101,6 +105,12 @@ def simulation(d):
     d['checkpoint_interval'] = (d['checkpoint_interval'] * MINUTES)
     if d['checkpoint_interval'] <= 0:
         d['checkpoint_interval'] = float('inf')
+    # Use every hardware thread to play games unless told otherwise.
+    if d.get('num_threads') is None:
+        d['num_threads'] = 0
+    # Evolve in Python unless told otherwise.
+    if d.get('native') is None:
+        d['native'] = False
     return d
 
 
@@ -139,9 +149,14 @@ def experiment(d):
     if d['num_motors'] not in [0, 2]:
         raise ValueError(
             'invalid experiment: must have either 0 or 2 motor units.')
+    if d['num_sensors'] + d['num_hidden'] + d['num_motors'] > MAX_NUM_NODES:
+        raise ValueError(
+            'invalid experiment: animats can have at most {} nodes in '
+            'total.'.format(MAX_NUM_NODES))
     _assert_ge(d, name, 'body_length', 3)
     # Environment
     _assert_ge(d, name, 'world_width', 1)
+    _assert_le(d, name, 'world_width', MAX_WORLD_WIDTH)
     _assert_ge(d, name, 'world_height', 1)
     if not all(len(pattern[1]) == d['world_width'] for pattern in d['task']):
         raise ValueError(
@@ -155,6 +170,9 @@ def experiment(d):
                          "must contain only '1' and '_'.")
     _assert_ge(d, name, 'noise_level', 0)
     _assert_le(d, name, 'noise_level', 1)
+    # Sample the TPMs of nondeterministic animats unless told otherwise.
+    if d.get('exact_tpm') is None:
+        d['exact_tpm'] = False
     # Mutation
     _assert_ge(d, name, 'mutation_prob', 0)
     _assert_le(d, name, 'mutation_prob', 1)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vectorized.py
+
+"""
+Plays the games of many deterministic animats at once with NumPy.
+
+Every trial of every animat advances together: the animats' states are held
+in a single array, and each timestep is a lookup into the stacked next-state
+tables of the population. The rules are those of the C++ engine (see
+``Game.cpp``), without sensor noise or scrambled worlds, so the results can be
+checked against :func:`pyanimats.animat.play_games`.
+"""
+
+import numpy as np
+
+from .c_animat import (CORRECT_AVOID, CORRECT_CATCH, RECORD_ACTIVITY,
+                       RECORD_FULL, RECORD_PACKED, WRONG_AVOID, WRONG_CATCH)
+
+_ONE = np.uint64(1)
+
+
+def transition_tables(animats):
+    """Return the next-state table of each animat.
+
+    Returns:
+        np.ndarray: A ``(len(animats), 2**num_nodes)`` array of ``uint64``
+        whose row ``i`` maps each state of animat ``i`` to the next, with
+        states packed with the little-endian convention.
+
+    Raises:
+        ValueError: If an animat isn't deterministic.
+    """
+    num_nodes = animats[0].num_nodes if animats else 0
+    tables = np.empty((len(animats), 2**num_nodes), dtype=np.uint64)
+    for i, animat in enumerate(animats):
+        if not animat.deterministic:
+            raise ValueError('only deterministic animats can be played with '
+                             'NumPy.')
+        tables[i] = animat._c_animat.next_states()
+    return tables
+
+
+def _rotate(world_states, shift, world_width, world_mask):
+    """Rotate world states by ``shift`` cells toward higher bits."""
+    if shift == 0:
+        return world_states
+    return (((world_states << np.uint64(shift)) |
+             (world_states >> np.uint64(world_width - shift))) & world_mask)
+
+
+def trial_worlds(config):
+    """Return the successive states of the world in each trial.
+
+    Args:
+        config (pyGameConfig): The game.
+
+    Returns:
+        tuple(np.ndarray): The world states, a ``(num_trials, world_height)``
+        array of ``uint64`` with cell ``i`` in bit ``i``; the initial position
+        of the animat in each trial; and the hit multiplier of each trial.
+    """
+    width, height = config.world_width, config.world_height
+    mask = np.uint64(2**width - 1)
+    worlds, positions, multipliers = [], [], []
+    # Trials go by block pattern, then direction (left, then right), then
+    # initial position, as in the C++ engine.
+    for pattern, multiplier in zip(config.patterns, config.hit_multipliers):
+        for direction in (-1, 1):
+            world = np.empty(height, dtype=np.uint64)
+            state = np.uint64(pattern) & mask
+            for timestep in range(height):
+                world[timestep] = state
+                state = _rotate(state, width - 1 if direction == -1
+                                else 1 % width, width, mask)
+            worlds.append(np.tile(world, (width, 1)))
+            positions.append(np.arange(width))
+            multipliers.append(np.full(width, multiplier))
+    return (np.concatenate(worlds), np.concatenate(positions),
+            np.concatenate(multipliers))
+
+
+def _views(world_states, cells, width):
+    """Return the given cells, relative to the animat's position, of the
+    world in each trial and timestep, for an animat at each position.
+
+    Returns:
+        np.ndarray: A ``(world_height, num_trials, world_width, len(cells))``
+        array of bits.
+    """
+    seen = (np.arange(width)[:, np.newaxis] + cells) % width
+    return ((world_states.T[:, :, np.newaxis, np.newaxis] >>
+             seen.astype(np.uint64)) & _ONE).astype(np.intp)
+
+
+def _activity(packed, num_nodes):
+    """Return the number of timesteps each node is on, summed over trials,
+    given the packed states of each timestep, animat, and trial."""
+    num_animats = packed.shape[1]
+    if 2**num_nodes > packed[:, 0].size:
+        return np.stack([((packed >> node) & 1).sum(axis=(0, 2))
+                         for node in range(num_nodes)],
+                        axis=1).astype(np.int32)
+    # Count the occurrences of each state, then the nodes on in each state.
+    offsets = (np.arange(num_animats) << num_nodes)[:, np.newaxis]
+    counts = np.bincount((packed + offsets).ravel(),
+                         minlength=num_animats << num_nodes)
+    states = np.arange(2**num_nodes)
+    bits = (states[:, np.newaxis] >> np.arange(num_nodes)) & 1
+    return (counts.reshape(num_animats, -1) @ bits).astype(np.int32)
+
+
+def play(tables, config, num_sensors, num_motors, record=RECORD_FULL,
+         worlds=None):
+    """Play a game with each animat given by a next-state table.
+
+    Args:
+        tables (np.ndarray): The stacked next-state tables of the animats
+            (see ``transition_tables``).
+        config (pyGameConfig): The game.
+        num_sensors (int): The number of sensors of the animats.
+        num_motors (int): The number of motors of the animats.
+
+    Keyword Args:
+        record (int): The recording level (see ``Game``).
+        worlds (tuple): The precomputed worlds of the game, as returned by
+            ``trial_worlds``. Computed if not given.
+
+    Returns:
+        tuple: The animat states, world states, animat positions, and trial
+        results of every game as arrays whose first axis is indexed by animat,
+        followed by an array of the correct and incorrect counts of each
+        animat, and the packed animat states and activity of every game, like
+        :func:`pyanimats.c_animat.play_games`. Whatever isn't recorded is
+        ``None``.
+    """
+    if worlds is None:
+        worlds = trial_worlds(config)
+    world_states, init_positions, hit_multipliers = worlds
+    num_animats = tables.shape[0]
+    num_nodes = tables.shape[1].bit_length() - 1
+    num_trials, height = world_states.shape
+    width = config.world_width
+    # What the sensors read, and whether the animat's body overlaps the block
+    # at the end of the trial, for an animat at each position in each trial
+    sensor_views = _views(world_states, np.mod(config.sensor_locations, width),
+                          width) @ (1 << np.arange(num_sensors))
+    hit_views = _views(world_states[:, -1:],
+                       np.mod(np.arange(config.body_length), width),
+                       width)[0].any(axis=2)
+    # The position after each action from each position: move left if only
+    # the right motor is on and right if only the left one is
+    moves = (np.arange(width)[:, np.newaxis] + [0, 1, -1, 0]) % width
+    # States index into the flattened tables, and positions into the views of
+    # a timestep, so every lookup is a single gather.
+    flat_tables = tables.astype(np.intp).ravel()
+    table_offsets = (np.arange(num_animats) << num_nodes)[:, np.newaxis]
+    view_offsets = np.arange(num_trials) * width
+    sensor_mask = 2**num_sensors - 1
+
+    # The records are filled a timestep at a time, so timesteps go first
+    # until the end.
+    shape = (height, num_animats, num_trials)
+    packed = None
+    if record >= RECORD_ACTIVITY:
+        packed = np.empty(shape, dtype=np.intp)
+    world_record = positions_record = None
+    if record >= RECORD_PACKED:
+        world_record = np.broadcast_to(
+            world_states, (num_animats, num_trials, height)).copy()
+        positions_record = np.empty(shape, dtype=np.uint8)
+
+    states = np.zeros((num_animats, num_trials), dtype=np.intp)
+    positions = np.tile(init_positions, (num_animats, 1))
+    for timestep in range(height):
+        if positions_record is not None:
+            positions_record[timestep] = positions
+        # Read the sensors, then update the animats.
+        sensors = np.take(sensor_views[timestep], view_offsets + positions)
+        states = np.take(flat_tables,
+                         table_offsets + ((states & ~sensor_mask) | sensors))
+        # Record the sensors before the update, and the hidden units and
+        # motors after.
+        if packed is not None:
+            packed[timestep] = (states & ~sensor_mask) | sensors
+        if timestep == height - 1:
+            hits = np.take(hit_views, view_offsets + positions)
+            break
+        if num_motors > 0:
+            actions = (states >> (num_nodes - 2)) & 3
+            positions = np.take(moves, positions * 4 + actions)
+
+    catch = hit_multipliers > 0
+    trial_results = np.where(
+        catch, np.where(hits, CORRECT_CATCH, WRONG_AVOID),
+        np.where(hits, WRONG_CATCH, CORRECT_AVOID)).astype(np.uint8)
+    correct = ((trial_results == CORRECT_CATCH) |
+               (trial_results == CORRECT_AVOID)).sum(axis=1)
+    totals = np.stack([correct, num_trials - correct],
+                      axis=1).astype(np.int32)
+
+    flat = (num_animats, num_trials * height)
+    animat_states = activity = None
+    if record >= RECORD_ACTIVITY:
+        activity = _activity(packed, num_nodes)
+    if record >= RECORD_PACKED:
+        packed = packed.transpose(1, 2, 0).astype(np.uint64, order='C')
+        packed = packed.reshape(flat)
+        world_record = world_record.reshape(flat)
+        positions_record = np.ascontiguousarray(
+            positions_record.transpose(1, 2, 0)).reshape(flat)
+    else:
+        packed = None
+    if record >= RECORD_FULL:
+        # Unpack the bytes of the states that hold a node.
+        num_bytes = (num_nodes + 7) // 8
+        state_bytes = packed.astype('<u8').view(np.uint8).reshape(
+            flat + (8,))[:, :, :num_bytes]
+        animat_states = np.unpackbits(state_bytes, axis=2, count=num_nodes,
+                                      bitorder='little')
+        animat_states = animat_states.reshape(num_animats, -1)
+    return (animat_states, world_record, positions_record, trial_results,
+            totals, packed, activity)
+
+
+def play_games(animats, record=RECORD_FULL, tables=None, worlds=None):
+    """Play a game with each of the given deterministic animats at once, with
+    NumPy.
+
+    The animats must all be part of the same experiment, which must have no
+    sensor noise. Histograms aren't counted.
+
+    Keyword Args:
+        record (int): The recording level (see ``Game``).
+        tables (np.ndarray): The stacked next-state tables of the animats.
+            Built from their TPMs if not given (see ``transition_tables``).
+        worlds (tuple): The precomputed worlds of the game (see
+            ``trial_worlds``).
+
+    Returns:
+        list(Game): The game played by each animat.
+    """
+    if not animats:
+        return []
+    experiment = animats[0]._experiment
+    if experiment.noise_level > 0:
+        raise ValueError('games with sensor noise cannot be played with '
+                         'NumPy.')
+    if tables is None:
+        tables = transition_tables(animats)
+    results = play(tables, experiment.game_config, experiment.num_sensors,
+                   experiment.num_motors, record=record, worlds=worlds)
+    games = []
+    for i, a in enumerate(animats):
+        arrays = [None if array is None else array[i] for array in results]
+        game = a._reshape_game(*arrays[:4], *results[4][i], *arrays[5:],
+                               None, record=record)
+        a._correct = game.correct
+        a._incorrect = game.incorrect
+        games.append(game)
+    return games
@@ -22,6 +22,11 @@ extensions = [
               sources=[
                   'pyanimats/c_animat/c_animat.pyx',
                   'pyanimats/c_animat/rng.cpp',
+                  'pyanimats/c_animat/ThreadPool.cpp',
+                  'pyanimats/c_animat/GateProgram.cpp',
+                  'pyanimats/c_animat/Genome.cpp',
+                  'pyanimats/c_animat/GameConfig.cpp',
+                  'pyanimats/c_animat/GameHistograms.cpp',
                   'pyanimats/c_animat/Game.cpp',
                   'pyanimats/c_animat/AbstractGate.cpp',
                   'pyanimats/c_animat/AbstractAgent.cpp',
@@ -29,9 +34,11 @@ extensions = [
                   'pyanimats/c_animat/HiddenMarkovAgent.cpp',
                   'pyanimats/c_animat/LinearThresholdGate.cpp',
                   'pyanimats/c_animat/LinearThresholdAgent.cpp',
+                  'pyanimats/c_animat/Population.cpp',
               ],
               language='c++',
-              extra_compile_args=['-std=c++11'])
+              extra_compile_args=['-std=c++11', '-pthread'],
+              extra_link_args=['-pthread'])
 ]
 
 setup_requires = [
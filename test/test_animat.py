@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# test_animat.py
+
+import pickle
+
+import pytest
+import numpy as np
+
+from pyanimats.__main__ import load_param_file
+from pyanimats.animat import HISTOGRAM_FIELDS, Animat, Game
+from pyanimats.c_animat import RECORD_FULL, RECORD_OUTCOMES, RECORD_PACKED
+from pyanimats.experiment import Experiment
+
+
+@pytest.fixture(params=['experiments/nat.yml',
+                        'experiments/lt-test/lt-test.yml'])
+def experiment(request):
+    return Experiment(load_param_file(request.param, {
+        'fitness_function': ('nat',), 'noise_level': 0.0,
+        'deterministic': True, 'mutation_prob': 0.005,
+        'duplication_prob': 0.5, 'deletion_prob': 0.5,
+        'min_genome_length': 500, 'max_genome_length': 3000,
+        'min_dup_del_width': 15, 'max_dup_del_width': 300})[0])
+
+
+def test_mutate_rebuilds_phenotype(experiment):
+    for i in range(4):
+        a = Animat(experiment, experiment.init_genome)
+        a.seed_rng(0, i)
+        a.inject_start_codons(20)
+        for generation in range(1, 101):
+            edges, tpm = a.edges, a.tpm.copy()
+            a.seed_rng(generation, i)
+            changed = a.mutate()
+            # The gates are rebuilt only around the mutations...
+            fresh = Animat(experiment, bytes(a.genome))
+            assert np.array_equal(a.edges, fresh.edges)
+            assert np.array_equal(a.tpm, fresh.tpm)
+            # ...and the phenotype is only reported unchanged if it is.
+            if not changed:
+                assert np.array_equal(a.edges, edges)
+                assert np.array_equal(a.tpm, tpm)
+
+
+@pytest.mark.parametrize('path,overrides', [
+    ('experiments/nat.yml', {'deterministic': False}),
+    ('experiments/nat.yml', {'num_hidden': 14}),
+    ('experiments/lt-test/lt-test.yml', {'noise_level': 0.0}),
+    ('experiments/lt-test/lt-test.yml', {'noise_level': 0.05,
+                                         'deterministic': False}),
+])
+def test_outcomes_dont_depend_on_record(path, overrides):
+    experiment = Experiment(load_param_file(path, dict(
+        {'fitness_function': ('nat',), 'mutation_prob': 0.05,
+         'num_hidden': 10},
+        **overrides))[0])
+    # Few gates among many nodes, so that some can't reach the motors
+    for i in range(20):
+        a = Animat(experiment, experiment.init_genome)
+        a.seed_rng(0, i)
+        a.inject_start_codons(10)
+        a.mutate()
+        games = []
+        for record in (RECORD_OUTCOMES, RECORD_FULL):
+            # Replay the same game
+            a.seed_rng(1, i)
+            games.append(a.play_game(record=record))
+        outcomes, full = games
+        assert np.array_equal(outcomes.trial_results, full.trial_results)
+        assert outcomes.correct == full.correct
+        assert outcomes.incorrect == full.incorrect
+
+
+def test_game_dtypes():
+    experiment = Experiment(load_param_file('experiments/nat.yml')[0])
+    a = Animat(experiment, experiment.init_genome)
+    a.inject_start_codons(10)
+    # Full games keep the layout they've always had...
+    full = a.play_game(record=RECORD_FULL)
+    assert full.animat_states.dtype == np.uint8
+    assert full.world_states.dtype == np.int32
+    assert full.animat_positions.dtype == np.int32
+    assert full.trial_results.dtype == np.int32
+    # ...while the lower levels keep what the engine writes.
+    packed = a.play_game(record=RECORD_PACKED)
+    assert packed.world_states.dtype == np.uint64
+    assert packed.animat_positions.dtype == np.uint8
+    assert packed.trial_results.dtype == np.uint8
+    assert np.array_equal(packed.world_states, full.world_states)
+    assert np.array_equal(packed.animat_positions, full.animat_positions)
+    assert np.array_equal(packed.trial_results, full.trial_results)
+
+
+@pytest.mark.parametrize('record', [RECORD_OUTCOMES, RECORD_PACKED,
+                                    RECORD_FULL])
+@pytest.mark.parametrize('scrambled,noise_level', [(True, 0.0), (True, 0.1),
+                                                   (False, 0.1)])
+def test_replicates_match_successive_games(record, scrambled, noise_level):
+    experiment = Experiment(load_param_file('experiments/nat.yml')[0])
+    a = Animat(experiment, experiment.init_genome)
+    a.inject_start_codons(10)
+    kwargs = dict(scrambled=scrambled, noise_level=noise_level,
+                  record=record)
+    a.seed_rng(1, 0)
+    games = [a.play_game(**kwargs) for i in range(5)]
+    a.seed_rng(1, 0)
+    replicates = a.play_game_replicates(5, **kwargs)
+    # Replay them into the arrays of the first call
+    a.seed_rng(1, 0)
+    reused = a.play_game_replicates(5, out=replicates, **kwargs)
+    for field in Game._fields:
+        if field in HISTOGRAM_FIELDS or field == 'record':
+            continue
+        array = getattr(replicates, field)
+        if getattr(games[0], field) is None:
+            assert array is None
+            continue
+        expected = np.array([getattr(game, field) for game in games])
+        assert np.array_equal(array, expected)
+        # Counts are arrays of replicates but integers in single games
+        if field not in ('correct', 'incorrect'):
+            assert array.dtype == expected.dtype
+            assert np.shares_memory(getattr(reused, field), array)
+        assert np.array_equal(getattr(reused, field), expected)
+
+
+@pytest.mark.parametrize('overrides', [{}, {'deterministic': False},
+                                       {'gate': 'lt'}])
+def test_pickle_round_trip(overrides):
+    experiment = Experiment(load_param_file('experiments/nat.yml',
+                                            overrides)[0])
+    a = Animat(experiment, experiment.init_genome)
+    a.seed_rng(3, 7)
+    a.inject_start_codons(10)
+    a.mutate()
+    a.play_game()
+    # Mutation and the game must have moved the streams along
+    seed, generation, index, games_played, counter = a._c_animat.rng_state
+    assert games_played and counter
+    c = pickle.loads(pickle.dumps(a._c_animat))
+    assert type(c) is type(a._c_animat)
+    b = pickle.loads(pickle.dumps(a))
+    for copy in (c, b._c_animat):
+        assert bytes(copy.genome) == bytes(a.genome)
+        assert copy.rng_state == a._c_animat.rng_state
+    # The copy carries on where the original left off
+    assert np.array_equal(b.play_game().animat_states,
+                          a.play_game().animat_states)
+    assert b._c_animat.rng_state == a._c_animat.rng_state
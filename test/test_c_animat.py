@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# test_c_animat.py
+
+import copy
+
+import pytest
+import numpy as np
+
+from pyanimats import c_animat
+from pyanimats.__main__ import load_param_file
+from pyanimats.animat import Animat
+from pyanimats.experiment import Experiment
+
+
+def experiment(path='experiments/nat.yml', **overrides):
+    return Experiment(load_param_file(path, overrides)[0])
+
+
+def test_play_games_needs_same_number_of_nodes():
+    small = experiment(num_hidden=3)
+    big = experiment(num_hidden=14)
+    agents = [Animat(small, small.init_genome)._c_animat,
+              Animat(big, big.init_genome)._c_animat]
+    with pytest.raises(ValueError):
+        c_animat.play_games(agents, small.game_config)
+
+
+def agent(gate='hmm', deterministic=True, seed=0):
+    e = experiment(gate=gate, deterministic=deterministic)
+    a = Animat(e, e.init_genome)
+    a.seed_rng(0, seed)
+    a.inject_start_codons(20)
+    return a._c_animat
+
+
+@pytest.mark.parametrize('gate', ['hmm', 'lt'])
+def test_transition_probabilities_of_deterministic_agent(gate):
+    for seed in range(5):
+        a = agent(gate, seed=seed)
+        assert np.array_equal(a.transition_probabilities(),
+                              a.transition_matrix(float))
+
+
+def test_transition_probabilities_of_nondeterministic_agent():
+    a = agent(deterministic=False)
+    exact = a.transition_probabilities()
+    # Some transitions must be uncertain for this to test anything.
+    assert ((exact > 0) & (exact < 1)).any()
+    num_samples = 2000
+    mean = np.zeros_like(exact)
+    for i in range(num_samples):
+        a.seed_rng(0, 1, i)
+        mean += a.transition_matrix(float)
+    mean /= num_samples
+    assert np.allclose(mean, exact, atol=0.05)
+
+
+def nondeterministic_agent(tables):
+    """Return an agent with two sensors, two hidden nodes, and two motors,
+    and a nondeterministic HMM gate from each sensor for each of the given
+    ``(outputs, table)`` pairs, where ``table`` is flat and row-major."""
+    genome = [0] * 100
+    for i, (outputs, table) in enumerate(tables):
+        start = 50 * i
+        genome[start:start + 2] = [42, 213]
+        # One input, the sensor
+        genome[start + 2:start + 4] = [0, len(outputs) - 1]
+        genome[start + 4] = i
+        # Outputs are taken modulo the nodes that aren't sensors
+        genome[start + 8:start + 8 + len(outputs)] = [o - 2 for o in outputs]
+        genome[start + 20:start + 20 + len(table)] = table
+    return c_animat.pyHiddenMarkovAgent(genome, 2, 2, 2, False)
+
+
+def sample_columns(a, outputs, num_samples):
+    """Sample the next state of each of the four sensor states, as the
+    column of a gate with the given outputs."""
+    columns = np.zeros((num_samples, 4), dtype=int)
+    for i in range(num_samples):
+        a.seed_rng(0, 1, i)
+        next_states = a.next_states(np.arange(4))
+        for bit, node in enumerate(outputs):
+            on = (next_states >> np.uint64(node)) & np.uint64(1)
+            columns[i] |= on.astype(int) << bit
+    return columns
+
+
+def test_nondeterministic_hmm_frequencies():
+    table = [0, 0, 0, 0,
+             10, 50, 0, 101]
+    a = nondeterministic_agent([([2, 3], table)])
+    columns = sample_columns(a, [2, 3], 4000)
+    for row, state in [(0, 0), (1, 1)]:
+        # Zero entries count as one, and the last column loses one
+        hmm = np.maximum(table[4 * row:4 * row + 4], 1)
+        weights = hmm - [0, 0, 0, 1]
+        expected = weights / (hmm.sum() - 1)
+        frequencies = np.bincount(columns[:, state], minlength=4) / 4000
+        assert np.allclose(frequencies, expected, atol=0.03)
+
+
+def test_nondeterministic_hmm_with_a_single_weight():
+    # With one output the last column has weight zero when its entry is at
+    # most one, so only the first can be drawn.
+    a = nondeterministic_agent([([2], [0, 0, 200, 1]), ([5], [7, 0, 0, 0])])
+    for outputs in ([2], [5]):
+        assert not sample_columns(a, outputs, 500).any()
+
+
+def test_agents_too_large_for_a_tpm():
+    a = c_animat.pyHiddenMarkovAgent([127] * 1000, 2, 36, 2, True)
+    assert a.num_states == 0
+    with pytest.raises(ValueError, match='more than 30 nodes'):
+        a.transition_matrix()
+
+
+def configs(config, **changes):
+    """Return copies of a game config, with the given changes, with and
+    without the fast paths."""
+    params = dict(zip(['hit_multipliers', 'patterns', 'world_width',
+                       'world_height', 'sensor_locations', 'body_length'],
+                      config.__reduce__()[1]), **changes)
+    return (c_animat.pyGameConfig(**params),
+            c_animat.pyGameConfig(fast_paths=False, **params))
+
+
+@pytest.mark.parametrize('num_hidden', [4, 14])
+@pytest.mark.parametrize('world_width', [16, 21])
+@pytest.mark.parametrize('scramble_world,noise_level', [
+    (False, 0.0), (False, 0.1), (True, 0.0), (True, 0.1)])
+def test_fast_paths_match_plain_loop(num_hidden, world_width, scramble_world,
+                                     noise_level):
+    # Bit-sliced with more than 14 nodes, memoized otherwise
+    e = experiment(num_hidden=num_hidden)
+    fast, slow = configs(e.game_config, world_width=world_width)
+    for i in range(10):
+        a = Animat(e, e.init_genome)
+        a.seed_rng(0, i)
+        a.inject_start_codons(20)
+        a.mutate()
+        games = []
+        for config in (fast, slow):
+            a.seed_rng(1, i)
+            games.append(a._c_animat.play_game(
+                config, scramble_world=scramble_world,
+                noise_level=noise_level, record=c_animat.RECORD_FULL))
+        for x, y in zip(*games):
+            if isinstance(x, np.ndarray):
+                assert np.array_equal(x, y)
+            else:
+                assert x == y
+
+
+def count_start_codons(a):
+    genome = a.genome
+    return int(np.sum((genome[:-1] == a.START_CODON_ONE) &
+                      (genome[1:] == a.START_CODON_TWO)))
+
+
+@pytest.mark.parametrize('agent_class', [c_animat.pyHiddenMarkovAgent,
+                                         c_animat.pyLinearThresholdAgent])
+def test_stale_tpm_columns_match_a_fresh_tpm(agent_class):
+    gained = lost = 0
+    for i in range(4):
+        a = agent_class([127] * 3000, 3, 4, 2, True)
+        a.seed_rng(0, 0, i)
+        a.injectStartCodons(20)
+        a.transition_matrix()
+        for generation in range(1, 101):
+            before = count_start_codons(a)
+            a.seed_rng(0, generation, i)
+            a.mutate(0.005, 0.5, 0.5, 1000, 5000, 15, 300)
+            after = count_start_codons(a)
+            gained += after > before
+            lost += after < before
+            fresh = agent_class(a.genome, 3, 4, 2, True)
+            for dtype in (np.uint8, np.float64):
+                assert np.array_equal(a.transition_matrix(dtype),
+                                      fresh.transition_matrix(dtype))
+    # Duplications and deletions must have added and removed whole gates
+    assert gained and lost
+
+
+@pytest.mark.parametrize('dtype', [bool, np.uint8, np.float32, np.float64])
+def test_transition_matrix_dtypes(dtype):
+    a = agent(seed=1)
+    tpm = a.transition_matrix(dtype)
+    assert tpm.dtype == dtype
+    assert tpm.shape == (a.num_states, a.num_nodes)
+    # The same TPM whatever the type, as zeros and ones
+    assert np.array_equal(tpm.astype(np.uint8), a.tpm)
+    assert set(np.unique(tpm.astype(np.float64))) <= {0.0, 1.0}
+
+
+@pytest.mark.parametrize('dtype', [np.int8, np.int32, np.uint16, np.float16,
+                                   complex, object])
+def test_transition_matrix_rejects_other_dtypes(dtype):
+    with pytest.raises(ValueError):
+        agent().transition_matrix(dtype)
+
+
+def test_copying_the_abstract_agent():
+    with pytest.raises(TypeError, match='pyAbstractAgent'):
+        copy.copy(c_animat.pyAbstractAgent())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# test_experiment.py
+
+import pyphi
+
+from pyanimats.__main__ import load_param_file
+from pyanimats.experiment import Experiment
+from pyanimats.validate import MAX_NUM_NODES
+
+
+def experiment(**overrides):
+    return Experiment(load_param_file('experiments/nat.yml', overrides)[0])
+
+
+def test_largest_experiment():
+    e = experiment(num_hidden=MAX_NUM_NODES - 4)
+    assert e.num_nodes == MAX_NUM_NODES
+    assert e.num_possible_states == 2**MAX_NUM_NODES
+    # Only what's used is derived
+    assert len(e.sensor_motor_states) == 2**4
+
+
+def test_states_and_power_sets():
+    e = experiment()
+    assert e.possible_states == [
+        pyphi.convert.le_index2state(i, e.num_nodes)
+        for i in range(2**e.num_nodes)]
+    assert e.hidden_powerset == tuple(pyphi.utils.powerset(e.hidden_indices))
+    assert e.sensors_and_hidden_powerset == tuple(
+        pyphi.utils.powerset(e.sensor_indices + e.hidden_indices))
+    assert e.hidden_and_motor_powerset == tuple(
+        pyphi.utils.powerset(e.hidden_indices + e.motor_indices))
+    assert e.sensor_motor_states[:3] == [
+        ((0, 0), [0] * (e.num_sensors + e.num_motors)),
+        ((0, 1), [0] * (e.num_sensors + e.num_motors - 1) + [1]),
+        ((0, 2), [0] * (e.num_sensors + e.num_motors - 2) + [1, 0])]
+    # They're derived once
+    assert e.possible_states is e.possible_states
@@ -6,7 +6,10 @@ import pytest
 import numpy as np
 
 from conftest import p
-from pyanimats.utils import unique_rows
+from pyanimats.__main__ import load_param_file
+from pyanimats.animat import Animat
+from pyanimats.experiment import Experiment
+from pyanimats.utils import unique_packed_states, unique_rows, unpack_states
 
 
 @pytest.fixture()
@@ -114,3 +117,96 @@ def test_unique_rows_with_sort(a):
                        [1, 0, 0, 0, 0]])
     p(result, answer)
     assert np.array_equal(result, answer)
+
+
+def pack(rows):
+    """Pack each row with the little-endian convention."""
+    return np.asarray(rows).dot(1 << np.arange(np.shape(rows)[-1]))
+
+
+def histogram(a):
+    """Return the distinct packed states of the rows of ``a``, their counts,
+    and the index of the last row of each."""
+    packed = pack(a)
+    states, counts = np.unique(packed, return_counts=True)
+    last_visits = np.array([np.flatnonzero(packed == s)[-1] for s in states])
+    return states, counts, last_visits
+
+
+def unique_packed_rows(a, **kwargs):
+    states, counts, last_visits = histogram(a)
+    return unique_packed_states(states, counts, last_visits=last_visits,
+                                **kwargs)
+
+
+def test_unpack_states(a):
+    states, _, _ = histogram(a)
+    result = unpack_states(states, a.shape[1])
+    answer = np.array([
+        [1, 0, 0, 0, 0],
+        [1, 1, 0, 0, 0],
+        [1, 0, 0, 0, 1],
+        [0, 0, 1, 1, 1],
+    ])
+    p(result, answer)
+    assert np.array_equal(result, answer)
+    assert np.array_equal(unpack_states(pack(a), 5), a)
+
+
+def test_unique_packed_states_no_secondary(a):
+    states, counts = unique_packed_rows(a)
+    assert np.array_equal(states, pack(unique_rows(a)))
+    assert np.array_equal(counts, [1, 3, 2, 2])
+
+
+def test_unique_packed_states_subset_columns(a):
+    states, counts = unique_packed_rows(a, upto=[0, 2, 3])
+    # The last visited of the states that agree on nodes 0, 2, and 3 stands
+    # for them
+    assert np.array_equal(states, pack(unique_rows(a, upto=[0, 2, 3])))
+    assert np.array_equal(counts, [6, 2])
+
+
+def test_unique_packed_states_with_sort(a):
+    states, counts = unique_packed_rows(a, sort=True)
+    answer, answer_counts = unique_rows(a, counts=True, sort=True)
+    assert np.array_equal(states, pack(answer))
+    assert np.array_equal(counts, answer_counts)
+
+
+def test_unique_packed_states_needs_last_visits(a):
+    with pytest.raises(ValueError):
+        unique_packed_states(*histogram(a)[:2], upto=[0, 2, 3])
+
+
+def test_unique_packed_states_empty():
+    for kwargs in ({}, {'upto': [0, 1]}, {'sort': True}):
+        states, counts = unique_packed_states(
+            np.array([], dtype=np.uint64), np.array([], dtype=np.int64),
+            last_visits=np.array([], dtype=np.int64), **kwargs)
+        assert states.size == 0
+        assert counts.size == 0
+    assert unpack_states([], 3).shape == (0, 3)
+
+
+@pytest.mark.parametrize('upto_attr', [
+    None, 'sensor_motor_indices', 'hidden_indices', 'sensor_hidden_indices'])
+def test_unique_packed_states_match_unique_rows(upto_attr):
+    experiment = Experiment(load_param_file('experiments/nat.yml')[0])
+    merged = False
+    for i in range(10):
+        a = Animat(experiment, experiment.init_genome)
+        a.seed_rng(0, i)
+        a.inject_start_codons(20)
+        upto = getattr(a, upto_attr) if upto_attr else False
+        game = a.play_game(histograms=True)
+        answer, answer_counts = unique_rows(game.animat_states, upto=upto,
+                                            counts=True, sort=True)
+        states, counts = unique_packed_states(
+            game.visited_states, game.visit_counts, upto=upto, sort=True,
+            last_visits=game.last_visits)
+        merged |= len(states) < len(game.visited_states)
+        assert np.array_equal(unpack_states(states, a.num_nodes), answer)
+        assert np.array_equal(counts, answer_counts)
+    # Some states must agree on the given nodes for this to test anything
+    assert merged or not upto_attr
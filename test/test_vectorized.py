@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# test_vectorized.py
+
+import pytest
+import numpy as np
+
+from pyanimats import animat, vectorized
+from pyanimats.__main__ import load_param_file
+from pyanimats.animat import Animat
+from pyanimats.evolve import Evolution
+from pyanimats.experiment import Experiment
+
+
+def population(path, n=50, **overrides):
+    experiment = Experiment(load_param_file(path, overrides)[0])
+    animats = []
+    for i in range(n):
+        a = Animat(experiment, experiment.init_genome)
+        a.seed_rng(0, i)
+        a.inject_start_codons(10)
+        for generation in range(1, 11):
+            a.seed_rng(generation, i)
+            a.mutate()
+        animats.append(a)
+    return animats
+
+
+@pytest.fixture(params=[
+    ('experiments/nat.yml', {}),
+    ('experiments/nat.yml', {'num_sensors': 1, 'num_hidden': 6}),
+    ('experiments/lt-test/lt-test.yml', {'fitness_function': ('nat',),
+                                         'noise_level': 0.0}),
+])
+def animats(request):
+    path, overrides = request.param
+    return population(path, mutation_prob=0.05, **overrides)
+
+
+@pytest.mark.parametrize('record', range(4))
+def test_play_games_matches_engine(animats, record):
+    answers = animat.play_games(animats, record=record)
+    results = vectorized.play_games(animats, record=record)
+    for result, answer in zip(results, answers):
+        for field in ('animat_states', 'world_states', 'animat_positions',
+                      'trial_results', 'correct', 'incorrect',
+                      'packed_states', 'activity'):
+            x, y = getattr(result, field), getattr(answer, field)
+            if y is None:
+                assert x is None
+            else:
+                assert np.array_equal(x, y)
+
+
+def test_transition_tables_need_deterministic_animats():
+    animats = population('experiments/nat.yml', n=1, deterministic=False)
+    with pytest.raises(ValueError):
+        vectorized.transition_tables(animats)
+
+
+def test_play_games_match_evolution():
+    experiment, simulation = load_param_file(
+        'experiments/nat.yml', {'popsize': 20, 'init_start_codons': 10},
+        {'status_interval': 0})
+    evolution = Evolution(experiment, simulation)
+    population = evolution.population
+    for a in population:
+        a.inject_start_codons(evolution.experiment.init_start_codons)
+    evolution.evaluate(population)
+    for gen in range(1, 6):
+        population = evolution.new_gen(population, gen)
+        correct = [a.correct for a in population]
+        incorrect = [a.incorrect for a in population]
+        games = vectorized.play_games(population, record=0)
+        assert [game.correct for game in games] == correct
+        assert [game.incorrect for game in games] == incorrect